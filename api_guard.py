@@ -0,0 +1,135 @@
+import asyncio
+import random
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被快速拒绝"""
+
+    def __init__(self, retry_after: float = 0):
+        super().__init__(f"音乐API暂时不可用，{retry_after:.0f}秒后重试")
+        self.retry_after = retry_after
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """
+    带抖动的指数退避（full jitter）：在 [0, min(cap, base * 2^attempt)] 内随机取值，
+    避免上游故障时所有请求同时重试。
+    :param attempt: 第几次重试（从0开始）
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    """
+    令牌桶限流：以rate个/秒的速度补充令牌，最多积累capacity个，允许短时突发。
+    状态由threading.Lock而不是事件循环绑定的锁保护，可在Flask子线程各自的事件循环中共用。
+    """
+
+    def __init__(self, rate: float = 5, capacity: float = 10):
+        """
+        :param rate: 每秒补充的令牌数，<=0 表示不限流
+        :param capacity: 桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, reserve: float = 0) -> bool:
+        """
+        立即尝试取一个令牌，取不到返回False。
+        :param reserve: 取走后桶内至少还要留下的令牌数，供低优先级请求给聊天请求让路
+        """
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1 + reserve:
+                self._tokens -= 1
+                return True
+            return False
+
+    async def acquire(self):
+        """取一个令牌，令牌不足时等待补充"""
+        while not self.try_acquire():
+            with self._lock:
+                wait = (1 - self._tokens) / self.rate
+            await asyncio.sleep(max(0.0, wait))
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后打开，期间直接拒绝请求；
+    经过reset_timeout后进入半开状态放行少量探测请求，探测成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30, half_open_max_calls: int = 1):
+        """
+        :param failure_threshold: 连续失败多少次后打开
+        :param reset_timeout: 打开后多少秒进入半开状态
+        :param half_open_max_calls: 半开状态下同时放行的探测请求数
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+    def retry_after(self) -> float:
+        """距离进入半开状态还剩多少秒"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """判断是否放行本次请求"""
+        if self.state == self.OPEN:
+            if self.retry_after() > 0:
+                return False
+            self.state = self.HALF_OPEN
+            self._half_open_calls = 0
+        if self.state == self.HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                return False
+            self._half_open_calls += 1
+        return True
+
+    def check(self):
+        """放行则返回，否则抛出CircuitOpenError"""
+        if not self.allow():
+            raise CircuitOpenError(self.retry_after())
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._half_open_calls = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._half_open_calls = 0
+
+    def release(self):
+        """请求被取消、未产生结论时归还半开探测名额"""
+        if self.state == self.HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN and self.retry_after() > 0
@@ -1,6 +1,11 @@
 from pydub import AudioSegment
 import os
 
+try:
+    from .file_locks import file_lock
+except ImportError:
+    from file_locks import file_lock
+
 def merge_vocal_and_other(vocal_wav: str, other_wav: str, base_name: str = None) -> str:
     """
     合并变换后vocal和other音轨，返回合成后的wav路径。
@@ -13,14 +18,21 @@ def merge_vocal_and_other(vocal_wav: str, other_wav: str, base_name: str = None)
         raise FileNotFoundError(f"vocal_wav不存在: {vocal_wav}")
     if not os.path.exists(other_wav):
         raise FileNotFoundError(f"other_wav不存在: {other_wav}")
-    audio1 = AudioSegment.from_file(vocal_wav, format="wav")
-    audio2 = AudioSegment.from_file(other_wav, format="wav")
-    min_len = min(len(audio1), len(audio2))
-    audio1 = audio1[:min_len]
-    audio2 = audio2[:min_len]
-    combined = audio1.overlay(audio2)
     output_path = os.path.join(os.path.dirname(vocal_wav), f"{base_name}_changed.wav") if base_name else os.path.join(os.path.dirname(vocal_wav), "combined.wav")
-    combined.export(output_path, format="wav")
+    # 同一成品同时只合成一次；等到锁时成品已由前一个请求生成则直接复用
+    with file_lock(output_path):
+        if base_name and os.path.exists(output_path):
+            return output_path
+        audio1 = AudioSegment.from_file(vocal_wav, format="wav")
+        audio2 = AudioSegment.from_file(other_wav, format="wav")
+        min_len = min(len(audio1), len(audio2))
+        audio1 = audio1[:min_len]
+        audio2 = audio2[:min_len]
+        combined = audio1.overlay(audio2)
+        # 先导出到临时文件再替换，发送语音时不会读到写了一半的wav
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        combined.export(tmp_path, format="wav")
+        os.replace(tmp_path, output_path)
     return output_path
 
 if __name__ == "__main__":
@@ -0,0 +1,216 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+try:
+    from .query_normalizer import UNSAFE_CHARS_RE, normalize_query
+except ImportError:
+    from query_normalizer import UNSAFE_CHARS_RE, normalize_query
+
+# 按优先级查找的音频扩展名（高音质为flac，低音质接口可能返回mp3）
+AUDIO_EXTENSIONS = ("flac", "mp3", "wav")
+_URL_EXT_RE = re.compile(r"\.([A-Za-z0-9]{2,4})(?:\?|$)")
+# 翻唱成品的后缀；旧版本按 <歌名>_changed.wav 命名，新版本按 <歌曲id>_<音质>_changed.wav 命名
+COVER_SUFFIX = "_changed.wav"
+# 点歌生成翻唱时使用的音质
+COVER_QUALITY = "1"
+_ID_STEM_RE = re.compile(r"^\d+_\w+$")
+
+
+def _default_cache_dir() -> str:
+    cache_dir = os.path.join(os.path.dirname(__file__), 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def audio_ext_from_url(url: str, default: str = "flac") -> str:
+    """从播放链接推断音频扩展名"""
+    match = _URL_EXT_RE.search(url or "")
+    ext = match.group(1).lower() if match else ""
+    return ext if ext in AUDIO_EXTENSIONS else default
+
+
+class AudioStore:
+    """
+    按歌曲id寻址的音频存储：音频保存为 cache/audio/<歌曲id>_<音质>.<扩展名>，
+    并维护“歌名/搜索词 → 歌曲id”的别名表（cache/audio/aliases.json）。
+    同名的不同歌曲不会互相覆盖，同一首歌以不同名字点播也只下载一次；
+    分离、变声、合成等后续步骤的文件名都由 <歌曲id>_<音质> 派生。
+    别名表在插件进程与Flask处理进程之间通过文件共享，文件被其他进程更新后自动重新加载。
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        """
+        :param root: 存储目录，默认 cache/audio
+        """
+        self.root = root or os.path.join(_default_cache_dir(), "audio")
+        os.makedirs(self.root, exist_ok=True)
+        self.alias_path = os.path.join(self.root, "aliases.json")
+        self._lock = threading.Lock()
+        self._aliases: Dict[str, Dict[str, Any]] = {}
+        self._aliases_mtime = None
+
+    # ===== 音频文件 =====
+
+    @staticmethod
+    def stem(song_id: Any, quality: Any) -> str:
+        """音频及其派生文件的基础文件名：<歌曲id>_<音质>"""
+        return f"{int(song_id)}_{quality}"
+
+    def blob_path(self, song_id: Any, quality: Any, ext: str = "flac") -> str:
+        """歌曲音频的存储路径"""
+        return os.path.join(self.root, f"{self.stem(song_id, quality)}.{ext.lstrip('.')}")
+
+    def find(self, song_id: Any, quality: Any) -> Optional[str]:
+        """查找已存储的音频，不存在时返回None"""
+        for ext in AUDIO_EXTENSIONS:
+            path = self.blob_path(song_id, quality, ext)
+            if os.path.isfile(path) and os.path.getsize(path) > 0:
+                return path
+        return None
+
+    @staticmethod
+    def legacy_path(title: str, cache_dir: Optional[str] = None) -> str:
+        """旧版本按歌名保存的路径 cache/<去除特殊符号的歌名>.flac，仅用于兼容查找"""
+        safe_title = UNSAFE_CHARS_RE.sub('', title)
+        return os.path.join(cache_dir or _default_cache_dir(), f"{safe_title}.flac")
+
+    def migrate_legacy_covers(self, results_dir: str, quality: Any = COVER_QUALITY) -> int:
+        """
+        把旧版本按歌名命名的翻唱成品 <歌名>_changed.wav 改名为 <歌曲id>_<音质>_changed.wav，
+        改为id寻址后旧文件不会再被点歌命中，迁移后无需重新生成。可重复调用，已迁移的文件不再处理。
+        只迁移别名表中该歌名对应一首同名歌曲的文件；解析不出的保留原名，可在首次点播后再次迁移。
+        :param results_dir: 翻唱成品所在目录（MSST结果目录）
+        :return: 迁移的文件数
+        """
+        migrated = 0
+        try:
+            names = os.listdir(results_dir)
+        except OSError:
+            return 0
+        for name in names:
+            if not name.endswith(COVER_SUFFIX):
+                continue
+            title = name[:-len(COVER_SUFFIX)]
+            # 跳过已按id命名的成品和变声后的人声中间产物
+            if _ID_STEM_RE.match(title) or title.endswith("_vocals"):
+                continue
+            entry = self.resolve(title)
+            if not entry or normalize_query(entry.get("song") or "") != normalize_query(title):
+                continue
+            target = os.path.join(results_dir, f"{self.stem(entry['id'], quality)}{COVER_SUFFIX}")
+            if os.path.exists(target):
+                continue
+            try:
+                os.replace(os.path.join(results_dir, name), target)
+                migrated += 1
+            except OSError:
+                continue
+        return migrated
+
+    # ===== 别名表 =====
+
+    def _reload_aliases(self):
+        try:
+            mtime = os.path.getmtime(self.alias_path)
+        except OSError:
+            return
+        if mtime == self._aliases_mtime:
+            return
+        try:
+            with open(self.alias_path, "r", encoding="utf-8") as f:
+                aliases = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(aliases, dict):
+            self._aliases = aliases
+            self._aliases_mtime = mtime
+
+    def _save_aliases(self):
+        tmp_path = f"{self.alias_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._aliases, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.alias_path)
+        self._aliases_mtime = os.path.getmtime(self.alias_path)
+
+    @staticmethod
+    def _alias_key(name: str, choose: Any = 1) -> str:
+        # 同一搜索词的第2、3……个结果是不同的歌，别名键带上choose
+        key = normalize_query(name)
+        try:
+            choose = int(choose)
+        except (TypeError, ValueError):
+            choose = 1
+        return key if choose == 1 else f"{key}#{choose}"
+
+    def add_alias(self, name: str, song_id: Any, title: Optional[str] = None, choose: Any = 1,
+                  overwrite: bool = True):
+        """
+        记录“歌名/搜索词 → 歌曲id”。
+        :param name: 用户点播时使用的名字
+        :param song_id: 歌曲id
+        :param title: 歌曲真实标题
+        :param choose: 该名字下的第几个搜索结果
+        :param overwrite: 名字已指向其他歌曲时是否覆盖
+        """
+        try:
+            song_id = int(song_id)
+        except (TypeError, ValueError):
+            return
+        if not normalize_query(name):
+            return
+        key = self._alias_key(name, choose)
+        with self._lock:
+            self._reload_aliases()
+            entry = {"id": song_id, "song": title or name, "updated_at": time.time()}
+            old = self._aliases.get(key)
+            if old and old.get("id") == song_id and old.get("song") == entry["song"]:
+                return
+            if old and not overwrite:
+                return
+            self._aliases[key] = entry
+            self._save_aliases()
+
+    def add_song(self, query: str, choose: Any, info: Dict[str, Any]):
+        """
+        为接口返回的歌曲信息登记别名：用户的搜索词（带choose，以接口最新结果为准）和真实歌名
+        （同名的不同歌曲只保留先登记的，避免歌名别名在两首歌之间来回切换）。
+        """
+        song_id = info.get("id") or info.get("songid") or info.get("songId")
+        if query:
+            self.add_alias(query, song_id, info.get("song"), choose=choose)
+        if info.get("song"):
+            self.add_alias(info["song"], song_id, info["song"], overwrite=False)
+
+    def resolve(self, name: str, choose: Any = 1) -> Optional[Dict[str, Any]]:
+        """
+        按名字解析歌曲。
+        :return: {"id": 歌曲id, "song": 真实标题}，未登记时返回None
+        """
+        key = self._alias_key(name, choose)
+        with self._lock:
+            self._reload_aliases()
+            entry = self._aliases.get(key)
+        return dict(entry) if entry else None
+
+    def lookup(self, name: str, quality: Any, choose: Any = 1) -> Optional[str]:
+        """按名字查找已存储的音频（不访问网络），未登记或未下载时返回None"""
+        entry = self.resolve(name, choose)
+        if not entry:
+            return None
+        return self.find(entry["id"], quality)
+
+
+# ===== 共享实例 =====
+_shared_store: Optional[AudioStore] = None
+
+
+def get_audio_store() -> AudioStore:
+    """获取共享的音频存储（插件进程和独立脚本各自一个实例，共用同一目录）"""
+    global _shared_store
+    if _shared_store is None:
+        _shared_store = AudioStore()
+    return _shared_store
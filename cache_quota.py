@@ -0,0 +1,259 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+# 纳入配额管理的音频扩展名；.part等下载中的文件和json/数据库不计入、也不会被淘汰
+QUOTA_EXTENSIONS = (".flac", ".mp3", ".wav")
+# 淘汰层级：先淘汰分离出的中间产物，再淘汰源音频，最后才淘汰翻唱成品
+TIER_INTERMEDIATE = 0
+TIER_SOURCE = 1
+TIER_FINAL = 2
+_INTERMEDIATE_SUFFIXES = ("_vocals", "_other", "_instrumental", "_vocals_changed")
+_INTERMEDIATE_NAMES = ("gradio_output", "combined")
+_FINAL_SUFFIX = "_changed"
+
+
+class CacheEntry(NamedTuple):
+    path: str
+    size: int
+    last_access: float
+    tier: int
+
+
+def _file_stem(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def classify(path: str, source_dirs: Sequence[str] = ()) -> int:
+    """
+    判断文件的淘汰层级。
+    :param source_dirs: 存放源音频的目录（cache、cache/audio），其中不带后缀的音频视为源音频，其他目录中的视为中间产物
+    """
+    stem = _file_stem(path)
+    # 变声后的人声 <基础名>_vocals_changed 也是中间产物，先于成品判断
+    if stem in _INTERMEDIATE_NAMES or stem.endswith(_INTERMEDIATE_SUFFIXES):
+        return TIER_INTERMEDIATE
+    if stem.endswith(_FINAL_SUFFIX):
+        return TIER_FINAL
+    if os.path.dirname(os.path.abspath(path)) in source_dirs:
+        return TIER_SOURCE
+    return TIER_INTERMEDIATE
+
+
+class CacheQuota:
+    """
+    下载缓存和处理产物的磁盘配额：统计cache目录、MSST结果目录下音频文件的总大小，超出上限时按
+    “中间产物 → 源音频 → 翻唱成品”的层级、层内按最近访问时间（LRU）删除文件，直到回到上限以内。
+    正在处理的任务通过pin()保护其文件；最近min_age秒内访问过的文件也不会被删除，
+    以保护插件进程和Flask处理进程之间互相看不到pin的在途任务。
+    """
+
+    def __init__(self, max_bytes: int, dirs: Sequence[str] = (), source_dirs: Sequence[str] = (),
+                 min_age: float = 600):
+        """
+        :param max_bytes: 磁盘配额(字节)，<=0 表示不限
+        :param dirs: 纳入配额的目录（递归扫描）
+        :param source_dirs: 存放源音频的目录，见classify()
+        :param min_age: 最近访问不足该秒数的文件不淘汰
+        """
+        self.max_bytes = max_bytes
+        self.dirs = [os.path.abspath(d) for d in dirs if d]
+        self.source_dirs = [os.path.abspath(d) for d in source_dirs if d]
+        self.min_age = min_age
+        self._pins: Dict[str, int] = {}
+        self._pins_lock = threading.Lock()
+        self._enforce_lock = threading.Lock()
+        self.evicted = 0
+        self.freed_bytes = 0
+
+    # ===== 访问记录 =====
+
+    @staticmethod
+    def touch(path: Optional[str]):
+        """
+        记录一次访问：把文件的访问时间更新为当前时间（保留修改时间）。
+        不依赖文件系统自身的atime（noatime/relatime挂载下不可靠）。
+        """
+        if not path:
+            return
+        try:
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+        except OSError:
+            pass
+
+    # ===== 在途任务保护 =====
+
+    @staticmethod
+    def _pin_keys(path: str) -> Tuple[str, str]:
+        return os.path.abspath(path), _file_stem(path)
+
+    def pin_paths(self, paths: Iterable[Optional[str]]) -> List[str]:
+        """保护文件不被淘汰，返回实际登记的路径（供unpin_paths使用）"""
+        pinned = [p for p in paths if p]
+        with self._pins_lock:
+            for path in pinned:
+                for key in self._pin_keys(path):
+                    self._pins[key] = self._pins.get(key, 0) + 1
+        return pinned
+
+    def unpin_paths(self, paths: Iterable[str]):
+        with self._pins_lock:
+            for path in paths:
+                for key in self._pin_keys(path):
+                    count = self._pins.get(key, 0) - 1
+                    if count > 0:
+                        self._pins[key] = count
+                    else:
+                        self._pins.pop(key, None)
+
+    @contextmanager
+    def pin(self, *paths: Optional[str]):
+        """
+        在with块内保护文件不被淘汰。按文件名保护：固定源音频 <歌曲id>_<音质>.flac 时，
+        同名派生的 _vocals/_other/_changed 等文件也一并受保护。
+        """
+        pinned = self.pin_paths(paths)
+        try:
+            yield
+        finally:
+            self.unpin_paths(pinned)
+
+    def is_pinned(self, path: str) -> bool:
+        abs_path, stem = self._pin_keys(path)
+        with self._pins_lock:
+            if abs_path in self._pins or stem in self._pins:
+                return True
+            # 派生文件：<基础名>_vocals.wav、<基础名>_changed.wav 等
+            return any(stem.startswith(f"{key}_") for key in self._pins if os.sep not in key)
+
+    # ===== 扫描与淘汰 =====
+
+    def scan(self) -> List[CacheEntry]:
+        """列出纳入配额的所有文件"""
+        entries = []
+        seen = set()
+        for root_dir in self.dirs:
+            if not os.path.isdir(root_dir):
+                continue
+            for dirpath, _, filenames in os.walk(root_dir):
+                for name in filenames:
+                    if os.path.splitext(name)[1].lower() not in QUOTA_EXTENSIONS:
+                        continue
+                    path = os.path.join(dirpath, name)
+                    if path in seen:
+                        continue
+                    seen.add(path)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append(CacheEntry(path, st.st_size, max(st.st_atime, st.st_mtime),
+                                              classify(path, self.source_dirs)))
+        return entries
+
+    def usage(self) -> int:
+        """当前占用(字节)"""
+        return sum(entry.size for entry in self.scan())
+
+    def enforce(self) -> Tuple[int, int]:
+        """
+        执行一次配额检查，超出上限时淘汰文件。多个调用方同时触发时只有一个在扫描，其余直接返回。
+        :return: (删除的文件数, 释放的字节数)
+        """
+        if self.max_bytes <= 0 or not self._enforce_lock.acquire(blocking=False):
+            return 0, 0
+        try:
+            entries = self.scan()
+            total = sum(entry.size for entry in entries)
+            if total <= self.max_bytes:
+                return 0, 0
+            now = time.time()
+            removed = freed = 0
+            for entry in sorted(entries, key=lambda e: (e.tier, e.last_access)):
+                if total <= self.max_bytes:
+                    break
+                if now - entry.last_access < self.min_age or self.is_pinned(entry.path):
+                    continue
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                total -= entry.size
+                removed += 1
+                freed += entry.size
+            self.evicted += removed
+            self.freed_bytes += freed
+            return removed, freed
+        finally:
+            self._enforce_lock.release()
+
+    def enforce_in_background(self):
+        """在后台线程中执行配额检查，不阻塞调用方"""
+        if self.max_bytes > 0:
+            threading.Thread(target=self.enforce, name="music-cache-quota", daemon=True).start()
+
+    def stats(self):
+        return {
+            "max_bytes": self.max_bytes,
+            "usage": self.usage(),
+            "evicted": self.evicted,
+            "freed_bytes": self.freed_bytes,
+        }
+
+
+# ===== 共享实例 =====
+_shared_quota: Optional[CacheQuota] = None
+
+
+def default_quota_dirs() -> Tuple[List[str], List[str]]:
+    """
+    默认纳入配额的目录：cache（含cache/audio）和MSST结果目录（分离产物和翻唱成品）。
+    :return: (纳入配额的目录, 源音频目录)
+    """
+    cache_dir = os.path.join(os.path.dirname(__file__), 'cache')
+    source_dirs = [cache_dir, os.path.join(cache_dir, 'audio')]
+    dirs = [cache_dir]
+    try:
+        try:
+            from .msst_separate_tool import find_results_dir
+        except ImportError:
+            from msst_separate_tool import find_results_dir
+        dirs.append(find_results_dir())
+    except Exception:
+        # 未部署MSST或找不到结果目录时只管理cache目录
+        pass
+    return dirs, source_dirs
+
+
+def configure_cache_quota(max_disk_mb: float, min_age: float = 600,
+                          dirs: Optional[Sequence[str]] = None) -> CacheQuota:
+    """
+    由MusicPlugin在加载时调用，按配置创建共享的磁盘配额。
+    :param max_disk_mb: 磁盘配额(MB)，<=0 表示不限
+    :param min_age: 最近访问不足该秒数的文件不淘汰
+    :param dirs: 纳入配额的目录，默认见default_quota_dirs()
+    """
+    global _shared_quota
+    default_dirs, source_dirs = default_quota_dirs()
+    _shared_quota = CacheQuota(int(max_disk_mb * 1024 * 1024), dirs if dirs is not None else default_dirs,
+                               source_dirs=source_dirs, min_age=min_age)
+    return _shared_quota
+
+
+def get_cache_quota() -> CacheQuota:
+    """获取共享的磁盘配额；独立脚本（如Flask处理进程）中首次调用时从config.toml读取配置"""
+    if _shared_quota is None:
+        max_disk_mb, min_age = 0, 600
+        config_path = os.path.join(os.path.dirname(__file__), 'config.toml')
+        if os.path.isfile(config_path):
+            try:
+                import toml
+                cache_config = toml.load(config_path).get('cache', {})
+                max_disk_mb = cache_config.get('max_disk_mb', max_disk_mb)
+                min_age = cache_config.get('min_access_age', min_age)
+            except Exception:
+                pass
+        configure_cache_quota(max_disk_mb, min_age=min_age)
+    return _shared_quota
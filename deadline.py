@@ -0,0 +1,55 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Optional
+
+
+class Deadline:
+    """
+    单次请求的端到端时间预算：在Action开始时创建，各阶段（搜索、发卡片、LLM润色、分段发送）
+    从同一个预算中扣除耗时，预算将尽时后续阶段降级（跳过LLM润色、改发直链等）。
+    """
+
+    def __init__(self, budget: float):
+        """
+        :param budget: 总预算(秒)，<=0 表示不限
+        """
+        self.budget = budget
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget if budget > 0 else None
+
+    def remaining(self) -> float:
+        """剩余时间(秒)，不限时返回inf"""
+        if self.expires_at is None:
+            return float("inf")
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def has(self, seconds: float) -> bool:
+        """是否还剩至少seconds秒"""
+        return self.remaining() >= seconds
+
+    def timeout(self, cap: Optional[float] = None, reserve: float = 0) -> Optional[float]:
+        """
+        本阶段可用的超时时间：剩余时间扣除为后续阶段保留的reserve，再与本阶段上限cap取较小值。
+        :return: 超时秒数，不限时返回None（供asyncio.wait_for使用）
+        """
+        available = self.remaining() - reserve
+        if cap is not None:
+            available = min(available, cap)
+        if available == float("inf"):
+            return None
+        return max(0.0, available)
+
+    async def run(self, awaitable: Awaitable[Any], cap: Optional[float] = None, reserve: float = 0) -> Any:
+        """
+        在预算内执行一个阶段，超时抛出asyncio.TimeoutError。
+        :param cap: 本阶段自身的超时上限(秒)
+        :param reserve: 为后续阶段保留的时间(秒)
+        """
+        return await asyncio.wait_for(awaitable, timeout=self.timeout(cap, reserve))
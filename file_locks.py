@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional, Set
+
+LOCK_SUFFIX = ".lock"
+# 等待锁时的轮询间隔(秒)
+LOCK_POLL_INTERVAL = 0.5
+# 持有者刷新锁文件修改时间的间隔(秒)
+LOCK_HEARTBEAT = 10
+# 锁文件超过该秒数未刷新视为持有进程已崩溃，可以强制接管
+LOCK_STALE_AFTER = 60
+
+
+class LockTimeout(TimeoutError):
+    """在指定时间内未能获取文件锁"""
+
+
+def lock_path_for(path: str) -> str:
+    """输出文件对应的锁文件路径：<输出文件>.lock"""
+    return f"{path}{LOCK_SUFFIX}"
+
+
+def is_stale_lock(lock_path: str, stale_after: float = LOCK_STALE_AFTER) -> bool:
+    """锁文件是否已过期（持有者超过stale_after秒没有刷新）"""
+    try:
+        return time.time() - os.path.getmtime(lock_path) > stale_after
+    except OSError:
+        return False
+
+
+class _Heartbeat:
+    """后台线程定期刷新本进程持有的所有锁文件的修改时间，使其他进程能区分“仍在处理”和“持有者已崩溃”"""
+
+    def __init__(self, interval: float = LOCK_HEARTBEAT):
+        self.interval = interval
+        self._held: Set[str] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, lock_path: str):
+        with self._lock:
+            self._held.add(lock_path)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="music-lock-heartbeat", daemon=True)
+                self._thread.start()
+
+    def discard(self, lock_path: str):
+        with self._lock:
+            self._held.discard(lock_path)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                held = list(self._held)
+            for lock_path in held:
+                try:
+                    os.utime(lock_path, None)
+                except OSError:
+                    pass
+
+
+_heartbeat = _Heartbeat()
+
+
+class FileLock:
+    """
+    跨进程文件锁：以 O_CREAT|O_EXCL 原子创建 <输出文件>.lock，创建成功即持有锁。
+    插件进程和Flask处理进程、以及同一进程的多个线程之间都有效；持有期间由后台线程刷新锁文件，
+    持有进程崩溃留下的锁在stale_after秒后被接管。支持 with 和 async with。
+    """
+
+    def __init__(self, path: str, timeout: Optional[float] = None, poll_interval: float = LOCK_POLL_INTERVAL,
+                 stale_after: float = LOCK_STALE_AFTER):
+        """
+        :param path: 要保护的输出文件路径
+        :param timeout: 等待锁的最长时间(秒)，None表示一直等待
+        :param poll_interval: 轮询间隔(秒)
+        :param stale_after: 锁文件超过该秒数未刷新视为过期
+        """
+        self.path = path
+        self.lock_path = lock_path_for(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.held = False
+
+    def _owner_info(self) -> Dict[str, Any]:
+        return {"pid": os.getpid(), "host": socket.gethostname(), "acquired_at": time.time()}
+
+    def try_acquire(self) -> bool:
+        """尝试获取一次，不等待"""
+        for _ in range(2):
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if is_stale_lock(self.lock_path, self.stale_after) and self._break_stale():
+                    continue
+                return False
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._owner_info(), f)
+            self.held = True
+            _heartbeat.add(self.lock_path)
+            return True
+        return False
+
+    def _break_stale(self) -> bool:
+        # 先改名再检查：多个等待者同时接管时只有一个能改名成功，
+        # 若改名时锁恰好已被他人重新获取（文件是新的），用硬链接原子地放回
+        stale_path = f"{self.lock_path}.{os.getpid()}.{threading.get_ident()}.stale"
+        try:
+            os.replace(self.lock_path, stale_path)
+        except OSError:
+            return False
+        restored = False
+        if not is_stale_lock(stale_path, self.stale_after):
+            try:
+                os.link(stale_path, self.lock_path)
+                restored = True
+            except OSError:
+                pass
+        try:
+            os.remove(stale_path)
+        except OSError:
+            pass
+        return not restored
+
+    def acquire(self):
+        """阻塞等待获取锁，超时抛出LockTimeout"""
+        started = time.monotonic()
+        while not self.try_acquire():
+            if self.timeout is not None and time.monotonic() - started >= self.timeout:
+                raise LockTimeout(f"等待文件锁超时: {self.lock_path}")
+            time.sleep(self.poll_interval)
+
+    async def acquire_async(self):
+        """在事件循环中等待获取锁（不阻塞事件循环），超时抛出LockTimeout"""
+        started = time.monotonic()
+        while not self.try_acquire():
+            if self.timeout is not None and time.monotonic() - started >= self.timeout:
+                raise LockTimeout(f"等待文件锁超时: {self.lock_path}")
+            await asyncio.sleep(self.poll_interval)
+
+    def release(self):
+        if not self.held:
+            return
+        self.held = False
+        _heartbeat.discard(self.lock_path)
+        try:
+            os.remove(self.lock_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class KeyedAsyncLock:
+    """按键区分的asyncio锁：同一事件循环内对同一键的协程依次执行，空闲的键自动清理"""
+
+    def __init__(self):
+        # (事件循环, 键) -> [锁, 使用者数]
+        self._locks: Dict[Any, list] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: Any):
+        # asyncio.Lock 绑定事件循环，Flask子线程各自的临时loop分别使用自己的锁
+        slot_key = (asyncio.get_running_loop(), key)
+        slot = self._locks.get(slot_key)
+        if slot is None:
+            slot = self._locks[slot_key] = [asyncio.Lock(), 0]
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            slot[1] -= 1
+            if slot[1] == 0:
+                self._locks.pop(slot_key, None)
+
+    def __len__(self):
+        return len(self._locks)
+
+
+_async_locks = KeyedAsyncLock()
+
+
+@asynccontextmanager
+async def async_file_lock(path: str, timeout: Optional[float] = None):
+    """
+    异步获取输出文件的锁：同一事件循环内的协程先在asyncio锁上排队（不轮询），
+    轮到后再获取跨进程文件锁。获取后调用方应重新检查输出是否已由前一个持有者生成。
+    :param path: 要保护的输出文件路径
+    :param timeout: 等待文件锁的最长时间(秒)，None表示一直等待
+    """
+    async with _async_locks.hold(os.path.abspath(path)):
+        async with FileLock(path, timeout=timeout) as lock:
+            yield lock
+
+
+@contextmanager
+def file_lock(path: str, timeout: Optional[float] = None):
+    """
+    同步获取输出文件的跨进程锁，用于在线程中运行的分离、变声、合成步骤。
+    获取后调用方应重新检查输出是否已由前一个持有者生成。
+    :param path: 要保护的输出文件路径
+    :param timeout: 等待锁的最长时间(秒)，None表示一直等待
+    """
+    with FileLock(path, timeout=timeout) as lock:
+        yield lock
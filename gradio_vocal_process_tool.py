@@ -5,9 +5,14 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+try:
+    from .file_locks import file_lock
+except ImportError:
+    from file_locks import file_lock
+
 def gradio_process_vocal(input_wav: str, gradio_url: str = "http://127.0.0.1:7860") -> str:
     """
-    用Selenium自动上传vocal wav到Gradio并处理，返回处理后wav路径。
+    用Selenium自动上传vocal wav到Gradio并处理，返回处理后wav路径（<输入文件名>_changed.wav）。
     :param input_wav: 输入的vocal wav文件路径
     :param gradio_url: Gradio WebUI地址
     :return: 处理后wav文件路径
@@ -19,6 +24,14 @@ def gradio_process_vocal(input_wav: str, gradio_url: str = "http://127.0.0.1:786
     changed_path = os.path.join(os.path.dirname(input_wav), f"{base_name}_changed.wav")
     if os.path.exists(changed_path):
         return changed_path
+    # 同一人声同时只变声一次，后到的请求等待并复用结果
+    with file_lock(changed_path):
+        if os.path.exists(changed_path):
+            return changed_path
+        return _run_conversion(input_wav, changed_path, gradio_url)
+
+def _run_conversion(input_wav: str, changed_path: str, gradio_url: str) -> str:
+    """驱动Gradio WebUI对人声变声，结果写入changed_path"""
     driver = webdriver.Chrome()
     driver.get(gradio_url)
     wait = WebDriverWait(driver, 20)
@@ -136,8 +149,9 @@ def gradio_process_vocal(input_wav: str, gradio_url: str = "http://127.0.0.1:786
             print(f"[警告] 退出前卸载模型失败: {e2}")
         driver.quit()
         raise
-    # 下载输出wav
-    output_path = os.path.join(os.path.dirname(input_wav), 'gradio_output.wav')
+    # 下载输出wav：每首歌写入各自的文件（原先共用 gradio_output.wav，并发时会互相覆盖），
+    # 先写临时文件再替换，中断时不会留下被当作已完成的半截文件
+    output_path = f"{changed_path}.{os.getpid()}.tmp"
     import requests
     try:
         # 如果src是file=本地路径，直接复制本地文件
@@ -163,6 +177,8 @@ def gradio_process_vocal(input_wav: str, gradio_url: str = "http://127.0.0.1:786
                         f.write(chunk)
     except Exception as e:
         print(f"[错误] 下载音频失败: {e}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
         # 退出前再次尝试卸载模型
         try:
             unload_button = driver.find_element(By.ID, "component-32")
@@ -180,7 +196,8 @@ def gradio_process_vocal(input_wav: str, gradio_url: str = "http://127.0.0.1:786
     except Exception as e:
         print(f"[警告] 退出前卸载模型失败: {e}")
     driver.quit()
-    return output_path
+    os.replace(output_path, changed_path)
+    return changed_path
 
 def gradio_process_vocal_tts(text: str, gradio_url: str = "http://127.0.0.1:7860") -> str:
     """
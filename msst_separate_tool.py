@@ -6,6 +6,11 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+try:
+    from .file_locks import file_lock
+except ImportError:
+    from file_locks import file_lock
+
 def find_results_dir():
     """
     优先读取config.toml中的msst_result_dir配置，若无则递归查找 MSST-WebUI-zluda/results 文件夹。
@@ -55,6 +60,14 @@ def msst_separate(flac_path: str, results_dir: Optional[str] = None, webui_url:
     # 如果分离结果已存在，直接返回
     if os.path.exists(other_path) and os.path.exists(vocals_path):
         return other_path, vocals_path
+    # 同一首歌同时只分离一次，后到的请求等待并复用结果
+    with file_lock(vocals_path):
+        if os.path.exists(other_path) and os.path.exists(vocals_path):
+            return other_path, vocals_path
+        return _run_separation(flac_path, other_path, vocals_path, webui_url)
+
+def _run_separation(flac_path: str, other_path: str, vocals_path: str, webui_url: str):
+    """驱动MSST-WebUI执行一次分离，等待other/vocals文件生成"""
     # 启动浏览器
     driver = webdriver.Chrome()
     driver.get(webui_url)
@@ -0,0 +1,284 @@
+import asyncio
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+
+try:
+    from .api_guard import CircuitBreaker, CircuitOpenError, TokenBucket, backoff_delay
+    from .music_cache import SingleFlight, SongInfoCache, make_song_key
+    from .music_providers import HttpMusicProvider, MusicProvider, ProviderRouter, build_providers
+except ImportError:
+    from api_guard import CircuitBreaker, CircuitOpenError, TokenBucket, backoff_delay
+    from music_cache import SingleFlight, SongInfoCache, make_song_key
+    from music_providers import HttpMusicProvider, MusicProvider, ProviderRouter, build_providers
+
+DEFAULT_API_URL = "https://api.vkeys.cn"
+
+
+class MusicApiClient:
+    """
+    网易云音乐API客户端，插件内所有组件共用同一个keep-alive连接池，
+    避免每次点歌都重新做DNS解析和TLS握手。请求经ProviderRouter分发到最快的健康提供方。
+    """
+
+    def __init__(self, base_url: str = DEFAULT_API_URL, timeout: float = 10, pool_size: int = 20,
+                 keepalive_timeout: float = 60, cache: Optional[SongInfoCache] = None,
+                 rate_limiter: Optional[TokenBucket] = None, breaker: Optional[CircuitBreaker] = None,
+                 providers: Optional[Sequence[MusicProvider]] = None):
+        """
+        :param base_url: 音乐API基础URL；调用方传入该地址时视为使用已配置的提供方路由
+        :param timeout: 单次请求超时时间(秒)
+        :param pool_size: 连接池最大连接数
+        :param keepalive_timeout: 空闲连接保活时间(秒)
+        :param cache: 歌曲信息缓存，默认创建一个SongInfoCache
+        :param rate_limiter: 上游请求限流器
+        :param breaker: 未指定providers时，base_url对应提供方的熔断器
+        :param providers: 提供方列表，默认只有base_url一个
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.cache = cache if cache is not None else SongInfoCache()
+        self.single_flight = SingleFlight()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else TokenBucket()
+        if not providers:
+            providers = [HttpMusicProvider("default", self.base_url,
+                                           breaker=breaker if breaker is not None else CircuitBreaker())]
+        self.router = ProviderRouter(providers)
+        # 成功响应监听器 callback(word, quality, choose, response)，如本地歌曲目录收录；在线程池中调用
+        self.response_listeners: List[Callable[[str, Any, Any, Dict], None]] = []
+        # aiohttp会话绑定事件循环：插件主循环和Flask子线程各自的loop各用一个，互不替换
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self._sessions_lock = threading.Lock()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """
+        获取当前事件循环的共享ClientSession，首次调用时创建。
+        已关闭的事件循环留下的会话（其连接已随loop失效）在创建新会话时清理。
+        """
+        loop = asyncio.get_running_loop()
+        with self._sessions_lock:
+            session = self._sessions.get(loop)
+            if session is not None and not session.closed:
+                return session
+            for other in [other for other in self._sessions if other.is_closed()]:
+                del self._sessions[other]
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def fetch(self, word: str, quality: Any, choose: Any, base_url: Optional[str] = None,
+                    need_url: bool = True) -> Optional[Dict]:
+        """
+        请求一次网易云点歌接口，返回原始JSON。成功结果会写入缓存，命中缓存时不访问网络；
+        相同查询的并发请求合并为一次上游调用。
+        :param word: 搜索词
+        :param quality: 音质等级
+        :param choose: 选择第几个搜索结果
+        :param base_url: 临时覆盖的API地址，默认使用客户端配置
+        :param need_url: 是否需要未过期的播放链接；为False时只要元数据已缓存就不访问网络
+        :return: 接口返回的JSON，HTTP状态码非200时返回None
+        """
+        key = make_song_key(word, quality, choose)
+        cached = self.cache.get(key, need_url=need_url)
+        if cached is not None:
+            return cached
+        # 只需元数据的请求可能由不含播放链接的本地提供方应答，不与需要链接的请求合并
+        return await self.single_flight.do(
+            key + (need_url,), lambda: self._request_and_cache(key, word, quality, choose, base_url, need_url=need_url)
+        )
+
+    async def refresh(self, word: str, quality: Any, choose: Any, base_url: Optional[str] = None,
+                      token_reserve: float = 0) -> Optional[Dict]:
+        """
+        低优先级地绕过缓存重新请求一次并刷新缓存，供后台预热使用：
+        熔断器打开或令牌桶余量不足token_reserve时直接放弃，不排队等待、不挤占聊天请求的配额。
+        :param token_reserve: 需要为聊天请求保留的令牌数
+        :return: 接口返回的JSON，被跳过或HTTP失败时返回None
+        """
+        if self.router.is_open or not self.rate_limiter.try_acquire(reserve=token_reserve):
+            return None
+        key = make_song_key(word, quality, choose)
+        return await self.single_flight.do(
+            key + (True,), lambda: self._request_and_cache(key, word, quality, choose, base_url, acquire=False)
+        )
+
+    async def _request_and_cache(self, key, word: str, quality: Any, choose: Any,
+                                 base_url: Optional[str] = None, acquire: bool = True,
+                                 need_url: bool = True) -> Optional[Dict]:
+        data = await self._request(word, quality, choose, base_url, acquire=acquire, need_url=need_url)
+        if data and data.get("code") == 200:
+            self.cache.set(key, data)
+            if self.response_listeners:
+                # 监听器可能写磁盘（如SQLite），不在事件循环中执行
+                await asyncio.to_thread(self._notify_listeners, word, quality, choose, data)
+        return data
+
+    def _notify_listeners(self, word: str, quality: Any, choose: Any, data: Dict):
+        for listener in self.response_listeners:
+            try:
+                listener(word, quality, choose, data)
+            except Exception:
+                pass
+
+    async def _request(self, word: str, quality: Any, choose: Any, base_url: Optional[str] = None,
+                       acquire: bool = True, need_url: bool = True) -> Optional[Dict]:
+        """
+        实际发出HTTP请求，经过限流器和提供方路由；各提供方的熔断和延迟统计由ProviderRouter维护。
+        :param base_url: 未在提供方中登记的API地址时只请求该地址
+        :param acquire: 是否从限流器取令牌（调用方已自行取过时为False）
+        :param need_url: 为False时允许不含播放链接的本地提供方兜底
+        """
+        providers = None
+        if base_url and base_url.rstrip("/") != self.base_url:
+            provider = self.router.find(base_url) or self.router.adhoc(base_url)
+            providers = [provider]
+        if acquire:
+            await self.rate_limiter.acquire()
+        session = await self.get_session()
+        return await self.router.request(session, word, quality, choose, need_url=need_url, providers=providers)
+
+    async def fetch_music_info(self, word: str, quality: Any, choose: Any, need_url: bool = True) -> Optional[Dict]:
+        """
+        请求歌曲信息，仅在接口业务码为200时返回data字段。
+        :return: 歌曲信息字典，失败时返回None
+        """
+        data = await self.fetch(word, quality, choose, need_url=need_url)
+        if data and data.get("code") == 200:
+            return data.get("data", {})
+        return None
+
+    async def fetch_with_retry(self, word: str, quality: Any, tries: List[int], retry_base_delay: float = 0.5,
+                               base_url: Optional[str] = None,
+                               need_url: bool = True) -> Tuple[bool, Optional[Dict], Optional[int]]:
+        """
+        依次尝试候选choose，失败后按带抖动的指数退避等待；熔断器打开时立即抛出CircuitOpenError。
+        :param tries: 按优先级排列的choose候选
+        :param retry_base_delay: 退避基准时间(秒)
+        :return: (是否成功, 歌曲信息, 实际使用的choose)，没有候选时为 (False, None, None)
+        """
+        if not tries:
+            return False, None, None
+        for idx, c in enumerate(tries):
+            if idx > 0:
+                await asyncio.sleep(backoff_delay(idx - 1, base=retry_base_delay))
+            data = await self.fetch(word, quality, c, base_url=base_url, need_url=need_url)
+            if data and data.get("code") == 200:
+                return True, data.get("data", {}), c
+        return False, None, tries[-1]
+
+    async def fetch_first_available(self, word: str, quality: Any, tries: List[int], hedge_delay: float = 0.0,
+                                    base_url: Optional[str] = None,
+                                    need_url: bool = True) -> Tuple[bool, Optional[Dict], Optional[int]]:
+        """
+        对冲请求：并发（或按hedge_delay错峰）请求所有候选choose，返回优先级最高的成功结果并取消其余请求。
+        前一个候选失败时下一个候选立即发出，不再等待错峰延迟。第一个候选被熔断器拒绝时立即抛出CircuitOpenError；
+        其余候选被拒绝（如半开状态只放行一个探测请求、或前一个候选的失败使熔断器打开）时按未命中处理，不中断整个请求。
+        :param tries: 按优先级排列的choose候选
+        :param hedge_delay: 相邻候选的错峰延迟(秒)，0表示全部同时发出
+        :return: (是否成功, 歌曲信息, 实际使用的choose)，没有候选时为 (False, None, None)
+        """
+        if not tries:
+            return False, None, None
+        started = [asyncio.Event() for _ in tries]
+        failed = [asyncio.Event() for _ in tries]
+        errors: List[BaseException] = []
+
+        async def attempt(idx: int, choose: int) -> Optional[Dict]:
+            if idx > 0 and hedge_delay > 0:
+                await started[idx - 1].wait()
+                try:
+                    await asyncio.wait_for(failed[idx - 1].wait(), timeout=hedge_delay)
+                except asyncio.TimeoutError:
+                    pass
+            started[idx].set()
+            try:
+                data = await self.fetch(word, quality, choose, base_url=base_url, need_url=need_url)
+            except CircuitOpenError as e:
+                if idx == 0:
+                    raise
+                errors.append(e)
+                data = None
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                errors.append(e)
+                data = None
+            if data and data.get("code") == 200:
+                return data.get("data", {})
+            failed[idx].set()
+            return None
+
+        tasks = [asyncio.create_task(attempt(idx, c)) for idx, c in enumerate(tries)]
+        try:
+            for idx, task in enumerate(tasks):
+                info = await task
+                if info is not None:
+                    return True, info, tries[idx]
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        # 所有候选都是网络异常或被熔断时向上抛出，与顺序重试的行为保持一致
+        if errors and len(errors) == len(tries):
+            raise errors[-1]
+        return False, None, tries[-1]
+
+    def provider_stats(self) -> List[Dict[str, Any]]:
+        """各提供方的熔断状态、p50/p95耗时和错误率"""
+        return self.router.stats()
+
+    def add_response_listener(self, listener: Callable[[str, Any, Any, Dict], None]):
+        """注册成功响应监听器（在线程池中调用，需线程安全）"""
+        self.response_listeners.append(listener)
+
+    async def close(self):
+        """关闭当前事件循环的连接池；Flask子线程在关闭自己的loop前调用"""
+        with self._sessions_lock:
+            session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+
+# ===== 插件级共享实例 =====
+_shared_client: Optional[MusicApiClient] = None
+
+
+def configure_music_api_client(base_url: str = DEFAULT_API_URL, timeout: float = 10, pool_size: int = 20,
+                               cache_max_entries: int = 512, cache_meta_ttl: float = 7 * 86400,
+                               cache_url_ttl: float = 1200, rate_limit: float = 5, rate_burst: int = 10,
+                               breaker_failures: int = 5, breaker_reset: float = 30,
+                               providers: Optional[Sequence[str]] = None) -> MusicApiClient:
+    """
+    由MusicPlugin在加载时调用，按配置创建插件共享的音乐API客户端。
+    :param providers: 提供方配置，见 music_providers.build_providers
+    """
+    global _shared_client
+    _shared_client = MusicApiClient(
+        base_url=base_url,
+        timeout=timeout,
+        pool_size=pool_size,
+        cache=SongInfoCache(max_entries=cache_max_entries, meta_ttl=cache_meta_ttl, url_ttl=cache_url_ttl),
+        rate_limiter=TokenBucket(rate=rate_limit, capacity=rate_burst),
+        providers=build_providers(providers or [], base_url, breaker_failures=breaker_failures,
+                                  breaker_reset=breaker_reset),
+    )
+    return _shared_client
+
+
+def get_music_api_client() -> MusicApiClient:
+    """
+    获取插件共享的音乐API客户端，未配置时（如独立脚本运行）使用默认配置创建。
+    """
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = MusicApiClient()
+    return _shared_client
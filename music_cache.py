@@ -0,0 +1,261 @@
+import asyncio
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from urllib.parse import urlparse
+
+# 网易云CDN签名链接形如 http://m7.music.126.net/20250622062258/<签名>/...，第一段为北京时间的过期时间
+_URL_EXPIRY_RE = re.compile(r"^/(\d{14})/")
+_CDN_TZ = timezone(timedelta(hours=8))
+
+try:
+    from .query_normalizer import normalize_query
+except ImportError:
+    from query_normalizer import normalize_query
+
+
+def make_song_key(word: str, quality: Any, choose: Any) -> Tuple[str, str, int]:
+    """
+    生成歌曲查询的缓存键：(规范化搜索词, 音质, choose)。
+    """
+    normalized_word = normalize_query(word)
+    try:
+        choose = int(choose)
+    except (TypeError, ValueError):
+        choose = 1
+    return normalized_word, str(quality), choose
+
+
+class TTLCache:
+    """
+    带过期时间的进程内LRU缓存，超过容量时淘汰最久未使用的条目，并统计命中/未命中次数。
+    插件和Flask子线程各自的事件循环共用同一个实例，所有操作由threading.Lock保护。
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 1200):
+        """
+        :param max_entries: 最大条目数
+        :param ttl: 条目存活时间(秒)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """读取缓存，过期或不存在时返回None"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """写入缓存，可为单个条目指定ttl"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def ttl_remaining(self, key: Hashable) -> float:
+        """条目剩余存活时间(秒)，不存在或已过期时返回0；不计入命中统计"""
+        with self._lock:
+            item = self._data.get(key)
+        if item is None:
+            return 0.0
+        return max(0.0, item[0] - time.monotonic())
+
+    def pop(self, key: Hashable):
+        """删除条目"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中统计"""
+        with self._lock:
+            hits, misses, size = self.hits, self.misses, len(self._data)
+        total = hits + misses
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
+
+
+def parse_url_expiry(url: str) -> Optional[float]:
+    """
+    解析网易云签名播放链接中的过期时间。
+    :param url: 播放链接
+    :return: 过期时间的Unix时间戳，无法解析时返回None
+    """
+    if not url:
+        return None
+    match = _URL_EXPIRY_RE.match(urlparse(url).path)
+    if not match:
+        return None
+    try:
+        expires = datetime.strptime(match.group(1), "%Y%m%d%H%M%S").replace(tzinfo=_CDN_TZ)
+    except ValueError:
+        return None
+    return expires.timestamp()
+
+
+def is_url_fresh(url: str, margin: float = 60, default_ttl: float = 0, fetched_at: Optional[float] = None) -> bool:
+    """
+    判断播放链接是否仍可用（距离过期至少还有margin秒）。
+    无法解析过期时间时，按fetched_at + default_ttl判断。
+    """
+    if not url:
+        return False
+    expires_at = parse_url_expiry(url)
+    if expires_at is None:
+        if fetched_at is None:
+            return False
+        expires_at = fetched_at + default_ttl
+    return expires_at - margin > time.time()
+
+
+class SongInfoCache:
+    """
+    歌曲信息分离缓存：稳定的元数据（id、歌名、歌手、专辑、封面、时长等）长期缓存，
+    带签名的播放链接按其自身过期时间单独缓存，过期后只需刷新链接。
+    存取的都是接口原始JSON（含code/data），与MusicApiClient.fetch的返回值一致。
+    """
+
+    def __init__(self, max_entries: int = 512, meta_ttl: float = 7 * 86400, url_ttl: float = 1200,
+                 url_margin: float = 60):
+        """
+        :param max_entries: 最大条目数
+        :param meta_ttl: 元数据有效期(秒)
+        :param url_ttl: 播放链接无法解析过期时间时的有效期(秒)
+        :param url_margin: 播放链接提前失效的安全余量(秒)
+        """
+        self.meta = TTLCache(max_entries=max_entries, ttl=meta_ttl)
+        self.urls = TTLCache(max_entries=max_entries, ttl=url_ttl)
+        self.url_margin = url_margin
+
+    def get(self, key: Hashable, need_url: bool = True) -> Optional[Dict]:
+        """
+        :param need_url: 是否需要可用的播放链接；为False时仅凭元数据即可命中（如只需歌曲id的卡片发送）
+        :return: 接口原始JSON的副本，未命中时返回None
+        """
+        meta = self.meta.get(key)
+        if meta is None:
+            return None
+        result = copy.deepcopy(meta)
+        url = self.urls.get(key) if need_url else None
+        if url:
+            result.setdefault("data", {})["url"] = url
+        elif need_url:
+            return None
+        return result
+
+    def set(self, key: Hashable, response: Dict):
+        """拆分写入接口返回的JSON"""
+        response = copy.deepcopy(response)
+        data = response.get("data") or {}
+        url = data.pop("url", "")
+        self.meta.set(key, response)
+        if url:
+            expires_at = parse_url_expiry(url)
+            ttl = None if expires_at is None else expires_at - self.url_margin - time.time()
+            if ttl is None or ttl > 0:
+                self.urls.set(key, url, ttl=ttl)
+
+    def ttl_remaining(self, key: Hashable, need_url: bool = True) -> float:
+        """
+        缓存条目还能命中多久(秒)，供后台预热判断是否需要刷新。
+        :param need_url: 是否把播放链接的剩余有效期计算在内
+        """
+        remaining = self.meta.ttl_remaining(key)
+        if need_url:
+            remaining = min(remaining, self.urls.ttl_remaining(key))
+        return remaining
+
+    def pop(self, key: Hashable):
+        self.meta.pop(key)
+        self.urls.pop(key)
+
+    def clear(self):
+        self.meta.clear()
+        self.urls.clear()
+
+    def __len__(self) -> int:
+        return len(self.meta)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回元数据与播放链接两部分的命中统计"""
+        return {"meta": self.meta.stats(), "url": self.urls.stats()}
+
+
+class _Flight:
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    合并相同键的并发请求：同一时刻只有一个上游请求在途，其余调用者等待同一个结果。
+    所有等待者都取消时，在途请求随之取消。
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        :param key: 请求键
+        :param factory: 无参协程函数，仅在没有在途请求时调用
+        :return: 上游请求的结果
+        """
+        # 以事件循环区分，Flask子线程各自的loop互不共享在途任务
+        flight_key = (id(asyncio.get_running_loop()), key)
+        flight = self._flights.get(flight_key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(factory()))
+            self._flights[flight_key] = flight
+
+            def _cleanup(_task, flight=flight):
+                if self._flights.get(flight_key) is flight:
+                    del self._flights[flight_key]
+
+            flight.task.add_done_callback(_cleanup)
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def __len__(self) -> int:
+        return len(self._flights)
@@ -1,6 +1,7 @@
 from flask import Flask, request, render_template_string, jsonify, send_file
 from napcat_client import NapcatClient
 from gradio_vocal_process_tool import gradio_process_vocal_tts
+from music_api_client import get_music_api_client
 import threading
 from test_full_pipeline import main
 import os
@@ -52,16 +53,22 @@ def run_main(song, choose, quality, result_list):
     sys_stdout = sys.stdout
     sys.stdout = buf
     # 修复子线程无 event loop 问题
+    loop = None
     try:
         asyncio.get_running_loop()
     except RuntimeError:
-        asyncio.set_event_loop(asyncio.new_event_loop())
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
     try:
         main(song, choose, quality)
     except Exception as e:
         print(f"发生错误: {e}")
     finally:
         sys.stdout = sys_stdout
+        if loop is not None:
+            # 关闭本线程loop上的API连接池，避免每个请求留下一个未关闭的会话
+            loop.run_until_complete(get_music_api_client().close())
+            loop.close()
     result_list.append(buf.getvalue())
 
 # Napcat 发送语音功能示例
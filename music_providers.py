@@ -0,0 +1,301 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence
+
+import aiohttp
+
+try:
+    from .api_guard import CircuitBreaker, CircuitOpenError
+except ImportError:
+    from api_guard import CircuitBreaker, CircuitOpenError
+
+NETEASE_ROUTE = "/v2/music/netease"
+# 计为上游失败、需要切换到下一个提供方的异常
+PROVIDER_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+
+
+class ProviderUnavailable(Exception):
+    """提供方返回5xx/429，本次请求应换下一个提供方"""
+
+
+class ProviderStats:
+    """
+    提供方的实时统计：最近window次成功请求的耗时分位数（p50/p95），以及最近window次请求的错误率。
+    """
+
+    def __init__(self, window: int = 100):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+
+    def record(self, latency: float, ok: bool):
+        self.requests += 1
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+        else:
+            self.failures += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        """耗时分位数(秒)，还没有成功样本时返回None"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    @property
+    def p50(self) -> Optional[float]:
+        return self.percentile(50)
+
+    @property
+    def p95(self) -> Optional[float]:
+        return self.percentile(95)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "p50": self.p50,
+            "p95": self.p95,
+            "error_rate": self.error_rate,
+        }
+
+
+class MusicProvider:
+    """
+    音乐信息提供方基类：接受 (word, quality, choose)，返回与vkeys网易云接口相同结构的JSON（含code/data）。
+    每个提供方有独立的熔断器和延迟统计。
+    """
+
+    # 是否能返回播放链接；不能的提供方只在只需元数据时使用
+    supports_url = True
+    # 路由层级：先按层级、再按延迟排序，数字大的只在前面的层级都不可用时兜底
+    tier = 0
+
+    def __init__(self, name: str, breaker: Optional[CircuitBreaker] = None, window: int = 100):
+        """
+        :param name: 提供方名称，用于日志和统计
+        :param breaker: 熔断器，默认创建一个
+        :param window: 延迟和错误率统计的样本窗口
+        """
+        self.name = name
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.stats = ProviderStats(window)
+
+    async def request(self, session: aiohttp.ClientSession, word: str, quality: Any, choose: Any) -> Optional[Dict]:
+        """
+        请求一次歌曲信息。
+        :return: 接口JSON；提供方明确没有结果（如HTTP 4xx）时返回None
+        :raises ProviderUnavailable: 提供方暂时不可用，应换下一个
+        """
+        raise NotImplementedError
+
+    def score(self) -> float:
+        """路由评分，越小越优先：p50与p95耗时的均值按错误率加权，还没有样本的提供方优先试探"""
+        p50, p95 = self.stats.p50, self.stats.p95
+        if p50 is None:
+            return 0.0
+        return (p50 + p95) / 2 * (1 + 4 * self.stats.error_rate)
+
+    def to_dict(self) -> Dict[str, Any]:
+        info = {"name": self.name, "state": self.breaker.state, "tier": self.tier}
+        info.update(self.stats.to_dict())
+        return info
+
+
+class HttpMusicProvider(MusicProvider):
+    """vkeys 接口格式的HTTP提供方（vkeys官方或自建镜像）"""
+
+    def __init__(self, name: str, base_url: str, route: str = NETEASE_ROUTE, **kwargs):
+        """
+        :param base_url: 提供方基础URL
+        :param route: 网易云点歌接口路径
+        """
+        super().__init__(name, **kwargs)
+        self.base_url = base_url.rstrip("/")
+        self.route = route
+
+    async def request(self, session: aiohttp.ClientSession, word: str, quality: Any, choose: Any) -> Optional[Dict]:
+        params = {
+            "word": word,
+            "quality": quality,
+            "choose": choose
+        }
+        async with session.get(f"{self.base_url}{self.route}", params=params) as response:
+            if response.status >= 500 or response.status == 429:
+                raise ProviderUnavailable(f"{self.name} HTTP {response.status}")
+            if response.status != 200:
+                return None
+            return await response.json(content_type=None)
+
+
+class LocalCatalogProvider(MusicProvider):
+    """
+    本地兜底提供方：从本地歌曲目录解析歌曲元数据，不含播放链接。
+    所有HTTP提供方都不可用时，发卡片等只需歌曲id的请求仍可完成。
+    """
+
+    supports_url = False
+    tier = 1
+
+    def __init__(self, name: str = "local", catalog=None, **kwargs):
+        """
+        :param catalog: SongCatalog实例，默认使用插件共享的本地歌曲目录
+        """
+        super().__init__(name, **kwargs)
+        self._catalog = catalog
+
+    async def request(self, session: aiohttp.ClientSession, word: str, quality: Any, choose: Any) -> Optional[Dict]:
+        catalog = self._catalog
+        if catalog is None:
+            try:
+                from .song_catalog import get_song_catalog
+            except ImportError:
+                from song_catalog import get_song_catalog
+            catalog = get_song_catalog()
+        if catalog is None:
+            return None
+        info = await asyncio.to_thread(catalog.lookup, word, choose)
+        if not info:
+            return None
+        return {"code": 200, "message": "local catalog", "data": info}
+
+
+class ProviderRouter:
+    """
+    多提供方路由：按层级和实时延迟评分排序，优先请求最快的健康提供方，
+    失败（网络异常、超时、5xx/429）时依次切换到下一个；所有提供方都熔断时抛出CircuitOpenError。
+    """
+
+    def __init__(self, providers: Sequence[MusicProvider], explore_ratio: float = 0.05):
+        """
+        :param providers: 提供方列表
+        :param explore_ratio: 随机把一个健康提供方提到最前的概率，使较慢的提供方恢复后能重新被测到
+        """
+        self.providers: List[MusicProvider] = list(providers)
+        self.explore_ratio = explore_ratio
+        self._adhoc: Dict[str, HttpMusicProvider] = {}
+
+    def find(self, base_url: str) -> Optional[MusicProvider]:
+        """按基础URL查找已配置的提供方"""
+        base_url = base_url.rstrip("/")
+        for provider in self.providers:
+            if getattr(provider, "base_url", None) == base_url:
+                return provider
+        return None
+
+    def adhoc(self, base_url: str, breaker_factory=CircuitBreaker) -> HttpMusicProvider:
+        """调用方临时指定的、未在配置中登记的API地址"""
+        base_url = base_url.rstrip("/")
+        provider = self._adhoc.get(base_url)
+        if provider is None:
+            provider = HttpMusicProvider(base_url, base_url, breaker=breaker_factory())
+            self._adhoc[base_url] = provider
+        return provider
+
+    def ranked(self, need_url: bool = True) -> List[MusicProvider]:
+        """按优先级排列的候选提供方（不含熔断中的）"""
+        candidates = [p for p in self.providers if (p.supports_url or not need_url) and not p.breaker.is_open]
+        candidates.sort(key=lambda p: (p.tier, p.score()))
+        top_tier = [p for p in candidates if p.tier == candidates[0].tier] if candidates else []
+        if len(top_tier) > 1 and random.random() < self.explore_ratio:
+            chosen = random.choice(top_tier[1:])
+            candidates.remove(chosen)
+            candidates.insert(0, chosen)
+        return candidates
+
+    async def request(self, session: aiohttp.ClientSession, word: str, quality: Any, choose: Any,
+                      need_url: bool = True, providers: Optional[Sequence[MusicProvider]] = None) -> Optional[Dict]:
+        """
+        依次请求候选提供方，返回第一个有结论的结果。
+        :param providers: 指定候选提供方，默认按ranked()排序
+        :return: 接口JSON；提供方都没有结果或都返回5xx时返回None
+        :raises CircuitOpenError: 所有候选都在熔断中
+        """
+        candidates = list(providers) if providers is not None else self.ranked(need_url)
+        last_error: Optional[BaseException] = None
+        attempted = False
+        for provider in candidates:
+            if not provider.breaker.allow():
+                continue
+            attempted = True
+            started = time.monotonic()
+            concluded = False
+            try:
+                data = await provider.request(session, word, quality, choose)
+                provider.breaker.record_success()
+                provider.stats.record(time.monotonic() - started, True)
+                concluded = True
+            except ProviderUnavailable:
+                provider.breaker.record_failure()
+                provider.stats.record(time.monotonic() - started, False)
+                concluded = True
+                continue
+            except PROVIDER_ERRORS as e:
+                provider.breaker.record_failure()
+                provider.stats.record(time.monotonic() - started, False)
+                concluded = True
+                last_error = e
+                continue
+            finally:
+                if not concluded:
+                    provider.breaker.release()
+            if data is None and provider.tier > 0:
+                # 兜底提供方没有结果，不代表其他提供方也没有
+                continue
+            return data
+        if not attempted:
+            raise CircuitOpenError(self.retry_after(need_url))
+        if last_error is not None:
+            # 与单一提供方时的行为一致：网络异常向上抛出，由调用方决定是否重试
+            raise last_error
+        return None
+
+    def retry_after(self, need_url: bool = True) -> float:
+        waits = [p.breaker.retry_after() for p in self.providers if p.supports_url or not need_url]
+        return min(waits) if waits else 0.0
+
+    @property
+    def is_open(self) -> bool:
+        """能返回播放链接的提供方是否全部在熔断中"""
+        return all(p.breaker.is_open for p in self.providers if p.supports_url)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [p.to_dict() for p in self.providers]
+
+
+def build_providers(specs: Sequence[str], default_base_url: str, breaker_failures: int = 5,
+                    breaker_reset: float = 30) -> List[MusicProvider]:
+    """
+    按配置创建提供方列表。
+    :param specs: 形如 "名称=URL" 的HTTP提供方，或 "local" 表示本地歌曲目录兜底；为空时只使用default_base_url
+    :param default_base_url: 未配置提供方时使用的API地址（api.base_url）
+    """
+    providers: List[MusicProvider] = []
+    for spec in specs or []:
+        spec = str(spec).strip()
+        if not spec:
+            continue
+        breaker = CircuitBreaker(failure_threshold=breaker_failures, reset_timeout=breaker_reset)
+        if spec == "local":
+            providers.append(LocalCatalogProvider(breaker=breaker))
+            continue
+        name, sep, url = spec.partition("=")
+        if not sep:
+            name, url = spec, spec
+        providers.append(HttpMusicProvider(name.strip(), url.strip(), breaker=breaker))
+    if not any(p.supports_url for p in providers):
+        providers.insert(0, HttpMusicProvider(
+            "default", default_base_url,
+            breaker=CircuitBreaker(failure_threshold=breaker_failures, reset_timeout=breaker_reset)
+        ))
+    return providers
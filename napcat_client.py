@@ -1,191 +1,393 @@
+import asyncio
 import http.client
+import itertools
 import json
+from typing import Any, Dict, List, Optional, Tuple
 
-class NapcatClient:
-    def send_group_text(self, group_id: int, text: str):
-        """
-        发送文本消息到指定群聊。
-        :param group_id: 群号
-        :param text: 文本内容
-        :return: Napcat响应内容
-        """
-        conn = http.client.HTTPConnection(self.host, self.port)
-        payload = json.dumps({
-            "group_id": group_id,
-            "message": [
-                {
-                    "type": "text",
-                    "data": {
-                        "text": text
-                    }
-                }
-            ]
-        })
-        headers = {'Content-Type': 'application/json'}
-        conn.request("POST", "/send_group_msg", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        try:
-            resp_json = json.loads(data.decode("utf-8"))
-            success = resp_json.get("status") == "ok" and resp_json.get("retcode") == 0
-            return success, resp_json
-        except Exception:
-            return False, None
+import aiohttp
+
+DEFAULT_NAPCAT_HOST = "127.0.0.1"
+DEFAULT_NAPCAT_PORT = 4998
+DEFAULT_NAPCAT_WS_URL = "ws://127.0.0.1:3001"
+TRANSPORT_HTTP = "http"
+TRANSPORT_WS = "ws"
+
+
+# 只能单独成条发送的消息段：QQ不允许音乐卡片、语音与其他内容出现在同一条消息里
+EXCLUSIVE_SEGMENT_TYPES = ("music", "record")
+
+
+def text_segment(text: str) -> Dict[str, Any]:
+    return {"type": "text", "data": {"text": text}}
+
+
+def image_segment(file: str) -> Dict[str, Any]:
+    """图片段，file为本地路径、URL或base64://"""
+    return {"type": "image", "data": {"file": file}}
+
+
+def music_segment(music_type: str, music_id: str) -> Dict[str, Any]:
+    """音乐小程序卡片段，music_type为平台类型（如 '163'）"""
+    return {"type": "music", "data": {"type": music_type, "id": music_id}}
+
+
+def record_segment(file: str) -> Dict[str, Any]:
+    """语音段，file为本地路径或网络地址"""
+    return {"type": "record", "data": {"file": file}}
 
-    def send_private_text(self, user_id: int, text: str):
-        """
-        发送文本消息到指定私聊。
-        :param user_id: 用户ID
-        :param text: 文本内容
-        :return: Napcat响应内容
-        """
-        conn = http.client.HTTPConnection(self.host, self.port)
-        payload = json.dumps({
-            "user_id": user_id,
-            "message": [
-                {
-                    "type": "text",
-                    "data": {
-                        "text": text
-                    }
-                }
-            ]
-        })
-        headers = {'Content-Type': 'application/json'}
-        conn.request("POST", "/send_private_msg", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        try:
-            resp_json = json.loads(data.decode("utf-8"))
-            success = resp_json.get("status") == "ok" and resp_json.get("retcode") == 0
-            return success, resp_json
-        except Exception:
-            return False, None
 
-    def __init__(self, host="127.0.0.1", port=4998):
+def split_messages(segments: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    把消息段拆成可以发送的若干条消息：音乐卡片、语音各自单独一条，其余相邻的段合在同一条里。
+    """
+    messages: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    for seg in segments:
+        if seg.get("type") in EXCLUSIVE_SEGMENT_TYPES:
+            if current:
+                messages.append(current)
+                current = []
+            messages.append([seg])
+        else:
+            current.append(seg)
+    if current:
+        messages.append(current)
+    return messages
+
+
+def check_message(segments: List[Dict[str, Any]]):
+    """检查消息段能否作为一条消息发送，不能时抛出ValueError"""
+    if not segments:
+        raise ValueError("消息不能为空")
+    if len(segments) > 1 and any(seg.get("type") in EXCLUSIVE_SEGMENT_TYPES for seg in segments):
+        raise ValueError("音乐卡片和语音只能单独发送，请先用split_messages拆分")
+
+
+class MessageBuilder:
+    """
+    消息段构造器：链式组合文本、图片、音乐卡片、语音段，build()得到 send_group_msg/send_private_msg 的message参数。
+    例：MessageBuilder().text("今日推荐").image(cover_url).build()
+    """
+
+    def __init__(self):
+        self.segments: List[Dict[str, Any]] = []
+
+    def text(self, text: str) -> "MessageBuilder":
+        self.segments.append(text_segment(text))
+        return self
+
+    def image(self, file: str) -> "MessageBuilder":
+        self.segments.append(image_segment(file))
+        return self
+
+    def music(self, music_type: str, music_id: str) -> "MessageBuilder":
+        self.segments.append(music_segment(music_type, music_id))
+        return self
+
+    def record(self, file: str) -> "MessageBuilder":
+        self.segments.append(record_segment(file))
+        return self
+
+    def build(self) -> List[Dict[str, Any]]:
+        """返回一条消息的消息段列表，包含不能同条发送的段时抛出ValueError"""
+        check_message(self.segments)
+        return list(self.segments)
+
+    def build_all(self) -> List[List[Dict[str, Any]]]:
+        """按split_messages拆分为若干条消息"""
+        return split_messages(self.segments)
+
+
+def parse_napcat_response(data: Any) -> Tuple[bool, Optional[Dict]]:
+    """
+    解析Napcat(OneBot)响应。
+    :return: (是否成功, 响应JSON)，无法解析时返回 (False, None)
+    """
+    try:
+        resp_json = json.loads(data) if isinstance(data, (str, bytes)) else data
+        success = resp_json.get("status") == "ok" and resp_json.get("retcode") == 0
+        return success, resp_json
+    except Exception:
+        return False, None
+
+
+class NapcatClient:
+    """
+    Napcat HTTP接口的同步客户端（供Flask服务等非异步代码使用），每次请求后关闭连接。
+    插件内请使用AsyncNapcatClient。
+    """
+
+    def __init__(self, host=DEFAULT_NAPCAT_HOST, port=DEFAULT_NAPCAT_PORT, timeout: float = 10):
         self.host = host
         self.port = port
+        self.timeout = timeout
 
-    def send_group_music_card(self, group_id: int, music_type: str, music_id: str):
+    def call(self, action: str, params: Dict[str, Any]) -> Tuple[bool, Optional[Dict]]:
         """
-        发送音乐小程序卡片到指定群聊。
-        :param group_id: 群号
-        :param music_type: 音乐平台类型（如 '163'）
-        :param music_id: 音乐ID
-        :return: Napcat响应内容
+        调用一个Napcat接口。
+        :param action: 接口名，如 send_group_msg
+        :param params: 接口参数
+        :return: (是否成功, 响应JSON)
         """
-        conn = http.client.HTTPConnection(self.host, self.port)
-        payload = json.dumps({
-            "group_id": group_id,
-            "message": [
-                {
-                    "type": "music",
-                    "data": {
-                        "type": music_type,
-                        "id": music_id
-                    }
-                }
-            ]
-        })
-        headers = {'Content-Type': 'application/json'}
-        conn.request("POST", "/send_group_msg", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
         try:
-            resp_json = json.loads(data.decode("utf-8"))
-            success = resp_json.get("status") == "ok" and resp_json.get("retcode") == 0
-            return success, resp_json
-        except Exception:
-            return False, None
+            headers = {'Content-Type': 'application/json'}
+            conn.request("POST", f"/{action}", json.dumps(params), headers)
+            data = conn.getresponse().read()
+        finally:
+            conn.close()
+        return parse_napcat_response(data)
 
-    def send_group_record(self, group_id: int, file_path: str):
+    def send_group_msg(self, group_id: int, message: List[Dict[str, Any]]):
         """
-        发送语音消息到指定群聊。
+        发送一条由若干消息段组成的消息到指定群聊，见MessageBuilder。
         :param group_id: 群号
-        :param file_path: 语音文件路径（本地或网络）
-        :return: Napcat响应内容
+        :param message: 消息段列表
+        :return: (是否成功, 响应JSON)
         """
-        conn = http.client.HTTPConnection(self.host, self.port)
-        payload = json.dumps({
-            "group_id": group_id,
-            "message": [
-                {
-                    "type": "record",
-                    "data": {
-                        "file": file_path
-                    }
-                }
-            ]
-        })
-        headers = {'Content-Type': 'application/json'}
-        conn.request("POST", "/send_group_msg", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        try:
-            resp_json = json.loads(data.decode("utf-8"))
-            success = resp_json.get("status") == "ok" and resp_json.get("retcode") == 0
-            return success, resp_json
-        except Exception:
-            return False, None
+        check_message(message)
+        return self.call("send_group_msg", {"group_id": group_id, "message": message})
 
-    def send_private_music_card(self, user_id: int, music_type: str, music_id: str):
+    def send_private_msg(self, user_id: int, message: List[Dict[str, Any]]):
         """
-        发送音乐小程序卡片到指定私聊。
+        发送一条由若干消息段组成的消息到指定私聊，见MessageBuilder。
         :param user_id: 用户ID
-        :param music_type: 音乐平台类型（如 '163'）
-        :param music_id: 音乐ID
-        :return: Napcat响应内容
+        :param message: 消息段列表
+        :return: (是否成功, 响应JSON)
         """
-        conn = http.client.HTTPConnection(self.host, self.port)
-        payload = json.dumps({
-            "user_id": user_id,
-            "message": [
-                {
-                    "type": "music",
-                    "data": {
-                        "type": music_type,
-                        "id": music_id
-                    }
-                }
-            ]
-        })
-        headers = {'Content-Type': 'application/json'}
-        conn.request("POST", "/send_private_msg", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        try:
-            resp_json = json.loads(data.decode("utf-8"))
-            success = resp_json.get("status") == "ok" and resp_json.get("retcode") == 0
-            return success, resp_json
-        except Exception:
-            return False, None
+        check_message(message)
+        return self.call("send_private_msg", {"user_id": user_id, "message": message})
+
+    def send_group_text(self, group_id: int, text: str):
+        """发送文本消息到指定群聊"""
+        return self.send_group_msg(group_id, [text_segment(text)])
+
+    def send_private_text(self, user_id: int, text: str):
+        """发送文本消息到指定私聊"""
+        return self.send_private_msg(user_id, [text_segment(text)])
+
+    def send_group_music_card(self, group_id: int, music_type: str, music_id: str):
+        """发送音乐小程序卡片到指定群聊"""
+        return self.send_group_msg(group_id, [music_segment(music_type, music_id)])
+
+    def send_private_music_card(self, user_id: int, music_type: str, music_id: str):
+        """发送音乐小程序卡片到指定私聊"""
+        return self.send_private_msg(user_id, [music_segment(music_type, music_id)])
+
+    def send_group_record(self, group_id: int, file_path: str):
+        """发送语音消息到指定群聊"""
+        return self.send_group_msg(group_id, [record_segment(file_path)])
 
     def send_private_record(self, user_id: int, file_path: str):
+        """发送语音消息到指定私聊"""
+        return self.send_private_msg(user_id, [record_segment(file_path)])
+
+
+class AsyncNapcatClient:
+    """
+    Napcat的异步客户端，发送消息不阻塞事件循环；方法与NapcatClient一一对应，返回值同为 (是否成功, 响应JSON)。
+    两种传输方式：
+    - http：请求Napcat的HTTP服务器，插件内所有组件共用同一个keep-alive连接池；
+    - ws：连接Napcat的WebSocket服务器，所有请求复用一条长连接，按OneBot的echo字段匹配响应，断线后下次请求时自动重连。
+    """
+
+    def __init__(self, host: str = DEFAULT_NAPCAT_HOST, port: int = DEFAULT_NAPCAT_PORT, timeout: float = 10,
+                 pool_size: int = 10, keepalive_timeout: float = 60, transport: str = TRANSPORT_HTTP,
+                 ws_url: str = DEFAULT_NAPCAT_WS_URL, access_token: str = ""):
         """
-        发送语音消息到指定私聊。
-        :param user_id: 用户ID
-        :param file_path: 语音文件路径（本地或网络）
-        :return: Napcat响应内容
+        :param host: Napcat HTTP服务器地址
+        :param port: Napcat HTTP服务器端口
+        :param timeout: 单次请求超时时间(秒)
+        :param pool_size: 连接池最大连接数
+        :param keepalive_timeout: 空闲连接保活时间(秒)
+        :param transport: 传输方式，"http" 或 "ws"
+        :param ws_url: Napcat WebSocket服务器地址（transport为ws时使用）
+        :param access_token: Napcat配置的访问令牌，未启用时留空
         """
-        conn = http.client.HTTPConnection(self.host, self.port)
-        payload = json.dumps({
-            "user_id": user_id,
-            "message": [
-                {
-                    "type": "record",
-                    "data": {
-                        "file": file_path
-                    }
-                }
-            ]
-        })
-        headers = {'Content-Type': 'application/json'}
-        conn.request("POST", "/send_private_msg", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
+        self.host = host
+        self.port = port
+        self.base_url = f"http://{host}:{port}"
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.transport = transport if transport in (TRANSPORT_HTTP, TRANSPORT_WS) else TRANSPORT_HTTP
+        self.ws_url = ws_url
+        self.headers = {"Authorization": f"Bearer {access_token}"} if access_token else {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        # WebSocket长连接及等待响应的请求：echo -> Future
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._ws_session: Optional[aiohttp.ClientSession] = None
+        self._ws_reader: Optional[asyncio.Task] = None
+        self._ws_lock: Optional[asyncio.Lock] = None
+        self._ws_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._echo_seq = itertools.count(1)
+        self.reconnects = 0
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """获取共享的ClientSession，首次调用或事件循环变化时重新创建"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=self.headers,
+            )
+            self._session_loop = loop
+        return self._session
+
+    # ===== WebSocket传输 =====
+
+    @property
+    def ws_connected(self) -> bool:
+        return self._ws is not None and not self._ws.closed
+
+    async def _ensure_ws(self) -> aiohttp.ClientWebSocketResponse:
+        loop = asyncio.get_running_loop()
+        if self._ws_loop is not loop:
+            # 事件循环变化时旧连接不可用，在当前loop上重新建立
+            self._ws = None
+            self._ws_session = None
+            self._ws_lock = asyncio.Lock()
+            self._pending.clear()
+            self._ws_loop = loop
+        if self.ws_connected:
+            return self._ws
+        async with self._ws_lock:
+            if self.ws_connected:
+                return self._ws
+            if self._ws_session is None or self._ws_session.closed:
+                # 长连接不能受总超时限制，只限制建立连接的时间
+                self._ws_session = aiohttp.ClientSession(
+                    timeout=aiohttp.ClientTimeout(total=None, connect=self.timeout),
+                    headers=self.headers,
+                )
+            if self._ws is not None:
+                self.reconnects += 1
+            self._ws = await self._ws_session.ws_connect(self.ws_url, heartbeat=30)
+            # 每条连接有自己的等待表，旧连接断开时只影响在它上面发出的请求
+            self._pending = {}
+            self._ws_reader = loop.create_task(self._read_ws(self._ws, self._pending))
+            return self._ws
+
+    async def _read_ws(self, ws: aiohttp.ClientWebSocketResponse, pending: Dict[str, asyncio.Future]):
+        try:
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    if msg.type == aiohttp.WSMsgType.ERROR:
+                        break
+                    continue
+                try:
+                    data = json.loads(msg.data)
+                except ValueError:
+                    continue
+                # 带echo的是接口响应，其余（post_type事件、心跳）不是发给本客户端的请求结果
+                future = pending.pop(str(data.get("echo")), None) if isinstance(data, dict) else None
+                if future is not None and not future.done():
+                    future.set_result(parse_napcat_response(data))
+        finally:
+            # 连接断开：正在等待响应的请求按连接失败处理，由调用方决定是否重试
+            for future in list(pending.values()):
+                if not future.done():
+                    future.set_exception(ConnectionResetError("Napcat WebSocket连接已断开"))
+            pending.clear()
+
+    async def _call_ws(self, action: str, params: Dict[str, Any]) -> Tuple[bool, Optional[Dict]]:
+        ws = await self._ensure_ws()
+        pending = self._pending
+        echo = str(next(self._echo_seq))
+        future = asyncio.get_running_loop().create_future()
+        pending[echo] = future
         try:
-            resp_json = json.loads(data.decode("utf-8"))
-            success = resp_json.get("status") == "ok" and resp_json.get("retcode") == 0
-            return success, resp_json
-        except Exception:
-            return False, None
+            await ws.send_str(json.dumps({"action": action, "params": params, "echo": echo}))
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        finally:
+            pending.pop(echo, None)
+
+    async def call(self, action: str, params: Dict[str, Any]) -> Tuple[bool, Optional[Dict]]:
+        """
+        调用一个Napcat接口。
+        :param action: 接口名，如 send_group_msg
+        :param params: 接口参数
+        :return: (是否成功, 响应JSON)
+        :raises aiohttp.ClientError: 连接失败
+        :raises ConnectionError: WebSocket连接在等待响应时断开
+        :raises asyncio.TimeoutError: 请求超时
+        """
+        if self.transport == TRANSPORT_WS:
+            return await self._call_ws(action, params)
+        session = await self.get_session()
+        async with session.post(f"{self.base_url}/{action}", json=params) as response:
+            data = await response.read()
+        return parse_napcat_response(data)
+
+    async def send_group_msg(self, group_id: int, message: List[Dict[str, Any]]):
+        """发送一条由若干消息段组成的消息到指定群聊，见MessageBuilder"""
+        check_message(message)
+        return await self.call("send_group_msg", {"group_id": group_id, "message": message})
+
+    async def send_private_msg(self, user_id: int, message: List[Dict[str, Any]]):
+        """发送一条由若干消息段组成的消息到指定私聊，见MessageBuilder"""
+        check_message(message)
+        return await self.call("send_private_msg", {"user_id": user_id, "message": message})
+
+    async def send_group_text(self, group_id: int, text: str):
+        """发送文本消息到指定群聊"""
+        return await self.send_group_msg(group_id, [text_segment(text)])
+
+    async def send_private_text(self, user_id: int, text: str):
+        """发送文本消息到指定私聊"""
+        return await self.send_private_msg(user_id, [text_segment(text)])
+
+    async def send_group_music_card(self, group_id: int, music_type: str, music_id: str):
+        """发送音乐小程序卡片到指定群聊"""
+        return await self.send_group_msg(group_id, [music_segment(music_type, music_id)])
+
+    async def send_private_music_card(self, user_id: int, music_type: str, music_id: str):
+        """发送音乐小程序卡片到指定私聊"""
+        return await self.send_private_msg(user_id, [music_segment(music_type, music_id)])
+
+    async def send_group_record(self, group_id: int, file_path: str):
+        """发送语音消息到指定群聊"""
+        return await self.send_group_msg(group_id, [record_segment(file_path)])
+
+    async def send_private_record(self, user_id: int, file_path: str):
+        """发送语音消息到指定私聊"""
+        return await self.send_private_msg(user_id, [record_segment(file_path)])
+
+    async def close(self):
+        """关闭连接池和WebSocket连接"""
+        if self._ws is not None and not self._ws.closed:
+            await self._ws.close()
+        if self._ws_reader is not None:
+            self._ws_reader.cancel()
+        for session in (self._session, self._ws_session):
+            if session is not None and not session.closed:
+                await session.close()
+        self._session = None
+        self._session_loop = None
+        self._ws = None
+        self._ws_session = None
+        self._ws_reader = None
+        self._ws_loop = None
+
+
+# ===== 插件级共享实例 =====
+_shared_client: Optional[AsyncNapcatClient] = None
+
+
+def configure_napcat_client(**kwargs) -> AsyncNapcatClient:
+    """由MusicPlugin在加载时调用，按配置创建插件共享的Napcat客户端，参数同AsyncNapcatClient"""
+    global _shared_client
+    _shared_client = AsyncNapcatClient(**kwargs)
+    return _shared_client
+
+
+def get_napcat_client() -> AsyncNapcatClient:
+    """获取插件共享的Napcat客户端，未配置时使用默认地址创建"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = AsyncNapcatClient()
+    return _shared_client
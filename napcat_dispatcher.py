@@ -0,0 +1,382 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import aiohttp
+
+try:
+    from .api_guard import TokenBucket, backoff_delay
+    from .napcat_client import (EXCLUSIVE_SEGMENT_TYPES, AsyncNapcatClient, check_message, get_napcat_client,
+                                music_segment, record_segment, split_messages, text_segment)
+except ImportError:
+    from api_guard import TokenBucket, backoff_delay
+    from napcat_client import (EXCLUSIVE_SEGMENT_TYPES, AsyncNapcatClient, check_message, get_napcat_client,
+                               music_segment, record_segment, split_messages, text_segment)
+
+GROUP = "group"
+PRIVATE = "private"
+# 视为暂时性故障、需要退避重试的异常；Napcat明确返回的失败（retcode≠0）不重试
+TRANSIENT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError)
+
+
+class OutboundMessage:
+    """待发送的一条消息"""
+
+    def __init__(self, message_type: str, target_id: int, message: List[Dict[str, Any]], mergeable: bool,
+                 future: asyncio.Future):
+        self.message_type = message_type
+        self.target_id = target_id
+        self.message = message
+        self.mergeable = mergeable
+        self.future = future
+
+    @property
+    def text_length(self) -> int:
+        return sum(len(seg["data"].get("text", "")) for seg in self.message if seg.get("type") == "text")
+
+
+def _join_messages(messages: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """把多条消息拼成一条，各条之间换行；相邻的文本段合并为一个"""
+    joined: List[Dict[str, Any]] = []
+    for index, message in enumerate(messages):
+        for seg in ([text_segment("\n")] if index else []) + message:
+            if seg.get("type") == "text" and joined and joined[-1].get("type") == "text":
+                joined[-1] = text_segment(joined[-1]["data"]["text"] + seg["data"]["text"])
+            else:
+                joined.append(seg)
+    return joined
+
+
+class BroadcastResult(NamedTuple):
+    message_type: str
+    target_id: int
+    success: bool
+    response: Optional[Dict]
+    error: Optional[str]
+
+
+class BroadcastReport:
+    """一次广播的汇总结果：每个目标的发送结果和总耗时"""
+
+    def __init__(self, results: List[BroadcastResult], elapsed: float):
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self) -> List[BroadcastResult]:
+        return [r for r in self.results if r.success]
+
+    @property
+    def failed(self) -> List[BroadcastResult]:
+        return [r for r in self.results if not r.success]
+
+    def summary(self) -> str:
+        """适合直接回复给管理员的文字汇总"""
+        text = f"广播完成：成功 {len(self.succeeded)}/{len(self.results)}，耗时 {self.elapsed:.1f} 秒"
+        for r in self.failed:
+            reason = r.error or ((r.response or {}).get("message") or (r.response or {}).get("wording") or "发送失败")
+            text += f"\n❌ {'群' if r.message_type == GROUP else '私聊'} {r.target_id}：{reason}"
+        return text
+
+
+def unique_targets(targets: Iterable[Tuple[str, Any]]) -> List[Tuple[str, int]]:
+    """规范化广播目标列表：目标ID转为int，去掉重复和无效的目标，保持原顺序"""
+    seen = set()
+    result = []
+    for message_type, target_id in targets:
+        try:
+            key = (message_type, int(target_id))
+        except (TypeError, ValueError):
+            continue
+        if message_type in (GROUP, PRIVATE) and key not in seen:
+            seen.add(key)
+            result.append(key)
+    return result
+
+
+class _TargetQueue:
+    def __init__(self, bucket: TokenBucket):
+        self.pending: Deque[OutboundMessage] = deque()
+        self.bucket = bucket
+        self.worker: Optional[asyncio.Task] = None
+
+
+class NapcatDispatcher:
+    """
+    Napcat出站消息调度：每个群/私聊一个队列和发送协程，调用方入队后立即返回。
+    每个目标按各自的令牌桶限速，一个群刷屏不影响其他群；网络异常或超时按指数退避重试；
+    排队中相邻的可合并消息（文本、图片）合并为一条发送，减少消息条数和请求次数。
+    """
+
+    def __init__(self, client: Optional[AsyncNapcatClient] = None, group_rate: float = 1, group_burst: int = 3,
+                 private_rate: float = 2, private_burst: int = 3, retries: int = 2, merge_texts: bool = True,
+                 merge_max_chars: int = 500, max_targets: int = 1000, broadcast_concurrency: int = 10):
+        """
+        :param client: Napcat客户端，默认使用插件共享实例
+        :param group_rate: 每个群每秒最多发送的消息数
+        :param group_burst: 每个群允许的突发消息数
+        :param private_rate: 每个私聊每秒最多发送的消息数
+        :param private_burst: 每个私聊允许的突发消息数
+        :param retries: 暂时性故障的最多重试次数
+        :param merge_texts: 是否合并排队中相邻的文本/图片消息
+        :param merge_max_chars: 合并后单条消息的最大字数
+        :param max_targets: 最多保留限速状态的目标数，超出时清理空闲的目标
+        :param broadcast_concurrency: 广播时同时在途的最多请求数
+        """
+        self._client = client
+        self.rates = {GROUP: (group_rate, group_burst), PRIVATE: (private_rate, private_burst)}
+        self.retries = retries
+        self.merge_texts = merge_texts
+        self.merge_max_chars = merge_max_chars
+        self.max_targets = max_targets
+        self.broadcast_concurrency = broadcast_concurrency
+        self._queues: Dict[Tuple[str, int], _TargetQueue] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.sent = 0
+        self.merged = 0
+        self.failed = 0
+        self.abandoned = 0
+
+    @property
+    def client(self) -> AsyncNapcatClient:
+        return self._client or get_napcat_client()
+
+    def send(self, message_type: str, target_id: int, message: List[Dict[str, Any]],
+             mergeable: bool = False) -> asyncio.Future:
+        """
+        消息入队，立即返回。
+        :param message_type: "group" 或 "private"
+        :param target_id: 群号或用户ID
+        :param message: OneBot消息段列表
+        :param mergeable: 是否允许与相邻的可合并消息合并（含音乐卡片、语音的消息不会合并）
+        :return: 发送完成后得到 (是否成功, 响应JSON) 的Future；取消该Future可撤回尚未发出的消息
+        :raises ValueError: 消息段不能作为一条消息发送
+        """
+        check_message(message)
+        loop = asyncio.get_running_loop()
+        key = (message_type, int(target_id))
+        queue = self._queue_for(key)
+        future = loop.create_future()
+        mergeable = mergeable and self.merge_texts and not any(seg.get("type") in EXCLUSIVE_SEGMENT_TYPES for seg in message)
+        queue.pending.append(OutboundMessage(message_type, key[1], message, mergeable, future))
+        if queue.worker is None or queue.worker.done():
+            queue.worker = loop.create_task(self._run(queue))
+        return future
+
+    def _queue_for(self, key: Tuple[str, int]) -> _TargetQueue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 事件循环变化时（插件重载等）丢弃旧循环上的队列
+            self._queues.clear()
+            self._loop = loop
+        queue = self._queues.get(key)
+        if queue is None:
+            if len(self._queues) >= self.max_targets:
+                self._prune()
+            rate, burst = self.rates.get(key[0], self.rates[GROUP])
+            queue = self._queues[key] = _TargetQueue(TokenBucket(rate=rate, capacity=burst))
+        return queue
+
+    async def acquire(self, message_type: str, target_id: int):
+        """
+        为不经过本调度器发送的消息（如框架send_text发送的回复文本）占用目标的一个发送名额，
+        与排队的卡片、语音共用同一个令牌桶限速。
+        """
+        await self._queue_for((message_type, int(target_id))).bucket.acquire()
+
+    def merge_text_list(self, texts: List[str]) -> List[str]:
+        """按merge_texts/merge_max_chars把相邻的文本段合并（换行分隔），未开启合并时原样返回"""
+        texts = [text for text in texts if text]
+        if not self.merge_texts:
+            return texts
+        merged: List[str] = []
+        for text in texts:
+            if merged and len(merged[-1]) + 1 + len(text) <= self.merge_max_chars:
+                merged[-1] = f"{merged[-1]}\n{text}"
+                self.merged += 1
+            else:
+                merged.append(text)
+        return merged
+
+    def send_text(self, message_type: str, target_id: int, text: str) -> asyncio.Future:
+        """文本消息入队，允许与相邻文本合并"""
+        return self.send(message_type, target_id, [text_segment(text)], mergeable=True)
+
+    def send_music_card(self, message_type: str, target_id: int, music_type: str, music_id: str) -> asyncio.Future:
+        """音乐小程序卡片入队"""
+        return self.send(message_type, target_id, [music_segment(music_type, music_id)])
+
+    def send_record(self, message_type: str, target_id: int, file_path: str) -> asyncio.Future:
+        """语音消息入队"""
+        return self.send(message_type, target_id, [record_segment(file_path)])
+
+    def send_segments(self, message_type: str, target_id: int, segments: List[Dict[str, Any]],
+                      mergeable: bool = True) -> List[asyncio.Future]:
+        """
+        任意消息段入队：能同条发送的段合为一条，音乐卡片、语音各自单独一条，按原顺序发送。
+        :return: 每条消息的Future
+        """
+        return [self.send(message_type, target_id, message, mergeable=mergeable)
+                for message in split_messages(segments)]
+
+    # ===== 广播 =====
+
+    async def fan_out(self, targets: Iterable[Tuple[str, Any]],
+                      send: Callable[[str, int], Awaitable[Tuple[bool, Optional[Dict]]]],
+                      concurrency: Optional[int] = None) -> BroadcastReport:
+        """
+        对多个目标并发执行同一发送操作，汇总每个目标的结果；单个目标失败不影响其他目标。
+        每个目标的消息仍经过各自的队列和令牌桶，并发数只限制同时在途的请求数。
+        :param targets: (消息类型, 目标ID) 列表，重复的目标只发送一次
+        :param send: 发送一个目标的协程函数，参数为 (消息类型, 目标ID)，返回 (是否成功, 响应JSON)
+        :param concurrency: 同时在途的最多请求数，默认使用broadcast_concurrency
+        """
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(max(1, concurrency or self.broadcast_concurrency))
+
+        async def run(message_type: str, target_id: int) -> BroadcastResult:
+            async with semaphore:
+                try:
+                    success, resp_json = await send(message_type, target_id)
+                except Exception as e:
+                    return BroadcastResult(message_type, target_id, False, None, str(e) or type(e).__name__)
+            return BroadcastResult(message_type, target_id, bool(success), resp_json, None)
+
+        results = await asyncio.gather(*(run(*target) for target in unique_targets(targets)))
+        return BroadcastReport(list(results), time.monotonic() - started)
+
+    async def broadcast(self, targets: Iterable[Tuple[str, Any]], message: List[Dict[str, Any]],
+                        concurrency: Optional[int] = None) -> BroadcastReport:
+        """
+        把同一条消息发送给多个群/私聊，返回汇总结果。
+        :raises ValueError: 消息段不能作为一条消息发送
+        """
+        check_message(message)
+        return await self.fan_out(targets, lambda message_type, target_id: self.send(
+            message_type, target_id, [dict(seg) for seg in message]), concurrency)
+
+    async def broadcast_music_card(self, targets: Iterable[Tuple[str, Any]], music_type: str, music_id: str,
+                                   concurrency: Optional[int] = None) -> BroadcastReport:
+        """把音乐小程序卡片发送给多个目标"""
+        return await self.broadcast(targets, [music_segment(music_type, music_id)], concurrency)
+
+    async def broadcast_record(self, targets: Iterable[Tuple[str, Any]], file_path: str,
+                               concurrency: Optional[int] = None) -> BroadcastReport:
+        """把语音发送给多个目标（每个目标都由Napcat上传，内容相同的语音建议用record_cache.broadcast_record_cached）"""
+        return await self.broadcast(targets, [record_segment(file_path)], concurrency)
+
+    def _next_batch(self, queue: _TargetQueue) -> List[OutboundMessage]:
+        # 跳过调用方已取消的消息；可合并的消息与紧随其后的可合并消息拼成一条
+        while queue.pending and queue.pending[0].future.done():
+            queue.pending.popleft()
+        if not queue.pending:
+            return []
+        batch = [queue.pending.popleft()]
+        if not batch[0].mergeable:
+            return batch
+        length = batch[0].text_length
+        while queue.pending:
+            nxt = queue.pending[0]
+            if nxt.future.done():
+                queue.pending.popleft()
+                continue
+            if not nxt.mergeable or length + 1 + nxt.text_length > self.merge_max_chars:
+                break
+            length += 1 + nxt.text_length
+            batch.append(queue.pending.popleft())
+        return batch
+
+    async def _run(self, queue: _TargetQueue):
+        while True:
+            batch = self._next_batch(queue)
+            if not batch:
+                break
+            if len(batch) > 1:
+                message = _join_messages([item.message for item in batch])
+                self.merged += len(batch) - 1
+            else:
+                message = batch[0].message
+            await queue.bucket.acquire()
+            try:
+                result = await self._deliver(batch, message)
+            except Exception as e:
+                self.failed += 1
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+            if result is None:
+                continue
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_result(result)
+
+    def _prune(self):
+        # 空闲目标的令牌桶要保留一段时间，否则刚发完一波的群马上又能突发；只在目标过多时清理
+        for key in [k for k, q in self._queues.items() if not q.pending and (q.worker is None or q.worker.done())]:
+            self._queues.pop(key, None)
+
+    @staticmethod
+    def _abandoned(batch: List[OutboundMessage]) -> bool:
+        # 调用方都已取消（如等待超时后改发直链），不再发送或重试，以免消息迟到或重复
+        return all(item.future.done() for item in batch)
+
+    async def _deliver(self, batch: List[OutboundMessage],
+                       message: List[Dict[str, Any]]) -> Optional[Tuple[bool, Optional[Dict]]]:
+        """
+        发送一批（合并后的）消息，暂时性故障时退避重试。
+        :return: (是否成功, 响应JSON)；调用方都已放弃时返回None
+        """
+        item = batch[0]
+        id_field = "group_id" if item.message_type == GROUP else "user_id"
+        action = f"send_{item.message_type}_msg"
+        for attempt in range(self.retries + 1):
+            if self._abandoned(batch):
+                self.abandoned += 1
+                return None
+            try:
+                success, resp_json = await self.client.call(action, {id_field: item.target_id, "message": message})
+            except TRANSIENT_ERRORS:
+                success, resp_json = False, None
+            if success:
+                self.sent += 1
+                return success, resp_json
+            if resp_json is not None or attempt >= self.retries:
+                self.failed += 1
+                return success, resp_json
+            if self._abandoned(batch):
+                self.abandoned += 1
+                return None
+            await asyncio.sleep(backoff_delay(attempt))
+        return False, None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "targets": len(self._queues),
+            "active": sum(1 for q in self._queues.values() if q.worker is not None and not q.worker.done()),
+            "pending": sum(len(q.pending) for q in self._queues.values()),
+            "sent": self.sent,
+            "merged": self.merged,
+            "failed": self.failed,
+            "abandoned": self.abandoned,
+        }
+
+
+# ===== 插件级共享实例 =====
+_shared_dispatcher: Optional[NapcatDispatcher] = None
+
+
+def configure_napcat_dispatcher(**kwargs) -> NapcatDispatcher:
+    """由MusicPlugin在加载时调用，按配置创建插件共享的出站消息调度器，参数同NapcatDispatcher"""
+    global _shared_dispatcher
+    _shared_dispatcher = NapcatDispatcher(**kwargs)
+    return _shared_dispatcher
+
+
+def get_napcat_dispatcher() -> NapcatDispatcher:
+    """获取插件共享的出站消息调度器，未配置时使用默认限速创建"""
+    global _shared_dispatcher
+    if _shared_dispatcher is None:
+        _shared_dispatcher = NapcatDispatcher()
+    return _shared_dispatcher
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from aiohttp import WSMsgType, web
+
+
+class OneBotStubServer:
+    """
+    本地的Napcat(OneBot 11)替身服务器，用于在没有QQ账号和Napcat的环境下测试插件的发送逻辑。
+    同时提供HTTP接口（POST /<接口名>）和WebSocket接口（ws://host:port/，按echo返回响应），
+    收到的消息记录在messages中。支持 send_group_msg、send_private_msg、send_msg、get_msg、get_login_info。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 3001, delay: float = 0, fail_rate: float = 0,
+                 access_token: str = ""):
+        """
+        :param host: 监听地址
+        :param port: 监听端口（HTTP和WebSocket共用）
+        :param delay: 每个请求的模拟处理耗时(秒)
+        :param fail_rate: 随机返回失败（retcode 1200）的比例，用于测试重试
+        :param access_token: 非空时要求请求携带 Authorization: Bearer <token>
+        """
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.access_token = access_token
+        self.messages: List[Dict[str, Any]] = []
+        self.requests = 0
+        self.ws_connections = 0
+        self._sockets: List[web.WebSocketResponse] = []
+        self._runner: Optional[web.AppRunner] = None
+
+    # ===== 接口实现 =====
+
+    async def handle_action(self, action: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        self.requests += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if action in ("send_group_msg", "send_private_msg", "send_msg"):
+            if self.fail_rate and random.random() < self.fail_rate:
+                return {"status": "failed", "retcode": 1200, "data": None, "message": "模拟发送失败"}
+            message_id = len(self.messages) + 1
+            self.messages.append({"message_id": message_id, "action": action, "params": params, "time": time.time()})
+            return {"status": "ok", "retcode": 0, "data": {"message_id": message_id}}
+        if action == "get_msg":
+            return self._get_msg(params.get("message_id"))
+        if action == "get_login_info":
+            return {"status": "ok", "retcode": 0, "data": {"user_id": 10000, "nickname": "stub"}}
+        return {"status": "failed", "retcode": 1404, "data": None, "message": f"不支持的接口: {action}"}
+
+    def _get_msg(self, message_id: Any) -> Dict[str, Any]:
+        try:
+            record = self.messages[int(message_id) - 1]
+        except (TypeError, ValueError, IndexError):
+            return {"status": "failed", "retcode": 1200, "data": None, "message": "消息不存在"}
+        message = []
+        for seg in record["params"].get("message") or []:
+            if seg.get("type") == "record":
+                # 模拟Napcat转码后缓存的语音文件
+                file_name = f"stub_{record['message_id']}.amr"
+                seg = {"type": "record", "data": {"file": file_name, "path": f"/napcat/cache/{file_name}", "url": ""}}
+            message.append(seg)
+        return {"status": "ok", "retcode": 0, "data": {"message_id": record["message_id"], "message": message}}
+
+    def _authorized(self, request: web.Request) -> bool:
+        if not self.access_token:
+            return True
+        token = request.headers.get("Authorization", "").replace("Bearer ", "", 1)
+        return token == self.access_token or request.query.get("access_token") == self.access_token
+
+    # ===== HTTP / WebSocket =====
+
+    async def _http_handler(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return web.json_response({"status": "failed", "retcode": 1403}, status=403)
+        try:
+            params = await request.json()
+        except ValueError:
+            params = {}
+        return web.json_response(await self.handle_action(request.match_info["action"], params or {}))
+
+    async def _ws_handler(self, request: web.Request) -> web.WebSocketResponse:
+        if not self._authorized(request):
+            raise web.HTTPForbidden()
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.ws_connections += 1
+        self._sockets.append(ws)
+        # 与Napcat一样，连接建立后先推送一条生命周期事件（没有echo）
+        await ws.send_json({"post_type": "meta_event", "meta_event_type": "lifecycle", "sub_type": "connect",
+                            "time": int(time.time()), "self_id": 10000})
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    payload = json.loads(msg.data)
+                except ValueError:
+                    continue
+                # 并发处理，响应顺序可能与请求顺序不同，客户端需按echo匹配
+                asyncio.get_running_loop().create_task(self._ws_respond(ws, payload))
+        finally:
+            if ws in self._sockets:
+                self._sockets.remove(ws)
+        return ws
+
+    async def _ws_respond(self, ws: web.WebSocketResponse, payload: Dict[str, Any]):
+        response = await self.handle_action(payload.get("action", ""), payload.get("params") or {})
+        response["echo"] = payload.get("echo")
+        if not ws.closed:
+            await ws.send_json(response)
+
+    async def drop_connections(self):
+        """断开所有WebSocket连接，用于测试客户端的自动重连"""
+        for ws in list(self._sockets):
+            await ws.close()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/", self._ws_handler)
+        app.router.add_post("/{action}", self._http_handler)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def _serve(port: int):
+    server = OneBotStubServer(port=port)
+    await server.start()
+    print(f"OneBot替身服务器已启动: http://127.0.0.1:{port}  ws://127.0.0.1:{port}/")
+    while True:
+        await asyncio.sleep(3600)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 3001
+    try:
+        asyncio.run(_serve(port))
+    except KeyboardInterrupt:
+        pass
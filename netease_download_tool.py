@@ -1,10 +1,58 @@
 import os
-import requests
 import aiohttp
 import asyncio
 import time
 import json
 import hashlib
+import re
+import uuid
+from typing import Callable, Optional, Tuple
+
+try:
+    from .api_guard import backoff_delay
+    from .audio_store import audio_ext_from_url, get_audio_store
+    from .cache_quota import get_cache_quota
+    from .file_locks import LOCK_SUFFIX, async_file_lock, is_stale_lock
+    from .music_api_client import get_music_api_client
+    from .music_cache import is_url_fresh
+    from .query_normalizer import normalize_query
+except ImportError:
+    # 作为独立脚本运行时（如 test_full_pipeline.py）使用绝对导入
+    from api_guard import backoff_delay
+    from audio_store import audio_ext_from_url, get_audio_store
+    from cache_quota import get_cache_quota
+    from file_locks import LOCK_SUFFIX, async_file_lock, is_stale_lock
+    from music_api_client import get_music_api_client
+    from music_cache import is_url_fresh
+    from query_normalizer import normalize_query
+
+# 歌曲元数据（id、歌名等）基本不变，长期缓存；播放链接按其签名中的过期时间单独判断
+META_EXPIRE_SECONDS = 7 * 86400
+# 播放链接无法解析过期时间时的有效期
+URL_DEFAULT_TTL = 1200
+# 音频下载的分块大小，大块减少事件循环切换和写文件次数
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# 下载时两次收到数据之间的最长等待(秒)；整体不设超时，大文件（如80MB+的全景声）慢慢下完
+DOWNLOAD_SOCK_READ_TIMEOUT = 30
+# 分段并发下载的连接数，以及每段的最小大小（小文件分段反而更慢）
+DOWNLOAD_SEGMENTS = 4
+DOWNLOAD_MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+# 单个分段失败后从断点重试的次数
+DOWNLOAD_SEGMENT_RETRIES = 2
+# 整个下载失败后从.part续传重试的次数
+DOWNLOAD_RETRIES = 2
+
+# 下载中的临时文件后缀，完成并校验后才重命名为最终文件
+PART_SUFFIX = ".part"
+# 超过该时间未更新的.part文件视为放弃，启动清理时删除(秒)
+PART_MAX_AGE = 3 * 86400
+# 启动清理时检查文件头的音频扩展名
+AUDIO_EXTENSIONS = (".flac", ".mp3", ".wav")
+
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+)")
+
+# 下载进度回调 progress(已下载字节数, 总字节数)，总大小未知时为None
+ProgressCallback = Callable[[int, Optional[int]], None]
 
 def get_cache_dir():
     cache_dir = os.path.join(os.path.dirname(__file__), 'cache')
@@ -12,80 +60,468 @@ def get_cache_dir():
     return cache_dir
 
 def get_json_cache_path(song_name, choose, quality):
-    # 用hash避免文件名过长和特殊字符问题
-    key = f"{song_name}_{choose}_{quality}"
+    # 用hash避免文件名过长和特殊字符问题；歌名先规范化，繁简/全半角等变体共用同一缓存
+    key = f"{normalize_query(song_name)}_{choose}_{quality}"
     key_hash = hashlib.md5(key.encode('utf-8')).hexdigest()
     cache_dir = get_cache_dir()
     return os.path.join(cache_dir, f"{key_hash}.json")
 
-def is_cache_valid(cache_path, expire_seconds=86400):
+def is_cache_valid(cache_path, expire_seconds=META_EXPIRE_SECONDS):
     if not os.path.exists(cache_path):
         return False
     mtime = os.path.getmtime(cache_path)
     return (time.time() - mtime) < expire_seconds
 
-async def download_netease_flac(song_name: str, choose: str, quality: str, api_url: str = "https://api.vkeys.cn") -> str:
+def is_cached_url_fresh(cache_path, data):
+    """判断缓存JSON中的播放链接是否仍未过期"""
+    url = (data.get("data") or {}).get("url", "")
+    return is_url_fresh(url, default_ttl=URL_DEFAULT_TTL, fetched_at=os.path.getmtime(cache_path))
+
+def print_progress(label: str, step: float = 0.1) -> ProgressCallback:
+    """生成一个按百分比（默认每10%）打印下载进度的回调"""
+    state = {"next": 0.0, "last_mb": 0}
+
+    def progress(downloaded: int, total: Optional[int]):
+        if total:
+            ratio = downloaded / total
+            if ratio >= state["next"] or downloaded >= total:
+                print(f"[下载] {label}: {ratio:.0%} ({downloaded / 1048576:.1f}/{total / 1048576:.1f} MB)")
+                state["next"] = ratio + step
+        elif downloaded // (10 * 1048576) > state["last_mb"]:
+            state["last_mb"] = downloaded // (10 * 1048576)
+            print(f"[下载] {label}: {downloaded / 1048576:.1f} MB")
+
+    return progress
+
+def is_valid_audio_header(header: bytes) -> bool:
+    """
+    根据文件头判断是否为可解码的音频：FLAC（fLaC且首个元数据块为34字节的STREAMINFO）、
+    带ID3标签或以帧同步开头的MP3、RIFF/WAVE。
+    """
+    if header.startswith(b"fLaC"):
+        # 元数据块头：1位是否最后一块 + 7位块类型(0=STREAMINFO) + 24位长度(34)
+        return len(header) >= 8 and header[4] & 0x7F == 0 and int.from_bytes(header[5:8], "big") == 34
+    if header.startswith(b"ID3"):
+        return True
+    if len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0:
+        return True
+    return header.startswith(b"RIFF") and header[8:12] == b"WAVE"
+
+def verify_audio_file(file_path: str, expected_size: Optional[int] = None) -> bool:
+    """
+    校验音频文件：大小与预期一致（已知时）且文件头可解码。
+    :param expected_size: 预期字节数，未知时只校验文件头
+    """
+    try:
+        size = os.path.getsize(file_path)
+        if size == 0 or (expected_size is not None and size != expected_size):
+            return False
+        with open(file_path, "rb") as f:
+            return is_valid_audio_header(f.read(64))
+    except OSError:
+        return False
+
+def _part_state_path(part_path: str) -> str:
+    return part_path + ".json"
+
+def _load_part_state(part_path: str) -> Optional[dict]:
+    """读取分段下载的断点记录 {"total": 总大小, "segments": [[起点, 终点, 已写到的位置], ...]}"""
+    try:
+        with open(_part_state_path(part_path), "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if os.path.getsize(part_path) == state["total"]:
+            return state
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def _save_part_state(part_path: str, total: int, segments):
+    tmp_path = _part_state_path(part_path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"total": total, "segments": segments}, f)
+    os.replace(tmp_path, _part_state_path(part_path))
+
+def _remove_part(part_path: str):
+    for path in (part_path, _part_state_path(part_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _finalize_download(part_path: str, file_path: str, expected_size: Optional[int]):
+    """校验下载完成的.part文件并原子地重命名为最终文件；校验失败时删除，下次从头下载"""
+    if not verify_audio_file(part_path, expected_size):
+        _remove_part(part_path)
+        raise ValueError(f"下载的文件校验失败（大小不符或不是有效音频）: {file_path}")
+    os.replace(part_path, file_path)
+    state_path = _part_state_path(part_path)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
+def _download_timeout(sock_read_timeout: float) -> aiohttp.ClientTimeout:
+    # 覆盖会话默认的整体超时（API请求用），只限制连接和读间隔
+    return aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=sock_read_timeout)
+
+async def stream_download(url: str, file_path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                          sock_read_timeout: float = DOWNLOAD_SOCK_READ_TIMEOUT,
+                          progress: Optional[ProgressCallback] = None) -> int:
+    """
+    以异步流的方式下载文件，复用插件共享的连接池，写文件放到线程池执行，下载期间不阻塞事件循环。
+    数据先写入 <file_path>.part，已有.part时用Range从断点续传；下载完成并校验通过后原子重命名为file_path。
+    失败时保留.part供下次续传。
+    :param url: 下载地址
+    :param file_path: 保存路径
+    :param chunk_size: 分块大小(字节)
+    :param sock_read_timeout: 两次收到数据之间的最长等待(秒)
+    :param progress: 进度回调 progress(已下载字节数, 总字节数)
+    :return: 文件总字节数
+    """
+    session = await get_music_api_client().get_session()
+    loop = asyncio.get_running_loop()
+    timeout = _download_timeout(sock_read_timeout)
+    part_path = file_path + PART_SUFFIX
+    if os.path.exists(_part_state_path(part_path)):
+        # 分段下载留下的是预分配的文件，无法按单连接续传
+        _remove_part(part_path)
+    position = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={position}-"} if position else {}
+    async with session.get(url, headers=headers, timeout=timeout) as response:
+        if response.status == 416:
+            # 请求的起点已超出文件末尾：.part可能已经完整
+            match = re.match(r"bytes\s+\*/(\d+)", response.headers.get("Content-Range", ""))
+            total = int(match.group(1)) if match else None
+            if total is not None and position == total:
+                await loop.run_in_executor(None, _finalize_download, part_path, file_path, total)
+                return total
+            _remove_part(part_path)
+            response.raise_for_status()
+        response.raise_for_status()
+        if position and response.status == 206:
+            match = _CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+            total = int(match.group(3)) if match else None
+            mode = 'ab'
+        else:
+            # 服务器不支持续传，从头开始
+            position = 0
+            total = response.content_length
+            mode = 'wb'
+        f = await loop.run_in_executor(None, open, part_path, mode)
+        try:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                await loop.run_in_executor(None, f.write, chunk)
+                position += len(chunk)
+                if progress is not None:
+                    progress(position, total)
+        finally:
+            await loop.run_in_executor(None, f.close)
+    if total is not None and position < total:
+        raise aiohttp.ClientPayloadError(f"下载不完整: {position}/{total} 字节")
+    await loop.run_in_executor(None, _finalize_download, part_path, file_path, total)
+    return position
+
+async def probe_range_support(url: str, sock_read_timeout: float = DOWNLOAD_SOCK_READ_TIMEOUT) -> Tuple[Optional[int], bool]:
+    """
+    探测下载地址的文件大小和是否支持Range请求。
+    用 Range: bytes=0-0 的GET代替HEAD，部分CDN对HEAD请求不返回Accept-Ranges。
+    :return: (文件总大小, 是否支持Range)，大小未知时为None
+    """
+    session = await get_music_api_client().get_session()
+    async with session.get(url, headers={"Range": "bytes=0-0"}, timeout=_download_timeout(sock_read_timeout)) as response:
+        response.raise_for_status()
+        if response.status == 206:
+            match = _CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+            if match:
+                return int(match.group(3)), True
+            return None, False
+        # 服务器忽略了Range，返回的是整个文件
+        return response.content_length, False
+
+async def segmented_download(url: str, file_path: str, segments: int = DOWNLOAD_SEGMENTS,
+                             min_segment_size: int = DOWNLOAD_MIN_SEGMENT_SIZE, chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                             sock_read_timeout: float = DOWNLOAD_SOCK_READ_TIMEOUT,
+                             progress: Optional[ProgressCallback] = None) -> int:
+    """
+    分段并发下载：探测到服务器支持Range且文件足够大时，在 <file_path>.part 中预分配空间，
+    用segments个连接并发下载各段并写入各自的位置；不支持Range或文件较小时退化为单连接流式下载。
+    各段进度记录在 .part.json 中，中断后再次调用会从各段的断点继续；之前单连接下载中断留下的.part
+    作为已完成的第一段保留，只分段下载剩余部分。完成并校验通过后原子重命名为file_path。
+    :param segments: 最大并发连接数
+    :param min_segment_size: 每段的最小字节数
+    :return: 文件总字节数
+    """
+    try:
+        total, ranges_supported = await probe_range_support(url, sock_read_timeout)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        total, ranges_supported = None, False
+    part_path = file_path + PART_SUFFIX
+    state = _load_part_state(part_path) if ranges_supported and total else None
+    if state is not None and state["total"] != total:
+        state = None
+    # 单连接下载中断留下的.part（没有断点记录）是文件的前缀，续传时保留
+    prefix = 0
+    if state is None and os.path.exists(part_path) and not os.path.exists(_part_state_path(part_path)):
+        prefix = os.path.getsize(part_path)
+    if state is None and total:
+        segments = min(segments, max(0, total - prefix) // max(1, min_segment_size))
+    if state is None and (not ranges_supported or not total or prefix >= total or segments < 2):
+        return await stream_download(url, file_path, chunk_size=chunk_size,
+                                     sock_read_timeout=sock_read_timeout, progress=progress)
+
+    session = await get_music_api_client().get_session()
+    loop = asyncio.get_running_loop()
+    timeout = _download_timeout(sock_read_timeout)
+
+    if state is not None:
+        segment_list = state["segments"]
+    else:
+        segment_size = -(-(total - prefix) // segments)
+        segment_list = [[0, prefix - 1, prefix]] if prefix else []
+        segment_list += [[start, min(start + segment_size, total) - 1, start]
+                         for start in range(prefix, total, segment_size)]
+
+        def preallocate():
+            with open(part_path, 'r+b' if prefix else 'wb') as f:
+                f.truncate(total)
+            _save_part_state(part_path, total, segment_list)
+
+        await loop.run_in_executor(None, preallocate)
+    downloaded = sum(segment[2] - segment[0] for segment in segment_list)
+    last_saved = time.monotonic()
+
+    def save_state(force: bool = False):
+        # 断点记录很小，直接在事件循环中写入，并限制写入频率
+        nonlocal last_saved
+        if force or time.monotonic() - last_saved >= 1.0:
+            _save_part_state(part_path, total, segment_list)
+            last_saved = time.monotonic()
+
+    async def fetch_segment(segment):
+        nonlocal downloaded
+        start, end, _ = segment
+        if segment[2] > end:
+            return
+        f = await loop.run_in_executor(None, open, part_path, 'r+b')
+        try:
+            for attempt in range(DOWNLOAD_SEGMENT_RETRIES + 1):
+                try:
+                    # 从本段已写入的位置继续
+                    headers = {"Range": f"bytes={segment[2]}-{end}"}
+                    async with session.get(url, headers=headers, timeout=timeout) as response:
+                        response.raise_for_status()
+                        if response.status != 206:
+                            raise aiohttp.ClientPayloadError(f"分段请求未返回206: HTTP {response.status}")
+                        async for chunk in response.content.iter_chunked(chunk_size):
+                            chunk = chunk[:end + 1 - segment[2]]
+                            await loop.run_in_executor(None, _write_at, f, segment[2], chunk)
+                            segment[2] += len(chunk)
+                            downloaded += len(chunk)
+                            save_state()
+                            if progress is not None:
+                                progress(downloaded, total)
+                            if segment[2] > end:
+                                break
+                    if segment[2] > end:
+                        return
+                    raise aiohttp.ClientPayloadError(f"分段下载不完整: {segment[2] - start}/{end + 1 - start} 字节")
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if attempt >= DOWNLOAD_SEGMENT_RETRIES:
+                        raise
+        finally:
+            await loop.run_in_executor(None, f.close)
+
+    tasks = [asyncio.create_task(fetch_segment(segment)) for segment in segment_list]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # 保留.part和断点记录，下次调用时续传
+        save_state(force=True)
+        raise
+    await loop.run_in_executor(None, _finalize_download, part_path, file_path, total)
+    return total
+
+def _write_at(f, position: int, data: bytes):
+    f.seek(position)
+    f.write(data)
+    # 先落到系统缓冲区再更新断点记录，进程中断时已记录的进度一定已写入
+    f.flush()
+
+def scrub_cache_dir(cache_dir: Optional[str] = None, part_max_age: float = PART_MAX_AGE) -> int:
+    """
+    清理缓存目录：删除文件头无效的音频文件（如旧版本中断下载留下的截断文件）、
+    超过part_max_age未更新的.part文件及其断点记录、没有对应.part的断点记录、以及持有进程已崩溃的过期锁文件。
+    插件启动时在后台线程中调用。
+    :return: 删除的文件数
+    """
+    cache_dir = cache_dir or get_cache_dir()
+    removed = 0
+    now = time.time()
+    # 旧版本按歌名保存在cache目录下，新下载的音频在 cache/audio 下
+    store_dir = os.path.join(cache_dir, "audio")
+    paths = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+    if os.path.isdir(store_dir):
+        paths += [os.path.join(store_dir, name) for name in os.listdir(store_dir)]
+    for path in paths:
+        name = os.path.basename(path)
+        try:
+            if not os.path.isfile(path):
+                continue
+            if name.endswith(PART_SUFFIX):
+                if now - os.path.getmtime(path) > part_max_age:
+                    _remove_part(path)
+                    removed += 1
+            elif name.endswith(LOCK_SUFFIX):
+                if is_stale_lock(path):
+                    os.remove(path)
+                    removed += 1
+            elif name.endswith(PART_SUFFIX + ".json") or name.endswith(PART_SUFFIX + ".json.tmp"):
+                if not os.path.exists(path[:path.rindex(PART_SUFFIX) + len(PART_SUFFIX)]):
+                    os.remove(path)
+                    removed += 1
+            elif os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS and not verify_audio_file(path):
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+def is_downloaded(file_path: str) -> bool:
+    """已下载的音频文件存在且文件头有效；无效文件（截断、被写坏）会被删除以便重新下载"""
+    if not os.path.exists(file_path):
+        return False
+    if verify_audio_file(file_path):
+        return True
+    os.remove(file_path)
+    return False
+
+async def download_netease_flac(song_name: str, choose: str, quality: str, api_url: str = "https://api.vkeys.cn",
+                                progress: Optional[ProgressCallback] = None,
+                                chunk_size: int = DOWNLOAD_CHUNK_SIZE, segments: int = DOWNLOAD_SEGMENTS) -> str:
     """
-    搜索网易云音乐并下载FLAC音频到cache目录，返回文件路径。
+    搜索网易云音乐并下载音频到按歌曲id寻址的存储（cache/audio/<歌曲id>_<音质>.flac），返回文件路径。
+    同一首歌无论以什么名字点播都只下载一次；旧版本按歌名保存在cache目录下的文件仍可命中。
+    命中的文件记录一次访问（磁盘配额按最近访问淘汰），新下载完成后在后台检查磁盘配额。
     :param song_name: 歌曲名
     :param quality: 音质（默认9）
     :param api_url: API地址 
-    :return: 下载完成的flac文件路径
+    :param progress: 下载进度回调 progress(已下载字节数, 总字节数)
+    :param chunk_size: 下载分块大小(字节)
+    :param segments: 分段并发下载的连接数，1表示单连接下载
+    :return: 下载完成的音频文件路径
     """
-    import re
-    cache_dir = get_cache_dir()
-    # 与 plugin.py 保持一致，去除括号及特殊符号
-    safe_song_name = re.sub(r'[\\/:*?"<>|()（）\[\]{}]', '', song_name)
-    flac_path = os.path.join(cache_dir, f"{safe_song_name}.flac")
-    if os.path.exists(flac_path):
-        return flac_path
+    store = get_audio_store()
+    quota = get_cache_quota()
+    # 已登记过的名字直接按歌曲id命中，无需访问API
+    stored_path = await asyncio.to_thread(store.lookup, song_name, quality, choose)
+    if stored_path and is_downloaded(stored_path):
+        quota.touch(stored_path)
+        return stored_path
 
     json_cache_path = get_json_cache_path(song_name, choose, quality)
-    data = None
+    # 读取缓存的元数据（文件I/O放到线程池，不阻塞事件循环）
+    data = await asyncio.to_thread(_read_json_cache, json_cache_path)
 
-    if is_cache_valid(json_cache_path):
-        # 读取缓存
-        with open(json_cache_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    else:
-        # 请求API并缓存
-        async with aiohttp.ClientSession() as session:
-            params = {
-                "word": song_name,
-                "quality": quality,
-                "choose": choose
-            }
-            async with session.get(f"{api_url}/v2/music/netease", params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    with open(json_cache_path, "w", encoding="utf-8") as f:
-                        json.dump(data, f, ensure_ascii=False)
-                else:
-                    raise Exception(f"API请求失败: {response.status}")
+    if data is not None:
+        if not is_cached_url_fresh(json_cache_path, data):
+            # 播放链接已过期，先按元数据查找已下载的文件，找不到再刷新链接
+            info = data.get("data") or {}
+            local_path = (await asyncio.to_thread(_find_downloaded, store, song_name, choose, quality, info)
+                          if data.get("code") == 200 else None)
+            if local_path:
+                quota.touch(local_path)
+                return local_path
+            data = None
+
+    if data is None:
+        # 请求API并缓存（复用插件共享的连接池）
+        data = await get_music_api_client().fetch(song_name, quality, choose, base_url=api_url)
+        if data is None:
+            raise Exception("API请求失败")
+        await asyncio.to_thread(_write_json_cache, json_cache_path, data)
 
     if data.get("code") == 200 and data.get("data", {}).get("url"):
-        url = data["data"]["url"]
-        real_song_name = data["data"].get("song", song_name)
-        safe_song_name = re.sub(r'[\\/:*?"<>|()（）\[\]{}]', '', real_song_name)
-        flac_path = os.path.join(cache_dir, f"{safe_song_name}.flac")
-        if os.path.exists(flac_path):
-            return flac_path
-        # 下载文件
-        with requests.get(url, stream=True) as r:
-            r.raise_for_status()
-            with open(flac_path, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
+        info = data["data"]
+        url = info["url"]
+        local_path = await asyncio.to_thread(_find_downloaded, store, song_name, choose, quality, info)
+        if local_path:
+            quota.touch(local_path)
+            return local_path
+        song_id = info.get("id") or info.get("songid") or info.get("songId")
+        if song_id:
+            flac_path = store.blob_path(song_id, quality, audio_ext_from_url(url))
+        elif info.get("song"):
+            # 接口未返回歌曲id时退回按歌名保存
+            flac_path = store.legacy_path(info["song"])
+        else:
+            # 连歌名也没有时按搜索词、choose和音质单独命名，不会被其他歌曲按歌名命中
+            flac_path = store.legacy_path(f"query_{song_name}_{choose}_{quality}")
+        # 同一文件同时只有一个下载者（跨协程、线程和进程），后到的请求等待并直接复用其结果
+        async with async_file_lock(flac_path):
+            if is_downloaded(flac_path):
+                quota.touch(flac_path)
+                return flac_path
+            # 异步分段并发下载（不支持Range时单连接流式下载），不阻塞事件循环；失败后从.part续传重试
+            for attempt in range(DOWNLOAD_RETRIES + 1):
+                try:
+                    await segmented_download(url, flac_path, segments=segments, chunk_size=chunk_size, progress=progress)
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                    if attempt >= DOWNLOAD_RETRIES:
+                        raise
+                    await asyncio.sleep(backoff_delay(attempt))
+        # 刚下载的文件访问时间为当前时间，不会被本次配额检查淘汰
+        quota.enforce_in_background()
         return flac_path
     else:
         raise Exception(f"API未返回有效音频链接: {data}")
 
+def _read_json_cache(json_cache_path: str) -> Optional[dict]:
+    """读取未过期的元数据缓存，不存在、已过期或已损坏时返回None。需在线程池中调用"""
+    if not is_cache_valid(json_cache_path):
+        return None
+    try:
+        with open(json_cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_json_cache(json_cache_path: str, data: dict):
+    """
+    写入元数据缓存。先写临时文件再替换，并发读取的请求不会读到写了一半的JSON；
+    临时文件名带随机后缀，同一进程内多个线程的事件循环同时写同一首歌时互不覆盖。需在线程池中调用
+    """
+    tmp_path = f"{json_cache_path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, json_cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _find_downloaded(store, song_name: str, choose, quality, info: dict) -> Optional[str]:
+    """
+    按接口返回的歌曲信息查找已下载的音频，并登记别名，下次同名点播无需访问API。读写别名表，需在线程池中调用。
+    已知歌曲id时只查id寻址的存储：旧版本按歌名保存的文件无法确认是哪一首同名歌曲，不再使用；
+    接口未返回id时才按接口给出的真实歌名查找旧文件，从不按用户的搜索词匹配。
+    """
+    song_id = info.get("id") or info.get("songid") or info.get("songId")
+    if song_id:
+        store.add_song(song_name, choose, info)
+        stored_path = store.find(song_id, quality)
+        return stored_path if stored_path and is_downloaded(stored_path) else None
+    if info.get("song"):
+        legacy = store.legacy_path(info["song"])
+        if is_downloaded(legacy):
+            return legacy
+    return None
+
 if __name__ == "__main__":
     import sys
     song = sys.argv[1] if len(sys.argv) > 1 else "晴天"
     loop = asyncio.get_event_loop()
     try:
-        flac_file = loop.run_until_complete(download_netease_flac(song, "netease", "9"))
+        flac_file = loop.run_until_complete(download_netease_flac(song, "netease", "9", progress=print_progress(song)))
         print(f"下载完成: {flac_file}")
     except Exception as e:
         print(f"下载失败: {e}")
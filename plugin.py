@@ -1,197 +1,5 @@
-import http.client
-import json
 from .generator_tools import generate_rewrite_reply
 
-class NapcatClient:
-    def send_group_text(self, group_id: int, text: str):
-        """
-        发送文本消息到指定群聊。
-        :param group_id: 群号
-        :param text: 文本内容
-        :return: Napcat响应内容
-        """
-        conn = http.client.HTTPConnection(self.host, self.port)
-        payload = json.dumps({
-            "group_id": group_id,
-            "message": [
-                {
-                    "type": "text",
-                    "data": {
-                        "text": text
-                    }
-                }
-            ]
-        })
-        headers = {'Content-Type': 'application/json'}
-        conn.request("POST", "/send_group_msg", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        try:
-            resp_json = json.loads(data.decode("utf-8"))
-            success = resp_json.get("status") == "ok" and resp_json.get("retcode") == 0
-            return success, resp_json
-        except Exception:
-            return False, None
-
-    def send_private_text(self, user_id: int, text: str):
-        """
-        发送文本消息到指定私聊。
-        :param user_id: 用户ID
-        :param text: 文本内容
-        :return: Napcat响应内容
-        """
-        conn = http.client.HTTPConnection(self.host, self.port)
-        payload = json.dumps({
-            "user_id": user_id,
-            "message": [
-                {
-                    "type": "text",
-                    "data": {
-                        "text": text
-                    }
-                }
-            ]
-        })
-        headers = {'Content-Type': 'application/json'}
-        conn.request("POST", "/send_private_msg", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        try:
-            resp_json = json.loads(data.decode("utf-8"))
-            success = resp_json.get("status") == "ok" and resp_json.get("retcode") == 0
-            return success, resp_json
-        except Exception:
-            return False, None
-
-    def __init__(self, host="127.0.0.1", port=4998):
-        self.host = host
-        self.port = port
-
-    def send_group_music_card(self, group_id: int, music_type: str, music_id: str):
-        """
-        发送音乐小程序卡片到指定群聊。
-        :param group_id: 群号
-        :param music_type: 音乐平台类型（如 '163'）
-        :param music_id: 音乐ID
-        :return: Napcat响应内容
-        """
-        conn = http.client.HTTPConnection(self.host, self.port)
-        payload = json.dumps({
-            "group_id": group_id,
-            "message": [
-                {
-                    "type": "music",
-                    "data": {
-                        "type": music_type,
-                        "id": music_id
-                    }
-                }
-            ]
-        })
-        headers = {'Content-Type': 'application/json'}
-        conn.request("POST", "/send_group_msg", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        try:
-            resp_json = json.loads(data.decode("utf-8"))
-            success = resp_json.get("status") == "ok" and resp_json.get("retcode") == 0
-            return success, resp_json
-        except Exception:
-            return False, None
-
-    def send_group_record(self, group_id: int, file_path: str):
-        """
-        发送语音消息到指定群聊。
-        :param group_id: 群号
-        :param file_path: 语音文件路径（本地或网络）
-        :return: Napcat响应内容
-        """
-        conn = http.client.HTTPConnection(self.host, self.port)
-        payload = json.dumps({
-            "group_id": group_id,
-            "message": [
-                {
-                    "type": "record",
-                    "data": {
-                        "file": file_path
-                    }
-                }
-            ]
-        })
-        headers = {'Content-Type': 'application/json'}
-        conn.request("POST", "/send_group_msg", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        try:
-            resp_json = json.loads(data.decode("utf-8"))
-            success = resp_json.get("status") == "ok" and resp_json.get("retcode") == 0
-            return success, resp_json
-        except Exception:
-            return False, None
-
-    def send_private_music_card(self, user_id: int, music_type: str, music_id: str):
-        """
-        发送音乐小程序卡片到指定私聊。
-        :param user_id: 用户ID
-        :param music_type: 音乐平台类型（如 '163'）
-        :param music_id: 音乐ID
-        :return: Napcat响应内容
-        """
-        conn = http.client.HTTPConnection(self.host, self.port)
-        payload = json.dumps({
-            "user_id": user_id,
-            "message": [
-                {
-                    "type": "music",
-                    "data": {
-                        "type": music_type,
-                        "id": music_id
-                    }
-                }
-            ]
-        })
-        headers = {'Content-Type': 'application/json'}
-        conn.request("POST", "/send_private_msg", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        try:
-            resp_json = json.loads(data.decode("utf-8"))
-            success = resp_json.get("status") == "ok" and resp_json.get("retcode") == 0
-            return success, resp_json
-        except Exception:
-            return False, None
-
-    def send_private_record(self, user_id: int, file_path: str):
-        """
-        发送语音消息到指定私聊。
-        :param user_id: 用户ID
-        :param file_path: 语音文件路径（本地或网络）
-        :return: Napcat响应内容
-        """
-        conn = http.client.HTTPConnection(self.host, self.port)
-        payload = json.dumps({
-            "user_id": user_id,
-            "message": [
-                {
-                    "type": "record",
-                    "data": {
-                        "file": file_path
-                    }
-                }
-            ]
-        })
-        headers = {'Content-Type': 'application/json'}
-        conn.request("POST", "/send_private_msg", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-        try:
-            resp_json = json.loads(data.decode("utf-8"))
-            success = resp_json.get("status") == "ok" and resp_json.get("retcode") == 0
-            return success, resp_json
-        except Exception:
-            return False, None
-
-
 from typing import Any, Tuple, List, Type
 
 async def generate_rewrite_reply(chat_stream: Any, raw_reply: str, reason: str) -> Tuple[bool, Any]:
@@ -249,6 +57,8 @@ from src.plugin_system import (
 from src.plugin_system.base.config_types import ConfigField
 from src.common.logger import get_logger
 from src.chat.message_receive.chat_stream import ChatStream
+from .api_guard import CircuitOpenError
+from .deadline import Deadline
 # from .bilibili_random_video_action import BilibiliRandomVideoAction  # 延迟导入，避免加载时报错
 #from .gradio_load_model_action import SingAction  # 导入SOVITS翻唱Action
 
@@ -289,6 +99,80 @@ async def smart_send(chat_stream, message_data):
     )
     return success, packet
 
+async def fetch_music_candidates(component, song_name, quality, tries, api_url, need_url=True):
+    """
+    按配置选择对冲并发或顺序重试方式请求候选choose，供Action和Command共用。
+    :param need_url: 是否需要可用的播放链接，仅发卡片时可设为False以直接使用缓存的元数据
+    :return: (是否成功, 歌曲信息, 实际使用的choose)
+    """
+    client = get_music_api_client()
+    if component.get_config("api.hedged_lookup", True):
+        return await client.fetch_first_available(
+            song_name, quality, tries,
+            hedge_delay=component.get_config("api.hedge_delay", 0.3),
+            base_url=api_url,
+            need_url=need_url
+        )
+    return await client.fetch_with_retry(song_name, quality, tries, base_url=api_url, need_url=need_url)
+
+def record_song_request(song_name, quality, choose, api_url):
+    """记录一次成功的点歌，供后台预热器统计热门歌曲"""
+    warmer = get_song_warmer()
+    if warmer is not None:
+        try:
+            warmer.record(song_name, quality, choose, base_url=api_url)
+        except Exception as e:
+            logger.debug(f"记录点歌频率失败: {e}")
+
+# 为最后的回复保留的时间预算(秒)
+REPLY_RESERVE_SECONDS = 1.0
+# 卡片发送失败后补取播放链接的时间(秒)：发卡片时预留，预算已耗尽时也至少给这么多
+LINK_FALLBACK_SECONDS = 2.0
+
+async def rewrite_reply_within(deadline, min_budget, **kwargs):
+    """
+    在时间预算内调用 generator_api.rewrite_reply；剩余预算不足min_budget秒或超时则返回(False, None)，
+    由调用方改发原始文本。
+    """
+    if not deadline.has(min_budget):
+        return False, None
+    try:
+        return await deadline.run(generator_api.rewrite_reply(**kwargs), reserve=REPLY_RESERVE_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning("LLM润色超出时间预算，改发原始文本")
+        return False, None
+
+def chat_target(chat_stream) -> Optional[Tuple[str, int]]:
+    """
+    聊天流对应的Napcat发送目标。
+    :return: ("group", 群号) 或 ("private", 用户ID)，无法确定时返回None
+    """
+    if not chat_stream:
+        return None
+    group_id = getattr(getattr(chat_stream, "group_info", None), "group_id", None)
+    user_id = getattr(getattr(chat_stream, "user_info", None), "user_id", None)
+    try:
+        if group_id:
+            return "group", int(group_id)
+        if user_id:
+            return "private", int(user_id)
+    except (TypeError, ValueError):
+        pass
+    return None
+
+async def send_reply_texts(chat_stream, texts, send_text):
+    """
+    发送多段回复文本：仍通过框架的send_text（通常是Action的send_text）逐段发送，回复会记入聊天记录，
+    并与同一Action中的其他消息保持顺序；相邻的短段按napcat.merge_texts合并，
+    每段发送前占用该群/私聊的发送名额，与Napcat卡片、语音共用同一个限速。
+    """
+    target = chat_target(chat_stream)
+    dispatcher = get_napcat_dispatcher()
+    for text in dispatcher.merge_text_list(list(texts)):
+        if target is not None:
+            await dispatcher.acquire(*target)
+        await send_text(text)
+
 # ===== Action组件 =====
 
 class MusicSearchAction(BaseAction):
@@ -320,8 +204,8 @@ class MusicSearchAction(BaseAction):
     ]
     associated_types = ["text"]
 
-    async def _fetch_music_info_with_retry(self, song_name, quality, api_url):
-        import asyncio
+    def _get_choose_input(self):
+        """解析用户指定的choose，未指定或非法时返回None"""
         choose_input = self.action_data.get("choose", None)
         try:
             choose_input = int(choose_input)
@@ -329,6 +213,21 @@ class MusicSearchAction(BaseAction):
                 choose_input = 1
         except Exception:
             choose_input = None
+        return choose_input
+
+    async def _lookup_local_catalog(self, song_name):
+        """在本地歌曲目录中解析歌曲，未启用或未命中时返回None；SQLite查询放到线程池执行"""
+        catalog = get_song_catalog()
+        if catalog is None:
+            return None
+        try:
+            return await asyncio.to_thread(catalog.lookup, song_name, self._get_choose_input() or 1)
+        except Exception as e:
+            logger.warning(f"本地歌曲目录查询失败: {e}")
+            return None
+
+    async def _fetch_music_info_with_retry(self, song_name, quality, api_url, need_url=True):
+        choose_input = self._get_choose_input()
         if choose_input:
             tries = [choose_input, 1, 2, 3]
             # 去重且保持顺序
@@ -336,21 +235,7 @@ class MusicSearchAction(BaseAction):
             tries = [x for x in tries if not (x in seen or seen.add(x))]
         else:
             tries = [1, 2, 3]
-        for idx, c in enumerate(tries):
-            await asyncio.sleep(3) if idx > 0 else None
-            async with aiohttp.ClientSession() as session:
-                params = {
-                    "word": song_name,
-                    "quality": quality,
-                    "choose": c
-                }
-                async with session.get(f"{api_url}/v2/music/netease", params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get("code") == 200:
-                            return True, data.get("data", {}), c
-        # 只要不是成功就继续下一次
-        return False, None, tries[-1]
+        return await fetch_music_candidates(self, song_name, quality, tries, api_url, need_url=need_url)
 
     def _get_target_info(self, chat_stream):
         """获取目标ID和群聊标志"""
@@ -374,13 +259,24 @@ class MusicSearchAction(BaseAction):
         return False, "API返回错误"
 
     async def _handle_exception(self, chat_stream, e):
+        if isinstance(e, CircuitOpenError):
+            logger.warning(f"音乐API熔断中，快速失败: {e}")
+            if chat_stream:
+                await self.send_text("音乐服务暂时繁忙，请稍后再试")
+            return False, f"音乐API熔断中: {e}"
         logger.error(f"音乐搜索失败: {e}")
         if chat_stream:
             await self.send_text("搜索音乐时出现错误，请稍后再试")
         return False, f"搜索失败: {str(e)}"
 
+    def _get_deadline(self) -> Deadline:
+        deadline = getattr(self, "_deadline", None)
+        return deadline if deadline is not None else Deadline(0)
+
     async def execute(self) -> Tuple[bool, str]:
         """执行音乐搜索"""
+        # 端到端时间预算，搜索、发卡片、LLM润色和分段发送共用
+        self._deadline = Deadline(self.get_config("music.reply_deadline", 8))
         song_name = self.action_data.get("song_name", "")
         quality = self.action_data.get("quality", "9")  # 默认最高音质
         direct_url = self.action_data.get("direct_url", False)
@@ -389,19 +285,59 @@ class MusicSearchAction(BaseAction):
             await self._send_ask_song_name(chat_stream)
             return True, "请求用户输入歌曲名"
         api_url = self.get_config("api.base_url", "https://api.vkeys.cn")
+        # 发卡片只需要歌曲id，先查本地歌曲目录，命中则完全不访问网络
+        if not direct_url:
+            local_info = await self._lookup_local_catalog(song_name)
+            if local_info:
+                self._resolved_query = (song_name, quality, self._get_choose_input() or 1, api_url)
+                record_song_request(*self._resolved_query)
+                return await self._handle_api_success(local_info, direct_url)
         try:
-            success, music_info, choose_used = await self._fetch_music_info_with_retry(song_name, quality, api_url)
+            # 发卡片只需要歌曲id，直链模式才需要未过期的播放链接；为回复保留一点预算
+            success, music_info, choose_used = await self._deadline.run(
+                self._fetch_music_info_with_retry(song_name, quality, api_url, need_url=bool(direct_url)),
+                reserve=REPLY_RESERVE_SECONDS
+            )
             if success and music_info:
+                self._resolved_query = (song_name, quality, choose_used, api_url)
+                record_song_request(*self._resolved_query)
                 return await self._handle_api_success(music_info, direct_url)
             else:
                 return await self._handle_api_failure(chat_stream)
+        except asyncio.TimeoutError:
+            logger.warning(f"音乐搜索超出时间预算: {song_name}")
+            if chat_stream:
+                await self.send_text("搜索超时了，请稍后再试")
+            return False, "音乐搜索超时"
         except Exception as e:
             return await self._handle_exception(chat_stream, e)
 
+    async def _resolve_stream_url(self, music_info: dict) -> str:
+        """卡片发送失败需要降级为直链时，补取播放链接（元数据命中缓存时结果中不含链接）"""
+        url = music_info.get("url", "")
+        resolved_query = getattr(self, "_resolved_query", None)
+        if url or not resolved_query:
+            return url
+        song_name, quality, choose, api_url = resolved_query
+        # 发卡片可能已用掉剩余预算，补取链接至少保留LINK_FALLBACK_SECONDS，保证用户总能收到回复
+        timeout = self._get_deadline().timeout()
+        try:
+            data = await asyncio.wait_for(
+                get_music_api_client().fetch(song_name, quality, choose, base_url=api_url),
+                timeout=None if timeout is None else max(timeout, LINK_FALLBACK_SECONDS)
+            )
+        except Exception as e:
+            logger.warning(f"补取播放链接失败: {e}")
+            return ""
+        if data and data.get("code") == 200:
+            return (data.get("data") or {}).get("url", "")
+        return ""
+
     async def _send_music_info(self, music_info: dict, direct_url=False):
         song = music_info.get("song", "未知歌曲")
         url = music_info.get("url", "")
         chat_stream = getattr(self, "chat_stream", None)
+        deadline = self._get_deadline()
         if direct_url:
             if chat_stream and url:
                 await self.send_text(f"播放链接：{song} {url}")
@@ -417,31 +353,42 @@ class MusicSearchAction(BaseAction):
                 music_info.get("songid") or
                 music_info.get("songId")
             )
-            # from .napcat_client import NapcatClient
-            client = NapcatClient()
+            dispatcher = get_napcat_dispatcher()
             resp = None
+            # Napcat发送（含排队）受时间预算约束，超时则撤回排队中的卡片并降级为直链
+            napcat_timeout = self.get_config("music.napcat_timeout", 3)
             if group_id is not None and music_id:
                 try:
                     group_id_int = int(group_id)
                 except Exception:
                     group_id_int = group_id
-                resp = client.send_group_music_card(group_id=group_id_int, music_type="163", music_id=str(music_id))
+                resp = await deadline.run(
+                    dispatcher.send_music_card("group", group_id_int, "163", str(music_id)),
+                    cap=napcat_timeout,
+                    reserve=LINK_FALLBACK_SECONDS
+                )
             elif user_id is not None and music_id:
                 try:
                     user_id_int = int(user_id)
                 except Exception:
                     user_id_int = user_id
-                resp = client.send_private_music_card(user_id=user_id_int, music_type="163", music_id=str(music_id))
+                resp = await deadline.run(
+                    dispatcher.send_music_card("private", user_id_int, "163", str(music_id)),
+                    cap=napcat_timeout,
+                    reserve=LINK_FALLBACK_SECONDS
+                )
             if resp:
                 logger.info(f"Napcat音乐卡片发送响应: {resp}")
                 try:
                     success, resp_json = resp
                     if success and resp_json and resp_json.get("status") == "ok" and resp_json.get("retcode") == 0:
                         napcat_card_sent = True
-                        # 发送成功后调用generator生成消息
+                        # 发送成功后调用generator生成消息，预算不足时跳过LLM润色
                         # from .generator_tools import generate_rewrite_reply
                         if chat_stream:
-                            status, llm_response = await generator_api.rewrite_reply(
+                            status, llm_response = await rewrite_reply_within(
+                                deadline,
+                                self.get_config("music.llm_min_budget", 3),
                                 chat_stream=chat_stream,
                                 reply_data={
                                     "raw_reply": f"Napcat音乐卡片发送成功：{song}",
@@ -449,10 +396,8 @@ class MusicSearchAction(BaseAction):
                                 }
                             )
                             if status and llm_response and llm_response.reply_set:
-                                for reply_seg in llm_response.reply_set:
-                                    data = reply_seg[1]
-                                    await self.send_text(data)
-                                    await asyncio.sleep(1.0)
+                                # 分段回复交给出站调度器按群限速发送，不在这里逐段sleep
+                                await send_reply_texts(chat_stream, [seg[1] for seg in llm_response.reply_set], self.send_text)
                             else:
                                 await self.send_text(f"Napcat音乐卡片发送成功：{song}")
                 except Exception as e:
@@ -460,39 +405,31 @@ class MusicSearchAction(BaseAction):
         except Exception as e:
             logger.warning(f"Napcat音乐卡片发送失败: {e}")
         # 只有Napcat卡片未成功时才发直达链接
-        if not napcat_card_sent and chat_stream and url:
-            await self.send_text(f"播放链接：{song} {url}")
+        if not napcat_card_sent and chat_stream:
+            url = await self._resolve_stream_url(music_info)
+            if url:
+                await self.send_text(f"播放链接：{song} {url}")
+            else:
+                await self.send_text(f"找到了《{song}》，但卡片发送失败，播放链接也暂时获取不到，请稍后再试")
 
 # ===== Command组件 =====
 
+# 歌单点歌的分隔符（半角/全角分号）
+PLAYLIST_SEPARATOR_RE = re.compile(r"[;；]")
+
 class MusicCommand(BaseCommand):
     """音乐点歌Command - 直接点歌命令"""
 
     command_name = "music"
     command_description = "点歌命令"
     command_pattern = r"^/music\s+(?P<song_name>.+)$"  # 用命名组
-    command_help = "点歌命令，用法：/music 歌曲名"
-    command_examples = ["/music 勾指起誓", "/music 晴天"]
+    command_help = "点歌命令，用法：/music 歌曲名，一次点多首用分号分隔：/music 歌曲1; 歌曲2"
+    command_examples = ["/music 勾指起誓", "/music 晴天", "/music 晴天; 稻香; 七里香"]
     intercept_message = True
 
     async def _fetch_music_info_with_retry(self, song_name, quality, api_url):
-        import asyncio
         tries = [1, 2, 3]  # 依次尝试1、2、3
-        for idx, c in enumerate(tries):
-            await asyncio.sleep(3) if idx > 0 else None
-            async with aiohttp.ClientSession() as session:
-                params = {
-                    "word": song_name,
-                    "quality": quality,
-                    "choose": c
-                }
-                async with session.get(f"{api_url}/v2/music/netease", params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get("code") == 200:
-                            return True, data.get("data", {}), c
-        # 只要不是成功就继续下一次
-        return False, None, tries[-1]
+        return await fetch_music_candidates(self, song_name, quality, tries, api_url)
 
     async def execute(self) -> Tuple[bool, str]:
         # 只在标准 Action 场景下用，直接依赖 self.chat_stream
@@ -511,9 +448,25 @@ class MusicCommand(BaseCommand):
             return False, "格式错误"
         quality = self.get_config("music.default_quality", "9")
         api_url = self.get_config("api.base_url", "https://api.vkeys.cn")
+        # 歌单：/music 歌曲1; 歌曲2; 歌曲3
+        song_names = [name.strip() for name in PLAYLIST_SEPARATOR_RE.split(song_name) if name.strip()]
+        if len(song_names) > 1:
+            try:
+                return await self._execute_playlist(song_names, quality, api_url, chat_stream)
+            except CircuitOpenError as e:
+                logger.warning(f"音乐API熔断中，快速失败: {e}")
+                if chat_stream:
+                    await self._send_chat_text(chat_stream, "❌ 音乐服务暂时繁忙，请稍后再试")
+                return False, f"音乐API熔断中: {e}"
+        # 端到端时间预算，搜索、LLM美化、发卡片共用
+        self._deadline = Deadline(self.get_config("music.reply_deadline", 8))
         try:
-            success, music_info, choose_used = await self._fetch_music_info_with_retry(song_name, quality, api_url)
+            success, music_info, choose_used = await self._deadline.run(
+                self._fetch_music_info_with_retry(song_name, quality, api_url),
+                reserve=REPLY_RESERVE_SECONDS
+            )
             if success and music_info:
+                record_song_request(song_name, quality, choose_used, api_url)
                 await self._send_detailed_music_info(music_info)
                 return True, f"点歌成功: {music_info.get('song', '未知')} (choose={choose_used})"
             else:
@@ -527,6 +480,30 @@ class MusicCommand(BaseCommand):
                         is_group=is_group
                     )
                 return False, "搜索失败"
+        except CircuitOpenError as e:
+            logger.warning(f"音乐API熔断中，快速失败: {e}")
+            if chat_stream:
+                target_id = str(chat_stream.group_info.group_id) if getattr(chat_stream, "group_info", None) else str(chat_stream.user_info.user_id)
+                is_group = getattr(chat_stream, "group_info", None) is not None
+                await send_api.custom_message(
+                    message_type="text",
+                    content="❌ 音乐服务暂时繁忙，请稍后再试",
+                    target_id=target_id,
+                    is_group=is_group
+                )
+            return False, f"音乐API熔断中: {e}"
+        except asyncio.TimeoutError:
+            logger.warning(f"点歌超出时间预算: {song_name}")
+            if chat_stream:
+                target_id = str(chat_stream.group_info.group_id) if getattr(chat_stream, "group_info", None) else str(chat_stream.user_info.user_id)
+                is_group = getattr(chat_stream, "group_info", None) is not None
+                await send_api.custom_message(
+                    message_type="text",
+                    content="❌ 搜索超时了，请稍后再试",
+                    target_id=target_id,
+                    is_group=is_group
+                )
+            return False, "点歌超时"
         except Exception as e:
             logger.error(f"点歌失败: {e}")
             if chat_stream:
@@ -569,8 +546,19 @@ class MusicCommand(BaseCommand):
         chat_stream = getattr(self, "chat_stream", None)
         if chat_stream is None and hasattr(self, "message") and hasattr(self.message, "chat_stream"):
             chat_stream = self.message.chat_stream
+        deadline = getattr(self, "_deadline", None) or Deadline(0)
+        llm_min_budget = self.get_config("music.llm_min_budget", 3)
         if chat_stream is not None:
-            status, reply = await generate_rewrite_reply(chat_stream, message, "music_plugin详细音乐信息美化")
+            # 预算不足时跳过美化，直接发送原始信息
+            status, reply = await rewrite_reply_within(
+                deadline,
+                llm_min_budget,
+                chat_stream=chat_stream,
+                reply_data={
+                    "raw_reply": message,
+                    "reason": "music_plugin详细音乐信息美化",
+                }
+            )
         else:
             status, reply = False, None
         if chat_stream:
@@ -593,74 +581,251 @@ class MusicCommand(BaseCommand):
         # 如果有封面图片，可以发送图片
         # 已移除封面图片发送逻辑（小程序卡片自带封面）
         # ===== 新增：发送音乐小程序卡片到群聊（Napcat 4998） =====
-        napcat_card_sent = False
+        napcat_card_sent = await self._send_music_card(chat_stream, music_info, deadline)
+        if napcat_card_sent and chat_stream:
+            # 发送成功后调用generator生成消息，预算不足时跳过LLM润色
+            status, llm_response = await rewrite_reply_within(
+                deadline,
+                llm_min_budget,
+                chat_stream=chat_stream,
+                reply_data={
+                    "raw_reply": f"Napcat音乐卡片发送成功：{song}",
+                    "reason": "music_plugin Napcat卡片发送成功提示"
+                }
+            )
+            if status and llm_response and llm_response.reply_set:
+                # 分段回复交给出站调度器按群限速发送，不在这里逐段sleep
+                await send_reply_texts(chat_stream, [seg[1] for seg in llm_response.reply_set], self.send_text)
+            else:
+                await self.send_text(f"Napcat音乐卡片发送成功：{song}")
+        # ===== 只在卡片未成功时发送url，不再发送封面 =====
+        if not napcat_card_sent and chat_stream:
+            url = music_info.get("url", "")
+            if url:
+                await self._send_chat_text(chat_stream, f"播放链接：{song} {url}")
+            else:
+                await self._send_chat_text(chat_stream, f"找到了《{song}》，但卡片发送失败，播放链接也暂时获取不到，请稍后再试")
+
+    async def _send_music_card(self, chat_stream, music_info: dict, deadline: Deadline) -> bool:
+        """
+        通过Napcat发送网易云音乐小程序卡片。
+        :return: 是否发送成功
+        """
         try:
-        # from .napcat_client import NapcatClient
             group_info = getattr(chat_stream, "group_info", None) if chat_stream else None
             group_id = getattr(group_info, "group_id", None)
             user_id = getattr(chat_stream.user_info, "user_id", None) if chat_stream else None
             music_id = music_info.get("id") or music_info.get("songid") or music_info.get("songId")
-            client = NapcatClient()
+            dispatcher = get_napcat_dispatcher()
             resp = None
+            napcat_timeout = self.get_config("music.napcat_timeout", 3)
             if group_id is not None and music_id:
                 try:
                     group_id_int = int(group_id)
                 except Exception:
                     group_id_int = group_id
-                resp = client.send_group_music_card(group_id=group_id_int, music_type="163", music_id=str(music_id))
+                resp = await deadline.run(
+                    dispatcher.send_music_card("group", group_id_int, "163", str(music_id)),
+                    cap=napcat_timeout,
+                    reserve=LINK_FALLBACK_SECONDS
+                )
             elif user_id is not None and music_id:
                 try:
                     user_id_int = int(user_id)
                 except Exception:
                     user_id_int = user_id
-                resp = client.send_private_music_card(user_id=user_id_int, music_type="163", music_id=str(music_id))
+                resp = await deadline.run(
+                    dispatcher.send_music_card("private", user_id_int, "163", str(music_id)),
+                    cap=napcat_timeout,
+                    reserve=LINK_FALLBACK_SECONDS
+                )
             if resp:
                 logger.info(f"Napcat音乐卡片发送响应: {resp}")
                 try:
-                    resp_json = json.loads(resp)
-                    if resp_json.get("status") == "ok" and resp_json.get("retcode") == 0:
-                        napcat_card_sent = True
-                        # 发送成功后调用generator生成消息
-                        if chat_stream:
-                            status, llm_response = await generator_api.rewrite_reply(
-                                chat_stream=chat_stream,
-                                reply_data={
-                                    "raw_reply": f"Napcat音乐卡片发送成功：{song}",
-                                    "reason": "music_plugin Napcat卡片发送成功提示"
-                                }
-                            )
-                            if status and llm_response and llm_response.reply_set:
-                                for reply_seg in llm_response.reply_set:
-                                    data = reply_seg[1]
-                                    await self.send_text(data)
-                                    await asyncio.sleep(1.0)
-                            else:
-                                await self.send_text(f"Napcat音乐卡片发送成功：{song}")
+                    success, resp_json = resp
+                    return bool(success and resp_json and resp_json.get("status") == "ok" and resp_json.get("retcode") == 0)
                 except Exception as e:
                     logger.warning(f"Napcat响应解析失败: {e}")
         except Exception as e:
             logger.warning(f"Napcat音乐卡片发送失败: {e}")
-        # ===== 只在卡片未成功时发送url，不再发送封面 =====
-        if not napcat_card_sent:
-            url = music_info.get("url", "")
-            if url and chat_stream:
-                group_info = getattr(chat_stream, "group_info", None)
-                if group_info and getattr(group_info, "group_id", None):
-                    target_id = group_info.group_id
-                else:
-                    target_id = getattr(chat_stream.user_info, "user_id", None)
-                is_group = group_info is not None
-                if target_id is not None:
-                    await send_api.custom_message(
-                        message_type="text",
-                        content=f"播放链接：{song} {url}",
-                        target_id=target_id,
-                        is_group=is_group
+        return False
+
+    async def _send_chat_text(self, chat_stream, content: str):
+        """向当前聊天（群聊或私聊）发送一条文本"""
+        group_info = getattr(chat_stream, "group_info", None)
+        if group_info and getattr(group_info, "group_id", None):
+            target_id = group_info.group_id
+        else:
+            target_id = getattr(chat_stream.user_info, "user_id", None)
+        is_group = group_info is not None
+        if target_id is not None:
+            await send_api.custom_message(
+                message_type="text",
+                content=content,
+                target_id=target_id,
+                is_group=is_group
+            )
+
+    async def _execute_playlist(self, song_names: List[str], quality, api_url, chat_stream) -> Tuple[bool, str]:
+        """
+        歌单点歌：在信号量限制下并发解析所有歌曲，再按点歌顺序依次发送卡片，
+        每首歌解析完成且前面的歌都已发出后立即发送，不必等待最慢的一首。
+        """
+        max_songs = max(1, self.get_config("music.playlist_max_songs", 10))
+        skipped = song_names[max_songs:]
+        song_names = song_names[:max_songs]
+        semaphore = asyncio.Semaphore(max(1, self.get_config("music.playlist_concurrency", 3)))
+        reply_deadline = self.get_config("music.reply_deadline", 8)
+
+        async def resolve(song_name):
+            async with semaphore:
+                # 每首歌从拿到并发名额时开始计算自己的时间预算，解析和发送共用
+                deadline = Deadline(reply_deadline)
+                try:
+                    success, music_info, choose_used = await deadline.run(
+                        fetch_music_candidates(self, song_name, quality, [1, 2, 3], api_url, need_url=False)
                     )
+                except CircuitOpenError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"歌单点歌解析失败: {song_name} {e}")
+                    success, music_info, choose_used = False, None, 1
+                return success, music_info, choose_used, deadline
+
+        tasks = [asyncio.create_task(resolve(song_name)) for song_name in song_names]
+        sent, failed = [], []
+        try:
+            for song_name, task in zip(song_names, tasks):
+                success, music_info, choose_used, deadline = await task
+                if not (success and music_info):
+                    failed.append(song_name)
+                    continue
+                record_song_request(song_name, quality, choose_used, api_url)
+                if not await self._send_music_card(chat_stream, music_info, deadline):
+                    # 卡片发送失败时补取播放链接改发直链，预算已用完时至少保留LINK_FALLBACK_SECONDS
+                    data = None
+                    timeout = deadline.timeout()
+                    try:
+                        data = await asyncio.wait_for(
+                            get_music_api_client().fetch(song_name, quality, choose_used, base_url=api_url),
+                            timeout=None if timeout is None else max(timeout, LINK_FALLBACK_SECONDS)
+                        )
+                    except Exception as e:
+                        logger.warning(f"获取播放链接失败: {e}")
+                    url = ((data or {}).get("data") or {}).get("url", "")
+                    if not url:
+                        failed.append(song_name)
+                        continue
+                    if chat_stream:
+                        await self._send_chat_text(chat_stream, f"播放链接：{music_info.get('song', song_name)} {url}")
+                sent.append(music_info.get("song", song_name))
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        if chat_stream and (failed or skipped):
+            message = f"🎵 歌单已发送 {len(sent)}/{len(song_names)} 首"
+            if failed:
+                message += f"\n❌ 未找到：{'、'.join(failed)}"
+            if skipped:
+                message += f"\n⚠️ 一次最多点{max_songs}首，已忽略：{'、'.join(skipped)}"
+            await self._send_chat_text(chat_stream, message)
+        return bool(sent), f"歌单点歌完成: 成功{len(sent)}首，失败{len(failed)}首"
 
 # ===== 插件注册 =====
 
-from .napcat_client import NapcatClient
+from .napcat_client import configure_napcat_client
+from .napcat_dispatcher import configure_napcat_dispatcher, get_napcat_dispatcher, unique_targets
+from .record_cache import broadcast_record_cached, configure_record_cache, send_record_cached
+from .music_api_client import configure_music_api_client, get_music_api_client
+from .song_catalog import configure_song_catalog, get_song_catalog
+from .song_warmer import configure_song_warmer, get_song_warmer
+from .netease_download_tool import scrub_cache_dir
+from .audio_store import get_audio_store
+from .cache_quota import configure_cache_quota, get_cache_quota
+import threading
+
+def _scrub_download_cache():
+    """
+    后台清理下载缓存目录中的截断音频和长期未续传的.part文件，把旧版本按歌名命名的翻唱成品迁移为按id命名，
+    再按磁盘配额淘汰最久未访问的文件
+    """
+    try:
+        from .msst_separate_tool import find_results_dir
+        migrated = get_audio_store().migrate_legacy_covers(find_results_dir())
+        if migrated:
+            logger.info(f"已将 {migrated} 个按歌名命名的翻唱成品迁移为按歌曲id命名")
+    except Exception as e:
+        logger.warning(f"翻唱成品迁移失败: {e}")
+    try:
+        removed = scrub_cache_dir()
+        if removed:
+            logger.info(f"下载缓存清理完成，删除无效文件 {removed} 个")
+    except Exception as e:
+        logger.warning(f"下载缓存清理失败: {e}")
+    try:
+        removed, freed = get_cache_quota().enforce()
+        if removed:
+            logger.info(f"磁盘配额清理完成，删除 {removed} 个文件，释放 {freed / 1024 / 1024:.1f} MB")
+    except Exception as e:
+        logger.warning(f"磁盘配额清理失败: {e}")
+
+def _import_search_caches(catalog):
+    """后台把已有的搜索缓存导入本地歌曲目录"""
+    try:
+        imported = catalog.ingest_search_cache_dir()
+        logger.info(f"本地歌曲目录已加载，导入搜索缓存 {imported} 条")
+    except Exception as e:
+        logger.warning(f"导入搜索缓存到本地歌曲目录失败: {e}")
+
+async def find_cover_file(song_name: str, api_url: str, choose: str = "1",
+                          quality: str = "1") -> Tuple[str, Optional[str]]:
+    """
+    查找歌曲已生成的AI翻唱成品。
+    :return: (解析出的歌名, 翻唱文件路径)，尚未生成时路径为None
+    """
+    # 先解析歌曲id：优先查本地别名表，未登记再请求网易云API
+    real_song_name = song_name
+    real_title = None
+    song_id = None
+    store = get_audio_store()
+    song_entry = await asyncio.to_thread(store.resolve, song_name, choose)
+    if song_entry:
+        real_song_name = real_title = song_entry.get("song") or song_name
+        song_id = song_entry.get("id")
+    else:
+        try:
+            data = await get_music_api_client().fetch(song_name, quality, choose, base_url=api_url, need_url=False)
+            if data and data.get("code") == 200 and data.get("data", {}).get("song"):
+                real_song_name = real_title = data["data"]["song"]
+                song_id = data["data"].get("id")
+                await asyncio.to_thread(store.add_song, song_name, choose, data["data"])
+        except Exception as e:
+            pass  # 搜索失败就用原始song_name
+    # 翻唱成品按 <歌曲id>_<音质>_changed.wav 命名。旧版本按歌名命名的成品分不清同名的不同歌曲，
+    # 只在没有歌曲id时按解析出的真实歌名查找，不按用户的搜索词匹配
+    if song_id:
+        changed_files = [f"{store.stem(song_id, quality)}_changed.wav"]
+    elif real_title:
+        safe_real_title = re.sub(r'[\\/:*?"<>|()（）\[\]{}]', '', real_title)
+        changed_files = [f"{safe_real_title}_changed.wav"]
+    else:
+        return real_song_name, None
+    from .msst_separate_tool import find_results_dir
+    msst_result_dir = find_results_dir()
+    for changed_file in changed_files:
+        msst_file_path = os.path.join(msst_result_dir, changed_file)
+        if os.path.isfile(msst_file_path):
+            return real_song_name, msst_file_path
+        elif os.path.isfile(changed_file):
+            return real_song_name, changed_file
+    if song_id and real_title:
+        # 旧版本按歌名命名的成品：别名表确认歌名对应这首歌后改名为按id命名，免去重新生成
+        if await asyncio.to_thread(store.migrate_legacy_covers, msst_result_dir, quality):
+            msst_file_path = os.path.join(msst_result_dir, changed_files[0])
+            if os.path.isfile(msst_file_path):
+                return real_song_name, msst_file_path
+    return real_song_name, None
 
 class SingAction(BaseAction):
     """调用SOVITS处理网易云音乐下载的FLAC实现AI翻唱或TTS文本转语音"""
@@ -721,12 +886,11 @@ class SingAction(BaseAction):
                             chat_stream = getattr(self, "chat_stream", None)
                             group_id = getattr(getattr(chat_stream, "group_info", None), "group_id", None) if chat_stream else None
                             user_id = getattr(getattr(chat_stream, "user_info", None), "user_id", None) if chat_stream else None
-                            from .napcat_client import NapcatClient
-                            napcat = NapcatClient()
+                            dispatcher = get_napcat_dispatcher()
                             sent = False
                             message_id = None
                             if group_id:
-                                success, resp_json = napcat.send_group_record(int(group_id), audio_path)
+                                success, resp_json = await dispatcher.send_record("group", int(group_id), audio_path)
                                 if success:
                                     message_id = resp_json.get("data", {}).get("message_id") if resp_json else None
                                     sent = True
@@ -742,13 +906,11 @@ class SingAction(BaseAction):
                                     enable_chinese_typo=False
                                 )
                                 if status and llm_response and llm_response.reply_set:
-                                    for reply_seg in llm_response.reply_set:
-                                        data = reply_seg[1]
-                                        await self.send_text(data)
+                                    await send_reply_texts(chat_stream, [seg[1] for seg in llm_response.reply_set], self.send_text)
                                 else:
                                     await self.send_text(f"TTS语音已发送: 消息ID: {message_id if message_id else '未知'}")
                             elif user_id:
-                                success, resp_json = napcat.send_private_record(int(user_id), audio_path)
+                                success, resp_json = await dispatcher.send_record("private", int(user_id), audio_path)
                                 if success:
                                     message_id = resp_json.get("data", {}).get("message_id") if resp_json else None
                                     sent = True
@@ -763,9 +925,7 @@ class SingAction(BaseAction):
                                     enable_chinese_typo=False
                                 )
                                 if status and llm_response and llm_response.reply_set:
-                                    for reply_seg in llm_response.reply_set:
-                                        data = reply_seg[1]
-                                        await self.send_text(data)
+                                    await send_reply_texts(chat_stream, [seg[1] for seg in llm_response.reply_set], self.send_text)
                                 else:
                                     await self.send_text(f"TTS语音已发送: 消息ID: {message_id if message_id else '未知'}")
                             if sent:
@@ -787,55 +947,29 @@ class SingAction(BaseAction):
                     }
                 )
                 if status and llm_response and llm_response.reply_set:
-                    for reply_seg in llm_response.reply_set:
-                        data = reply_seg[1]
-                        await self.send_text(data)
+                    await send_reply_texts(chat_stream, [seg[1] for seg in llm_response.reply_set], self.send_text)
                 else:
                     await self.send_text(f"TTS语音生成或发送失败: {e}")
                 return False, f"TTS语音生成或发送失败: {e}"
         choose = "1"
         quality = "1"
-        # 先请求网易云API获取实际歌名
         api_url = self.get_config("api.base_url", "https://api.vkeys.cn")
-        real_song_name = song_name
-        try:
-            async with aiohttp.ClientSession() as session:
-                params = {
-                    "word": song_name,
-                    "quality": quality,
-                    "choose": choose
-                }
-                async with session.get(f"{api_url}/v2/music/netease", params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get("code") == 200 and data.get("data", {}).get("song"):
-                            real_song_name = data["data"]["song"]
-        except Exception as e:
-            pass  # 搜索失败就用原始song_name
-        # 处理real_song_name，去除括号及特殊符号，生成safe_real_song_name
-        import re
-        safe_real_song_name = re.sub(r'[\\/:*?"<>|()（）\[\]{}]', '', real_song_name)
-        changed_file = f"{safe_real_song_name}_changed.wav"
-        from .msst_separate_tool import find_results_dir
-        msst_result_dir = find_results_dir()
-        msst_file_path = os.path.join(msst_result_dir, changed_file)
-        file_path = None
-        if os.path.isfile(msst_file_path):
-            file_path = msst_file_path
-        elif os.path.isfile(changed_file):
-            file_path = changed_file
+        real_song_name, file_path = await find_cover_file(song_name, api_url, choose, quality)
         sent = False
         message_id = None
+        quota = get_cache_quota()
+        if file_path:
+            # 命中的成品记录一次访问，按最近访问淘汰时排在后面
+            quota.touch(file_path)
         # 检查本地是否已存在
         if file_path and os.path.isfile(file_path):
             chat_stream = getattr(self, "chat_stream", None)
             group_id = getattr(getattr(chat_stream, "group_info", None), "group_id", None) if chat_stream else None
             user_id = getattr(getattr(chat_stream, "user_info", None), "user_id", None) if chat_stream else None
             try:
-                from .napcat_client import NapcatClient
-                napcat = NapcatClient()
+                # 热门翻唱会被反复发送，内容相同时直接引用上次上传的语音，无需Napcat重新转码上传
                 if group_id:
-                    success, resp_json = NapcatClient.send_group_record(int(group_id), file_path)
+                    success, resp_json = await send_record_cached("group", int(group_id), file_path)
                     if success:
                         message_id = resp_json.get("data", {}).get("message_id") if resp_json else None
                         sent = True
@@ -849,13 +983,11 @@ class SingAction(BaseAction):
                         }
                     )
                     if result_status and result_message:
-                        for reply_seg in result_message:
-                            data = reply_seg[1]
-                            await self.send_text(data)
+                        await send_reply_texts(chat_stream, [seg[1] for seg in result_message], self.send_text)
                     else:
                         await self.send_text(f"已发送: 消息ID: {message_id if message_id else '未知'}")
                 elif user_id:
-                    success, resp_json = NapcatClient.send_private_record(int(user_id), file_path)
+                    success, resp_json = await send_record_cached("private", int(user_id), file_path)
                     if success:
                         message_id = resp_json.get("data", {}).get("message_id") if resp_json else None
                         sent = True
@@ -869,9 +1001,7 @@ class SingAction(BaseAction):
                         }
                     )
                     if result_status and result_message:
-                        for reply_seg in result_message:
-                            data = reply_seg[1]
-                            await self.send_text(data)
+                        await send_reply_texts(chat_stream, [seg[1] for seg in result_message], self.send_text)
                     else:
                         await self.send_text(f"已发送: 消息ID: {message_id if message_id else '未知'}")
                 sent = True
@@ -894,9 +1024,7 @@ class SingAction(BaseAction):
                 chat_stream, "收到,已经开始准备", "music_plugin 唤起AI翻唱准备提示润色"
             )
             if status and rewrite_result:
-                for reply_seg in rewrite_result:
-                    data = reply_seg[1]
-                    await self.send_text(data)
+                await send_reply_texts(chat_stream, [seg[1] for seg in rewrite_result], self.send_text)
             else:
                 error_msg = error_message if error_message else "收到,已经开始准备"
                 await self.send_text(error_msg)
@@ -904,6 +1032,84 @@ class SingAction(BaseAction):
         except Exception as e:
             return False, f"处理失败: {e}"
 
+class BroadcastCommand(BaseCommand):
+    """管理员广播Command - 把音乐卡片或已生成的AI翻唱一次发送到多个群"""
+
+    command_name = "broadcast"
+    command_description = "把音乐卡片或AI翻唱广播到多个群（仅管理员）"
+    command_pattern = r"^/broadcast\s+(?P<kind>music|cover)\s+(?P<groups>\S+)\s+(?P<song_name>.+)$"
+    command_help = ("广播命令（仅napcat.admin_users中的管理员可用），用法：/broadcast music|cover 群号1,群号2 歌曲名；"
+                    "群号写all时发送到napcat.broadcast_groups中的所有群")
+    command_examples = ["/broadcast music 123456,654321 晴天", "/broadcast cover all 晴天"]
+    intercept_message = True
+
+    def _sender_id(self, chat_stream) -> Optional[str]:
+        user_info = getattr(getattr(getattr(self, "message", None), "message_info", None), "user_info", None)
+        user_info = user_info or getattr(chat_stream, "user_info", None)
+        user_id = getattr(user_info, "user_id", None)
+        return str(user_id) if user_id is not None else None
+
+    def _parse_groups(self, groups: str) -> List[Tuple[str, int]]:
+        if groups.lower() == "all":
+            group_ids = self.get_config("napcat.broadcast_groups", [])
+        else:
+            group_ids = [g for g in re.split(r"[,，]", groups) if g.strip()]
+        return unique_targets(("group", str(g).strip()) for g in group_ids)
+
+    async def _reply(self, chat_stream, content: str):
+        target = chat_target(chat_stream)
+        if target is not None:
+            await send_api.custom_message(message_type="text", content=content, target_id=str(target[1]),
+                                          is_group=target[0] == "group")
+
+    async def execute(self) -> Tuple[bool, str]:
+        matched = self.matched_groups or {}
+        chat_stream = getattr(self, "chat_stream", None)
+        if chat_stream is None and hasattr(self, "message") and hasattr(self.message, "chat_stream"):
+            chat_stream = self.message.chat_stream
+        admins = [str(u) for u in self.get_config("napcat.admin_users", [])]
+        if self._sender_id(chat_stream) not in admins:
+            await self._reply(chat_stream, "❌ 只有管理员可以使用广播命令")
+            return False, "非管理员，拒绝广播"
+        targets = self._parse_groups(matched.get("groups", ""))
+        song_name = matched.get("song_name", "").strip()
+        if not targets or not song_name:
+            await self._reply(chat_stream, f"请输入正确的格式：{self.command_help}")
+            return False, "格式错误"
+        api_url = self.get_config("api.base_url", "https://api.vkeys.cn")
+        concurrency = self.get_config("napcat.broadcast_concurrency", 10)
+        try:
+            if matched.get("kind") == "cover":
+                real_song_name, file_path = await find_cover_file(song_name, api_url)
+                if not file_path:
+                    await self._reply(chat_stream, f"❌ 还没有 {real_song_name} 的AI翻唱，请先让我唱一次")
+                    return False, f"未找到翻唱: {real_song_name}"
+                with get_cache_quota().pin(file_path):
+                    # 同一段语音只上传一次，其余群引用上传结果
+                    report = await broadcast_record_cached(targets, file_path, concurrency=concurrency)
+            else:
+                quality = self.get_config("music.default_quality", "9")
+                data = await get_music_api_client().fetch(song_name, quality, 1, base_url=api_url, need_url=False)
+                song = (data or {}).get("data") or {}
+                music_id = song.get("id")
+                if not music_id:
+                    await self._reply(chat_stream, f"❌ 未找到歌曲：{song_name}")
+                    return False, f"未找到歌曲: {song_name}"
+                real_song_name = song.get("song", song_name)
+                report = await get_napcat_dispatcher().broadcast_music_card(targets, "163", str(music_id),
+                                                                             concurrency=concurrency)
+        except CircuitOpenError as e:
+            logger.warning(f"音乐API熔断中，快速失败: {e}")
+            await self._reply(chat_stream, "❌ 音乐服务暂时繁忙，请稍后再试")
+            return False, f"音乐API熔断中: {e}"
+        except Exception as e:
+            logger.error(f"广播失败: {e}")
+            await self._reply(chat_stream, f"❌ 广播失败，请稍后再试\n错误信息: {e}")
+            return False, f"广播失败: {e}"
+        logger.info(f"广播 {real_song_name}: 成功{len(report.succeeded)}/{len(report.results)}，耗时{report.elapsed:.1f}秒")
+        await self._reply(chat_stream, f"📢 {real_song_name}\n{report.summary()}")
+        return bool(report.succeeded), f"广播完成: 成功{len(report.succeeded)}个，失败{len(report.failed)}个"
+
 @register_plugin
 @register_plugin
 class MusicPlugin(BasePlugin):
@@ -928,7 +1134,11 @@ class MusicPlugin(BasePlugin):
         "components": "组件启用控制",
         "api": "API接口配置", 
         "music": "音乐功能配置",
-        "features": "功能开关配置"
+        "features": "功能开关配置",
+        "cache": "歌曲信息缓存配置",
+        "catalog": "本地歌曲目录配置",
+        "warmer": "热门歌曲后台预热配置",
+        "napcat": "Napcat连接配置"
     }
 
     # 配置Schema
@@ -939,7 +1149,8 @@ class MusicPlugin(BasePlugin):
         "components": {
             "enable_music_search": ConfigField(type=bool, default=True, description="是否启用音乐搜索功能"),
             "enable_music_command": ConfigField(type=bool, default=False, description="是否启用点歌命令功能"),
-            "enable_sing_action": ConfigField(type=bool, default=True, description="是否启用AI翻唱/tts功能")
+            "enable_sing_action": ConfigField(type=bool, default=True, description="是否启用AI翻唱/tts功能"),
+            "enable_broadcast_command": ConfigField(type=bool, default=False, description="是否启用管理员广播命令（/broadcast），启用后仅napcat.admin_users可用")
         },
         "api": {
             "base_url": ConfigField(
@@ -947,7 +1158,19 @@ class MusicPlugin(BasePlugin):
                 default="https://api.vkeys.cn", 
                 description="音乐API基础URL"
             ),
-            "timeout": ConfigField(type=int, default=10, description="API请求超时时间(秒)")
+            "timeout": ConfigField(type=int, default=10, description="API请求超时时间(秒)"),
+            "pool_size": ConfigField(type=int, default=20, description="API连接池最大连接数（所有组件共享）"),
+            "hedged_lookup": ConfigField(type=bool, default=True, description="是否并发请求多个候选结果（关闭则按指数退避顺序重试）"),
+            "hedge_delay": ConfigField(type=float, default=0.3, description="并发候选请求之间的错峰延迟(秒)，0表示同时发出"),
+            "rate_limit": ConfigField(type=float, default=5, description="每秒最多向音乐API发出的请求数，0表示不限流"),
+            "rate_burst": ConfigField(type=int, default=10, description="限流允许的突发请求数"),
+            "breaker_failures": ConfigField(type=int, default=5, description="连续失败多少次后熔断，熔断期间直接回复稍后再试"),
+            "breaker_reset": ConfigField(type=int, default=30, description="熔断后多少秒尝试恢复(秒)"),
+            "providers": ConfigField(
+                type=list,
+                default=[],
+                description="音乐API提供方列表，格式为\"名称=URL\"，\"local\"表示本地歌曲目录兜底；按实时延迟路由到最快的健康提供方，为空时只使用base_url"
+            )
         },
         "music": {
             "default_quality": ConfigField(
@@ -964,7 +1187,12 @@ class MusicPlugin(BasePlugin):
                 type=str,
                 default="D:\so-vits-svc\results",
                 description="MSST分离结果目录（AI翻唱/tts语音文件查找目录）"
-            )
+            ),
+            "reply_deadline": ConfigField(type=float, default=8, description="单次点歌从开始到回复的时间预算(秒)，0表示不限"),
+            "llm_min_budget": ConfigField(type=float, default=3, description="剩余预算低于该值(秒)时跳过LLM润色，直接发送原始文本"),
+            "napcat_timeout": ConfigField(type=float, default=3, description="单次Napcat卡片发送的超时上限(秒)，超时则改发直链"),
+            "playlist_max_songs": ConfigField(type=int, default=10, description="歌单点歌（/music 歌曲1; 歌曲2）一次最多的歌曲数"),
+            "playlist_concurrency": ConfigField(type=int, default=3, description="歌单点歌同时解析的歌曲数")
         },
         "features": {
             "show_cover": ConfigField(type=bool, default=True, description="是否显示专辑封面"),
@@ -973,8 +1201,119 @@ class MusicPlugin(BasePlugin):
                 default=False, 
                 description="是否显示下载链接"
             )
+        },
+        "cache": {
+            "max_entries": ConfigField(type=int, default=512, description="内存中最多缓存的歌曲查询条数（LRU淘汰）"),
+            "meta_ttl": ConfigField(type=int, default=604800, description="歌曲元数据（id/歌名/歌手/专辑等）缓存有效期(秒)"),
+            "url_ttl": ConfigField(type=int, default=1200, description="播放链接无法解析过期时间时的缓存有效期(秒)"),
+            "max_disk_mb": ConfigField(type=int, default=5120, description="下载音频、分离产物和翻唱成品合计的磁盘配额(MB)，超出时按最近访问淘汰，0表示不限"),
+            "min_access_age": ConfigField(type=int, default=600, description="最近访问不足该秒数的文件不会被磁盘配额淘汰（保护正在处理的任务）")
+        },
+        "catalog": {
+            "enabled": ConfigField(type=bool, default=True, description="是否启用本地歌曲目录（发卡片前先在本地解析歌曲id，命中则不访问网络）")
+        },
+        "warmer": {
+            "enabled": ConfigField(type=bool, default=True, description="是否在后台定期刷新热门歌曲的缓存"),
+            "top_n": ConfigField(type=int, default=20, description="每轮预热的热门歌曲数"),
+            "interval": ConfigField(type=int, default=300, description="预热间隔(秒)"),
+            "half_life": ConfigField(type=int, default=86400, description="点歌频率的衰减半衰期(秒)"),
+            "min_count": ConfigField(type=float, default=2, description="衰减后的点歌次数至少达到多少才预热"),
+            "token_reserve": ConfigField(type=int, default=2, description="预热时为聊天请求保留的限流令牌数，余量不足时本轮预热让路")
+        },
+        "napcat": {
+            "host": ConfigField(type=str, default="127.0.0.1", description="Napcat HTTP服务器地址"),
+            "port": ConfigField(type=int, default=4998, description="Napcat HTTP服务器端口"),
+            "timeout": ConfigField(type=float, default=10, description="Napcat请求超时时间(秒)"),
+            "pool_size": ConfigField(type=int, default=10, description="Napcat连接池最大连接数（所有组件共享，keep-alive复用）"),
+            "transport": ConfigField(type=str, default="http", description="Napcat传输方式：http（每次请求一个HTTP调用）或 ws（常驻WebSocket连接，按echo匹配响应）"),
+            "ws_url": ConfigField(type=str, default="ws://127.0.0.1:3001", description="Napcat WebSocket服务器地址，transport为ws时使用"),
+            "access_token": ConfigField(type=str, default="", description="Napcat访问令牌，未启用TOKEN时留空"),
+            "group_rate": ConfigField(type=float, default=1, description="每个群每秒最多发送的消息数"),
+            "group_burst": ConfigField(type=int, default=3, description="每个群允许连续突发的消息数"),
+            "private_rate": ConfigField(type=float, default=2, description="每个私聊每秒最多发送的消息数"),
+            "private_burst": ConfigField(type=int, default=3, description="每个私聊允许连续突发的消息数"),
+            "send_retries": ConfigField(type=int, default=2, description="发送遇到网络异常或超时时的最多重试次数（指数退避）"),
+            "merge_texts": ConfigField(type=bool, default=True, description="是否把LLM回复中相邻的文本段合并为一条发送"),
+            "merge_max_chars": ConfigField(type=int, default=500, description="合并后单条文本消息的最大字数"),
+            "record_cache": ConfigField(type=bool, default=True, description="是否缓存已发送语音的上传结果，同一翻唱再次发送时直接引用、不重新上传"),
+            "record_ref_ttl": ConfigField(type=int, default=86400, description="已上传语音引用的有效期(秒)，过期后重新上传"),
+            "admin_users": ConfigField(type=list, default=[], description="可以使用/broadcast广播命令的管理员QQ号列表，为空时无人可用"),
+            "broadcast_groups": ConfigField(type=list, default=[], description="/broadcast命令群号写all时广播到的群号列表"),
+            "broadcast_concurrency": ConfigField(type=int, default=10, description="广播时同时在途的最多发送请求数（每个群仍按各自限速发送）")
         }
     } # type: ignore
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 插件级共享的音乐API客户端（keep-alive连接池），所有组件复用
+        client = configure_music_api_client(
+            base_url=self.get_config("api.base_url", "https://api.vkeys.cn"),
+            timeout=self.get_config("api.timeout", 10),
+            pool_size=self.get_config("api.pool_size", 20),
+            cache_max_entries=self.get_config("cache.max_entries", 512),
+            cache_meta_ttl=self.get_config("cache.meta_ttl", 604800),
+            cache_url_ttl=self.get_config("cache.url_ttl", 1200),
+            rate_limit=self.get_config("api.rate_limit", 5),
+            rate_burst=self.get_config("api.rate_burst", 10),
+            breaker_failures=self.get_config("api.breaker_failures", 5),
+            breaker_reset=self.get_config("api.breaker_reset", 30),
+            providers=self.get_config("api.providers", []),
+        )
+        logger.info(f"音乐API提供方: {[p.name for p in client.router.providers]}")
+        # 插件级共享的Napcat异步客户端（keep-alive连接池），发送消息不阻塞事件循环
+        configure_napcat_client(
+            host=self.get_config("napcat.host", "127.0.0.1"),
+            port=self.get_config("napcat.port", 4998),
+            timeout=self.get_config("napcat.timeout", 10),
+            pool_size=self.get_config("napcat.pool_size", 10),
+            transport=self.get_config("napcat.transport", "http"),
+            ws_url=self.get_config("napcat.ws_url", "ws://127.0.0.1:3001"),
+            access_token=self.get_config("napcat.access_token", ""),
+        )
+        # 出站消息调度：每个群/私聊独立排队限速，Action入队后立即返回
+        configure_napcat_dispatcher(
+            group_rate=self.get_config("napcat.group_rate", 1),
+            group_burst=self.get_config("napcat.group_burst", 3),
+            private_rate=self.get_config("napcat.private_rate", 2),
+            private_burst=self.get_config("napcat.private_burst", 3),
+            retries=self.get_config("napcat.send_retries", 2),
+            merge_texts=self.get_config("napcat.merge_texts", True),
+            merge_max_chars=self.get_config("napcat.merge_max_chars", 500),
+            broadcast_concurrency=self.get_config("napcat.broadcast_concurrency", 10),
+        )
+        # 已上传语音的引用缓存：同一翻唱再次发送时跳过重新上传
+        configure_record_cache(
+            enabled=self.get_config("napcat.record_cache", True),
+            ttl=self.get_config("napcat.record_ref_ttl", 86400),
+        )
+        # 本地歌曲目录：收录所有接口响应和已有的搜索缓存，点歌时优先本地解析歌曲id
+        if self.get_config("catalog.enabled", True):
+            try:
+                catalog = configure_song_catalog()
+                client.add_response_listener(catalog.ingest_response)
+                # 搜索缓存可能很多，在后台导入，不阻塞插件加载
+                threading.Thread(target=_import_search_caches, args=(catalog,),
+                                 name="music-catalog-import", daemon=True).start()
+            except Exception as e:
+                logger.warning(f"本地歌曲目录初始化失败: {e}")
+        # 热门歌曲后台预热：插件加载时即启动，不等到第一次点歌
+        if self.get_config("warmer.enabled", True):
+            configure_song_warmer(
+                client=client,
+                top_n=self.get_config("warmer.top_n", 20),
+                interval=self.get_config("warmer.interval", 300),
+                half_life=self.get_config("warmer.half_life", 86400),
+                min_count=self.get_config("warmer.min_count", 2),
+                token_reserve=self.get_config("warmer.token_reserve", 2),
+            ).ensure_started()
+        # 下载缓存和翻唱产物的磁盘配额
+        configure_cache_quota(
+            self.get_config("cache.max_disk_mb", 5120),
+            min_age=self.get_config("cache.min_access_age", 600),
+        )
+        # 启动时在后台清理中断下载留下的坏文件并检查磁盘配额，不阻塞插件加载
+        threading.Thread(target=_scrub_download_cache, name="music-cache-scrub", daemon=True).start()
+
     def get_plugin_components(self) -> List[Tuple[ComponentInfo, Type]]:
         """返回插件组件列表，支持按配置启用/禁用组件"""
         components = []
@@ -987,5 +1326,10 @@ class MusicPlugin(BasePlugin):
                 pass
         if self.get_config("components.enable_sing_action", True):
             components.append((SingAction.get_action_info(), SingAction))
+        if self.get_config("components.enable_broadcast_command", False):
+            try:
+                components.append((BroadcastCommand.get_command_info(), BroadcastCommand))
+            except Exception:
+                pass
         # 已移除BilibiliRandomVideoAction相关逻辑
         return components
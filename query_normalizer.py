@@ -0,0 +1,83 @@
+import re
+import unicodedata
+from typing import Callable, Optional
+
+# 与 safe_song_name 一致的文件名非法字符（含各类括号）
+UNSAFE_CHARS_RE = re.compile(r'[\\/:*?"<>|()（）\[\]{}]')
+
+# 未安装 OpenCC 时使用的常用繁→简对照表（覆盖歌名中最常见的繁体字）
+_T2S_PAIRS = (
+    "譜谱 愛爱 戀恋 淚泪 夢梦 時时 間间 個个 們们 這这 裡里 裏里 說说 聽听 聲声 風风 雲云 飛飞 飄飘 陽阳 "
+    "離离 開开 關关 門门 問问 閃闪 閒闲 見见 現现 親亲 覺觉 觀观 視视 記记 請请 誰谁 讓让 話话 語语 誤误 "
+    "認认 謝谢 變变 詩诗 詞词 調调 讀读 護护 憶忆 應应 懷怀 憂忧 戰战 擁拥 擇择 樂乐 樹树 橋桥 歲岁 歸归 "
+    "殘残 氣气 決决 沒没 溫温 滿满 漢汉 為为 烏乌 無无 煙烟 燈灯 爺爷 爾尔 獨独 環环 畫画 當当 發发 盡尽 "
+    "眾众 禮礼 種种 穩稳 窮穷 筆笔 節节 簡简 紅红 紀纪 約约 純纯 紙纸 級级 細细 終终 組组 結结 給给 絕绝 "
+    "絲丝 經经 綠绿 維维 網网 緣缘 線线 練练 總总 織织 續续 聖圣 聞闻 聯联 臉脸 興兴 舊旧 艷艳 莊庄 華华 "
+    "萬万 葉叶 蒼苍 藍蓝 蘭兰 處处 號号 蟲虫 術术 衛卫 補补 裝装 製制 複复 覽览 計计 訊讯 許许 設设 試试 "
+    "該该 誕诞 談谈 論论 謎谜 講讲 證证 識识 譯译 讚赞 貓猫 貝贝 負负 貴贵 買买 費费 賞赏 賣卖 質质 贏赢 "
+    "趕赶 趙赵 車车 軌轨 軟软 輕轻 輝辉 輪轮 轉转 辦办 農农 迴回 週周 進进 過过 運运 遠远 適适 遲迟 選选 "
+    "遺遗 還还 邊边 鄉乡 醫医 釋释 針针 鈴铃 銀银 錢钱 錯错 鐘钟 鏡镜 長长 閣阁 陣阵 陳陈 陸陆 隊队 際际 "
+    "隨随 險险 雖虽 雙双 雞鸡 難难 電电 靈灵 靜静 響响 頁页 頂顶 順顺 須须 頭头 題题 顏颜 願愿 類类 顯显 "
+    "飯饭 餘余 館馆 馬马 駕驾 騎骑 驚惊 體体 髮发 鬥斗 魚鱼 鳥鸟 鳳凤 鳴鸣 麗丽 麼么 黃黄 點点 齊齐 龍龙 "
+    "龜龟 劍剑 動动 勝胜 勞劳 勢势 區区 協协 單单 參参 員员 啟启 喚唤 喪丧 嗎吗 嘆叹 嚴严 國国 圓圆 圖图 "
+    "團团 場场 壞坏 壓压 壯壮 夠够 奪夺 奮奋 媽妈 嬌娇 學学 寧宁 實实 寫写 寬宽 寶宝 將将 專专 對对 尋寻 "
+    "層层 屬属 島岛 嶺岭 巖岩 帥帅 師师 帶带 幫帮 幹干 廣广 廳厅 張张 強强 彈弹 彎弯 後后 從从 復复 徹彻 "
+    "憑凭 戲戏 戶户 拋抛 掃扫 掛挂 換换 揮挥 損损 搖摇 撐撑 擊击 據据 擔担 擾扰 攝摄 敗败 敵敌 數数 斷断 "
+    "於于 晝昼 暈晕 曉晓 曖暧 書书 會会 朧胧 東东 條条 來来 楓枫 極极 榮荣 構构 槍枪 標标 機机 權权 歡欢 "
+    "歷历 殺杀 滅灭 漸渐 潛潜 濃浓 濕湿 灣湾 災灾 熱热 燒烧 爭争 牆墙 獄狱 獵猎 瑤瑶 產产 畢毕 異异 療疗 "
+    "癡痴 盤盘 確确 祕秘 禍祸 稱称 築筑 範范 籃篮 糧粮 緊紧 縫缝 縮缩 罰罚 羅罗 習习 翹翘 腦脑 膽胆 臨临 "
+    "舉举 艱艰 蕭萧 薩萨 藝艺 蘇苏 蝦虾 蠟蜡 衝冲 襲袭 覓觅 訴诉 詠咏 誇夸 諾诺 謊谎 謠谣 豐丰 豬猪 賦赋 "
+    "賴赖 贈赠 踐践 蹤踪 躍跃 軍军 載载 輩辈 轟轰 辭辞 邁迈 郵邮 鋼钢 錄录 鍵键 鎖锁 鐵铁 閉闭 闊阔 陰阴 "
+    "階阶 隱隐 雜杂 霧雾 韻韵 頌颂 領领 頻频 顆颗 颱台 臺台 飲饮 飽饱 餓饿 騙骗 驗验 鬱郁 鵝鹅 麥麦 齒齿 "
+    "圍围 劃划 燦灿 爛烂 縱纵 蓮莲 鍾钟 憐怜 懶懒 揚扬 湧涌 瀟潇 灑洒 煩烦 熾炽 獻献 瑩莹 緒绪 鬧闹 聰聪 "
+    "蕩荡 蟬蝉 貞贞 遙遥 邏逻 鄰邻 錦锦 閱阅 頑顽 颯飒 餅饼 鬆松 壺壶 孫孙 廟庙 廢废 徑径 憤愤 懸悬 攜携 "
+    "曆历 棄弃 傳传 傷伤 價价 儀仪 優优 兒儿 內内 兩两 冊册 則则 剛刚 創创 劇剧 務务 勵励 匯汇 卻却 "
+    "嘗尝 噴喷 嚮向 囪囱 壇坛 奧奥 婦妇 嫵妩 孃娘 屆届 崗岗 幣币 庫库 彙汇 徵征 悅悦 惡恶 惱恼 態态 "
+    "慘惨 慣惯 慶庆 懼惧 撲扑 擬拟 擴扩 攔拦 斂敛 櫻樱 歐欧 漣涟 澀涩 瀾澜 灘滩 煉炼 爐炉 "
+    "犢犊 獅狮 甕瓮 睜睁 矯矫 礦矿 祿禄 穌稣 竊窃 籤签 糾纠 紛纷 紋纹 絃弦 綺绮 綿绵 緋绯 縷缕 繞绕 "
+    "繩绳 繪绘 纏缠 罷罢 翺翱 聳耸 膚肤 蘋苹 虛虚 螢萤 蠻蛮 觸触 詭诡 謂谓 貪贪 貫贯 賀贺 賓宾 "
+    "輾辗 遞递 醜丑 鑽钻 閨闺 闖闯 隸隶 雛雏 韓韩 頰颊 飾饰 駛驶 驅驱 鬍胡 鮮鲜 鯨鲸 鴉鸦 鴿鸽 鶯莺 "
+    "鷹鹰 鹽盐 麵面 黨党 齡龄"
+)
+_T2S_TABLE = {ord(pair[0]): pair[1] for pair in _T2S_PAIRS.split() if pair[0] != pair[1]}
+
+
+def _load_opencc() -> Optional[Callable[[str], str]]:
+    """优先使用OpenCC做完整的繁→简转换（可选依赖）"""
+    try:
+        import opencc
+    except ImportError:
+        return None
+    for config in ("t2s", "t2s.json"):
+        try:
+            return opencc.OpenCC(config).convert
+        except Exception:
+            continue
+    return None
+
+
+_opencc_convert = _load_opencc()
+
+
+def to_simplified(text: str) -> str:
+    """繁体转简体"""
+    if _opencc_convert is not None:
+        return _opencc_convert(text)
+    return text.translate(_T2S_TABLE)
+
+
+def normalize_query(text: str) -> str:
+    """
+    规范化搜索词，用于生成所有缓存键，使“花譜/花谱”、全角/半角、大小写、多余空白和标点等变体共用同一条缓存。
+    依次进行：NFKC（全角→半角、半角片假名→全角）、繁→简、大小写折叠、
+    去除 safe_song_name 中的非法字符及其他标点、合并空白。
+    :param text: 原始搜索词
+    :return: 规范化后的搜索词，全部由标点组成时退化为仅合并空白的原文
+    """
+    original = " ".join(str(text).split())
+    text = unicodedata.normalize("NFKC", str(text))
+    text = to_simplified(text)
+    text = text.casefold()
+    text = UNSAFE_CHARS_RE.sub(" ", text)
+    text = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text)
+    return " ".join(text.split()) or original
@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+try:
+    from .napcat_client import get_napcat_client
+    from .napcat_dispatcher import BroadcastReport, NapcatDispatcher, get_napcat_dispatcher, unique_targets
+except ImportError:
+    from napcat_client import get_napcat_client
+    from napcat_dispatcher import BroadcastReport, NapcatDispatcher, get_napcat_dispatcher, unique_targets
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# 后台记录语音引用的任务；事件循环只持有任务的弱引用，需保留引用直到完成
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _default_cache_path() -> str:
+    cache_dir = os.path.join(os.path.dirname(__file__), 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, 'record_refs.json')
+
+
+def extract_record_ref(resp_json: Optional[Dict]) -> Optional[str]:
+    """
+    从 get_msg 响应中取出语音段可复用的文件引用：优先Napcat已转码好的本地文件路径，
+    其次QQ服务器上的下载地址，最后是Napcat的缓存文件名。
+    """
+    message = ((resp_json or {}).get("data") or {}).get("message") or []
+    for seg in message if isinstance(message, list) else []:
+        if seg.get("type") != "record":
+            continue
+        data = seg.get("data") or {}
+        url = data.get("url") or ""
+        for ref in (data.get("path"), url if url.startswith(("http://", "https://")) else None, data.get("file")):
+            if ref:
+                return str(ref)
+    return None
+
+
+class RecordCache:
+    """
+    已上传语音的引用缓存：音频内容哈希 → Napcat/QQ侧的文件引用（转码后的文件路径或下载地址）。
+    同一首翻唱再次发送或发到其他群时直接引用，Napcat无需重新读取、转码和上传几MB的wav；
+    引用失效（过期或发送失败）时回退为按本地路径上传。记录保存在 cache/record_refs.json。
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 86400, max_entries: int = 500):
+        """
+        :param path: 记录文件路径，默认 cache/record_refs.json
+        :param ttl: 引用有效期(秒)，QQ侧的下载地址和Napcat的缓存文件都会过期
+        :param max_entries: 最多保留的记录数，超出时丢弃最旧的
+        """
+        self.path = path or _default_cache_path()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._refs: Optional[Dict[str, Dict[str, Any]]] = None
+        # (路径, 大小, 修改时间) -> 内容哈希，避免每次发送都重新读取整个文件
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def content_hash(self, file_path: str) -> Optional[str]:
+        """文件内容的SHA-1，文件不存在时返回None"""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        key = (os.path.abspath(file_path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._hashes.get(key)
+        if digest is None:
+            # 读取和计算哈希不持有锁，多个线程同时计算同一文件时结果相同，后写入的覆盖即可
+            sha1 = hashlib.sha1()
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                    sha1.update(chunk)
+            digest = sha1.hexdigest()
+            with self._lock:
+                if len(self._hashes) >= self.max_entries:
+                    self._hashes.clear()
+                self._hashes[key] = digest
+        return digest
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._refs is None:
+            self._refs = {}
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    refs = json.load(f)
+                if isinstance(refs, dict):
+                    self._refs = refs
+            except (OSError, ValueError):
+                pass
+        return self._refs
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._refs, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def get(self, digest: str) -> Optional[str]:
+        """查询仍在有效期内的引用（首次调用会读取记录文件，在事件循环中应通过线程池调用）"""
+        with self._lock:
+            entry = self._load().get(digest)
+            if entry and time.time() - entry.get("created_at", 0) < self.ttl:
+                self.hits += 1
+                return entry.get("ref")
+            self.misses += 1
+            return None
+
+    def put(self, digest: str, ref: str):
+        with self._lock:
+            refs = self._load()
+            refs[digest] = {"ref": ref, "created_at": time.time()}
+            if len(refs) > self.max_entries:
+                for key in sorted(refs, key=lambda k: refs[k].get("created_at", 0))[:len(refs) - self.max_entries]:
+                    refs.pop(key, None)
+            self._save()
+
+    def invalidate(self, digest: str):
+        with self._lock:
+            if self._load().pop(digest, None) is not None:
+                self._save()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = len(self._load())
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+async def _remember_ref(cache: RecordCache, digest: str, message_id: Any):
+    # 发送成功后查询该条消息，取出Napcat转码上传后的语音引用
+    try:
+        success, resp_json = await get_napcat_client().call("get_msg", {"message_id": message_id})
+    except Exception:
+        return
+    ref = extract_record_ref(resp_json) if success else None
+    if ref:
+        await asyncio.to_thread(cache.put, digest, ref)
+
+
+async def send_record_cached(message_type: str, target_id: int, file_path: str,
+                             dispatcher: Optional[NapcatDispatcher] = None,
+                             cache: Optional[RecordCache] = None,
+                             wait_ref: bool = False) -> Tuple[bool, Optional[Dict]]:
+    """
+    发送语音：内容相同的音频之前发送成功过则直接引用上次的上传结果，引用失效时按本地路径重新上传。
+    :param message_type: "group" 或 "private"
+    :param target_id: 群号或用户ID
+    :param file_path: 本地语音文件路径
+    :param wait_ref: 重新上传后是否等记录好新的引用再返回（默认在后台记录）
+    :return: (是否成功, 响应JSON)
+    """
+    dispatcher = dispatcher or get_napcat_dispatcher()
+    cache = cache if cache is not None else get_record_cache()
+    digest = None
+    if cache is not None and os.path.isfile(file_path):
+        digest = await asyncio.to_thread(cache.content_hash, file_path)
+    if digest:
+        ref = await asyncio.to_thread(cache.get, digest)
+        if ref:
+            success, resp_json = await dispatcher.send_record(message_type, target_id, ref)
+            if success:
+                return success, resp_json
+            await asyncio.to_thread(cache.invalidate, digest)
+    success, resp_json = await dispatcher.send_record(message_type, target_id, file_path)
+    message_id = ((resp_json or {}).get("data") or {}).get("message_id")
+    if success and digest and message_id is not None:
+        if wait_ref:
+            await _remember_ref(cache, digest, message_id)
+        else:
+            task = asyncio.get_running_loop().create_task(_remember_ref(cache, digest, message_id))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+    return success, resp_json
+
+
+async def broadcast_record_cached(targets: Iterable[Tuple[str, Any]], file_path: str,
+                                  dispatcher: Optional[NapcatDispatcher] = None,
+                                  cache: Optional[RecordCache] = None,
+                                  concurrency: Optional[int] = None) -> BroadcastReport:
+    """
+    把同一段语音发送给多个群/私聊：先发给第一个目标并记录上传结果，其余目标并发引用该结果，
+    Napcat只需转码上传一次。未启用语音引用缓存时每个目标各自上传。
+    :param targets: (消息类型, 目标ID) 列表
+    :param file_path: 本地语音文件路径
+    :param concurrency: 同时在途的最多请求数
+    """
+    dispatcher = dispatcher or get_napcat_dispatcher()
+    cache = cache if cache is not None else get_record_cache()
+    targets = unique_targets(targets)
+    if cache is None or len(targets) < 2:
+        return await dispatcher.broadcast_record(targets, file_path, concurrency)
+    started = time.monotonic()
+
+    def send(wait_ref: bool):
+        return lambda message_type, target_id: send_record_cached(
+            message_type, target_id, file_path, dispatcher, cache, wait_ref=wait_ref)
+
+    first = await dispatcher.fan_out(targets[:1], send(True), concurrency)
+    rest = await dispatcher.fan_out(targets[1:], send(False), concurrency)
+    return BroadcastReport(first.results + rest.results, time.monotonic() - started)
+
+
+# ===== 插件级共享实例 =====
+_shared_cache: Optional[RecordCache] = None
+
+
+def configure_record_cache(enabled: bool = True, **kwargs) -> Optional[RecordCache]:
+    """由MusicPlugin在加载时调用，按配置创建共享的语音引用缓存，未启用时不创建，参数同RecordCache"""
+    global _shared_cache
+    _shared_cache = RecordCache(**kwargs) if enabled else None
+    return _shared_cache
+
+
+def get_record_cache() -> Optional[RecordCache]:
+    """获取共享的语音引用缓存，未启用时返回None"""
+    return _shared_cache
@@ -0,0 +1,275 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    from .query_normalizer import normalize_query
+except ImportError:
+    from query_normalizer import normalize_query
+
+SEARCH_CACHE_SUFFIX = "_search_cache.json"
+# 元数据字段，与接口返回的data字段同名
+_META_FIELDS = ("id", "song", "singer", "album", "time", "cover", "interval", "link")
+
+
+def _default_db_path() -> str:
+    cache_dir = os.path.join(os.path.dirname(__file__), 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, "song_catalog.db")
+
+
+class SongCatalog:
+    """
+    本地歌曲目录：收录每一次接口返回的歌曲元数据，以及“搜索词 + choose → 歌曲id”的别名，
+    点歌时先在本地解析出歌曲id，命中即可直接发送小程序卡片而无需访问网络。
+    优先使用SQLite FTS5（trigram分词）做歌名/歌手的模糊匹配，不可用时退化为LIKE查询。
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        :param db_path: 数据库路径，默认 cache/song_catalog.db
+        """
+        self.db_path = db_path or _default_db_path()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self.fts_enabled = False
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS songs ("
+                "id INTEGER PRIMARY KEY, song TEXT, singer TEXT, album TEXT, time TEXT, cover TEXT, "
+                "interval TEXT, link TEXT, song_norm TEXT, singer_norm TEXT, updated_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_songs_song_norm ON songs(song_norm)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS aliases ("
+                "query_norm TEXT, choose INTEGER, song_id INTEGER, updated_at REAL, "
+                "PRIMARY KEY (query_norm, choose))"
+            )
+            try:
+                self._conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts "
+                    "USING fts5(song_norm, singer_norm, album_norm, tokenize='trigram')"
+                )
+                self.fts_enabled = True
+            except sqlite3.OperationalError:
+                # SQLite未编译FTS5或版本过低不支持trigram
+                self.fts_enabled = False
+
+    # ===== 写入 =====
+
+    def ingest(self, info: Dict[str, Any], query: Optional[str] = None, choose: Any = 1):
+        """
+        收录一条歌曲信息（接口返回的data字段），并记录搜索词别名。
+        :param info: 歌曲信息，至少包含id和song
+        :param query: 产生该结果的搜索词
+        :param choose: 该结果在搜索结果中的序号
+        """
+        if not isinstance(info, dict):
+            return
+        try:
+            song_id = int(info.get("id") or info.get("songid") or info.get("songId"))
+        except (TypeError, ValueError):
+            return
+        if not info.get("song"):
+            return
+        row = {field: info.get(field) for field in _META_FIELDS}
+        row["id"] = song_id
+        song_norm = normalize_query(info.get("song", ""))
+        singer_norm = normalize_query(info.get("singer", ""))
+        album_norm = normalize_query(info.get("album", ""))
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO songs (id, song, singer, album, time, cover, interval, link, "
+                "song_norm, singer_norm, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (song_id, row["song"], row["singer"], row["album"], row["time"], row["cover"],
+                 row["interval"], row["link"], song_norm, singer_norm, now)
+            )
+            if self.fts_enabled:
+                self._conn.execute("DELETE FROM songs_fts WHERE rowid = ?", (song_id,))
+                self._conn.execute(
+                    "INSERT INTO songs_fts (rowid, song_norm, singer_norm, album_norm) VALUES (?, ?, ?, ?)",
+                    (song_id, song_norm, singer_norm, album_norm)
+                )
+            if query:
+                try:
+                    choose = int(choose)
+                except (TypeError, ValueError):
+                    choose = 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO aliases (query_norm, choose, song_id, updated_at) VALUES (?, ?, ?, ?)",
+                    (normalize_query(query), choose, song_id, now)
+                )
+
+    def ingest_response(self, query: str, quality: Any, choose: Any, response: Optional[Dict]):
+        """收录一次接口原始返回，可直接注册为MusicApiClient的响应监听器"""
+        if response and response.get("code") == 200:
+            self.ingest(response.get("data") or {}, query=query, choose=choose)
+
+    def ingest_search_cache_dir(self, cache_dir: Optional[str] = None) -> int:
+        """
+        导入 cache/*_search_cache.json 中已有的搜索结果。
+        :return: 导入的条目数
+        """
+        cache_dir = cache_dir or os.path.dirname(self.db_path)
+        count = 0
+        for path in glob.glob(os.path.join(cache_dir, f"*{SEARCH_CACHE_SUFFIX}")):
+            query = os.path.basename(path)[:-len(SEARCH_CACHE_SUFFIX)]
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for entry in entries if isinstance(entries, list) else []:
+                response = entry.get("data") if isinstance(entry, dict) else None
+                if response and response.get("code") == 200:
+                    self.ingest(response.get("data") or {}, query=query, choose=entry.get("choose", 1))
+                    count += 1
+        return count
+
+    # ===== 查询 =====
+
+    def get(self, song_id: Any) -> Optional[Dict]:
+        """按歌曲id读取"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM songs WHERE id = ?", (song_id,)).fetchone()
+        return self._to_info(row) if row else None
+
+    def search(self, query: str, limit: int = 5) -> List[Dict]:
+        """
+        按歌名/歌手/专辑模糊搜索，结果按匹配程度排序。
+        :param query: 搜索词，可为“歌名”“歌名 歌手”“歌手 歌名”
+        :param limit: 最大返回条数
+        """
+        q = normalize_query(query)
+        tokens = q.split()
+        if not tokens:
+            return []
+        rows = []
+        with self._lock:
+            long_tokens = [t for t in tokens if len(t) >= 3]
+            if self.fts_enabled and long_tokens:
+                # trigram分词至少需要3个字符，短词再用LIKE过滤
+                match = " AND ".join('"' + t.replace('"', '""') + '"' for t in long_tokens)
+                sql = ("SELECT songs.* FROM songs_fts JOIN songs ON songs.id = songs_fts.rowid "
+                       "WHERE songs_fts MATCH ?")
+                params: List[Any] = [match]
+                for t in tokens:
+                    if len(t) < 3:
+                        sql += " AND (songs.song_norm LIKE ? OR songs.singer_norm LIKE ?)"
+                        params += [f"%{t}%", f"%{t}%"]
+                sql += " ORDER BY bm25(songs_fts) LIMIT ?"
+                params.append(limit * 4)
+                rows = self._conn.execute(sql, params).fetchall()
+            else:
+                sql = "SELECT * FROM songs WHERE 1 = 1"
+                params = []
+                for t in tokens:
+                    sql += " AND (song_norm LIKE ? OR singer_norm LIKE ?)"
+                    params += [f"%{t}%", f"%{t}%"]
+                sql += " ORDER BY updated_at DESC LIMIT ?"
+                params.append(limit * 4)
+                rows = self._conn.execute(sql, params).fetchall()
+        ranked = sorted(rows, key=lambda row: self._rank(q, row))
+        return [self._to_info(row) for row in ranked[:limit]]
+
+    def lookup(self, query: str, choose: Any = 1) -> Optional[Dict]:
+        """
+        解析点歌请求对应的歌曲，只返回足够确定的结果（宁可未命中走接口，也不发错歌）：
+        1. 曾经由接口返回过的“搜索词 + choose”别名；
+        2. 歌名完全一致且目录中只有一首歌叫这个名字；
+        3. “歌名 歌手”组合完全覆盖搜索词，且只有一首歌符合；
+        4. 搜索词是目录中唯一一首歌的歌名前缀（在整个目录中计数，而不只是模糊搜索的前几条结果）。
+        :return: 歌曲信息（不含播放链接），未命中返回None
+        """
+        q = normalize_query(query)
+        if not q:
+            return None
+        try:
+            choose = int(choose)
+        except (TypeError, ValueError):
+            choose = 1
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT songs.* FROM aliases JOIN songs ON songs.id = aliases.song_id "
+                "WHERE aliases.query_norm = ? AND aliases.choose = ?", (q, choose)
+            ).fetchone()
+        if row:
+            return self._to_info(row)
+        if choose != 1:
+            # 非第一个结果的顺序只有接口知道
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM songs WHERE song_norm = ? ORDER BY updated_at DESC", (q,)
+            ).fetchall()
+        if len(rows) == 1:
+            return self._to_info(rows[0])
+        if rows:
+            return None
+        tokens = set(q.split())
+        if len(tokens) > 1:
+            combined = [info for info in self.search(q, limit=5) if tokens == set(
+                f"{normalize_query(info.get('song', ''))} {normalize_query(info.get('singer', ''))}".split())]
+            if len(combined) == 1:
+                return combined[0]
+            if combined:
+                return None
+        if len(q) < 2:
+            return None
+        # 规范化后的搜索词一般不含LIKE通配符，仍转义以免误匹配
+        pattern = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        with self._lock:
+            count = self._conn.execute(
+                "SELECT COUNT(*) FROM songs WHERE song_norm LIKE ? || '%' ESCAPE '\\'", (pattern,)
+            ).fetchone()[0]
+            if count != 1:
+                return None
+            row = self._conn.execute(
+                "SELECT * FROM songs WHERE song_norm LIKE ? || '%' ESCAPE '\\'", (pattern,)
+            ).fetchone()
+        return self._to_info(row) if row else None
+
+    @staticmethod
+    def _rank(q: str, row: sqlite3.Row):
+        song_norm = row["song_norm"] or ""
+        singer_norm = row["singer_norm"] or ""
+        if song_norm == q:
+            return 0, -(row["updated_at"] or 0)
+        if song_norm.startswith(q):
+            return 1, -(row["updated_at"] or 0)
+        if song_norm in q and singer_norm in q:
+            return 2, -(row["updated_at"] or 0)
+        return 3, -(row["updated_at"] or 0)
+
+    @staticmethod
+    def _to_info(row: sqlite3.Row) -> Dict:
+        return {field: row[field] for field in _META_FIELDS}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ===== 插件级共享实例 =====
+_shared_catalog: Optional[SongCatalog] = None
+
+
+def configure_song_catalog(db_path: Optional[str] = None) -> SongCatalog:
+    """由MusicPlugin在加载时调用，创建插件共享的本地歌曲目录"""
+    global _shared_catalog
+    _shared_catalog = SongCatalog(db_path)
+    return _shared_catalog
+
+
+def get_song_catalog() -> Optional[SongCatalog]:
+    """获取插件共享的本地歌曲目录，未启用时返回None"""
+    return _shared_catalog
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+try:
+    from .music_api_client import MusicApiClient, get_music_api_client
+    from .query_normalizer import UNSAFE_CHARS_RE, normalize_query
+except ImportError:
+    from music_api_client import MusicApiClient, get_music_api_client
+    from query_normalizer import UNSAFE_CHARS_RE, normalize_query
+
+
+def get_search_cache_path(word: str, normalize: bool = True) -> str:
+    """
+    搜索结果列表缓存路径：cache/<规范化搜索词>_search_cache.json
+    :param normalize: 为False时使用原始搜索词（兼容规范化之前写入的缓存文件）
+    """
+    cache_dir = os.path.join(os.path.dirname(__file__), 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    safe_word = UNSAFE_CHARS_RE.sub('', normalize_query(word) if normalize else word)
+    return os.path.join(cache_dir, f"{safe_word}_search_cache.json")
+
+
+def load_search_cache(word: str) -> Optional[List[Dict]]:
+    """读取搜索结果列表缓存，不存在或损坏时返回None"""
+    for path in (get_search_cache_path(word), get_search_cache_path(word, normalize=False)):
+        if not os.path.isfile(path):
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def save_search_cache(word: str, results: List[Dict]) -> str:
+    """
+    写入搜索结果列表缓存，格式为 [{"choose": 1, "data": <接口原始JSON>}, ...]
+    :return: 缓存文件路径
+    """
+    path = get_search_cache_path(word)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return path
+
+
+async def _probe(client: MusicApiClient, word: str, quality: Any, choose: int) -> bool:
+    """判断第choose个搜索结果是否存在"""
+    try:
+        data = await client.fetch(word, quality, choose, need_url=False)
+    except Exception:
+        return False
+    return bool(data and data.get("code") == 200 and data.get("data"))
+
+
+async def find_max_choose(word: str, quality: Any = 9, max_try: int = 30, concurrency: int = 5,
+                          client: Optional[MusicApiClient] = None) -> int:
+    """
+    探测搜索结果列表长度：先并发探测1、2、4、8……（指数搜索），
+    再在最后一个存在与第一个不存在的位置之间分段并发探测（每轮最多concurrency个点）收窄范围。
+    探测结果会进入客户端缓存，后续拉取列表时直接复用。
+    :param max_try: 探测上限
+    :return: 最大可用的choose，没有结果时返回0
+    """
+    client = client or get_music_api_client()
+    points = []
+    p = 1
+    while p < max_try:
+        points.append(p)
+        p *= 2
+    points.append(max_try)
+    found = await asyncio.gather(*[_probe(client, word, quality, c) for c in points])
+    lo, hi = 0, max_try + 1
+    for c, ok in zip(points, found):
+        if ok:
+            lo = max(lo, c)
+        else:
+            hi = min(hi, c)
+    if lo >= hi:
+        # 结果不单调（如中间某次请求失败），以第一个缺口为准
+        lo = max([c for c, ok in zip(points, found) if ok and c < hi], default=0)
+    while hi - lo > 1:
+        gap = hi - lo - 1
+        step = max(1, -(-gap // max(1, concurrency)))
+        candidates = list(range(lo + 1, hi, step))[:max(1, concurrency)]
+        found = await asyncio.gather(*[_probe(client, word, quality, c) for c in candidates])
+        oks = [c for c, ok in zip(candidates, found) if ok]
+        fails = [c for c, ok in zip(candidates, found) if not ok]
+        if fails:
+            hi = min(fails)
+        oks = [c for c in oks if c < hi]
+        if oks:
+            lo = max(oks)
+        elif not fails:
+            break
+    return lo
+
+
+async def fetch_song_list(word: str, quality: Any = 9, max_results: int = 10, concurrency: int = 5,
+                          client: Optional[MusicApiClient] = None, save: bool = True) -> List[Dict]:
+    """
+    获取搜索词的完整候选列表：探测列表长度后，在信号量限制下并发拉取每一项。
+    :param max_results: 最多拉取的结果数
+    :param concurrency: 最大并发请求数
+    :param save: 是否写入 cache/<搜索词>_search_cache.json
+    :return: [{"choose": 1, "data": <接口原始JSON>}, ...]，单项失败时为 {"choose": n, "error": "..."}
+    """
+    client = client or get_music_api_client()
+    max_choose = await find_max_choose(word, quality, max_try=max(max_results, 1), concurrency=concurrency,
+                                       client=client)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch_one(choose: int) -> Dict:
+        async with semaphore:
+            try:
+                data = await client.fetch(word, quality, choose)
+            except Exception as e:
+                return {"choose": choose, "error": str(e) or type(e).__name__}
+        if data is None:
+            return {"choose": choose, "error": "HTTP请求失败"}
+        return {"choose": choose, "data": data}
+
+    results = await asyncio.gather(*[fetch_one(c) for c in range(1, max_choose + 1)])
+    results = list(results)
+    if save and results:
+        save_search_cache(word, results)
+    return results
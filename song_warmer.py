@@ -0,0 +1,207 @@
+import asyncio
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .music_api_client import MusicApiClient, get_music_api_client
+    from .music_cache import make_song_key
+except ImportError:
+    from music_api_client import MusicApiClient, get_music_api_client
+    from music_cache import make_song_key
+
+
+class SongWarmer:
+    """
+    热门歌曲后台预热：统计每个规范化查询键的点歌频率（按半衰期衰减），
+    定期以低优先级重新请求排名前N的歌曲，在元数据和播放链接过期前刷新缓存，
+    使热门歌曲在聊天路径上始终命中缓存、无需等待上游接口。
+    插件加载时启动：有运行中的事件循环时在其中运行，否则在独立的后台线程中运行，统计数据由锁保护。
+    """
+
+    def __init__(self, client: Optional[MusicApiClient] = None, top_n: int = 20, interval: float = 300,
+                 half_life: float = 86400, min_count: float = 2, token_reserve: float = 2, max_keys: int = 1000):
+        """
+        :param client: 音乐API客户端，默认使用插件共享实例
+        :param top_n: 每轮预热的热门歌曲数
+        :param interval: 预热间隔(秒)
+        :param half_life: 点歌频率的衰减半衰期(秒)
+        :param min_count: 衰减后的频率至少达到多少才预热
+        :param token_reserve: 预热时为聊天请求保留的限流令牌数
+        :param max_keys: 最多跟踪的查询键数，超出时丢弃频率最低的
+        """
+        self._client = client
+        self.top_n = top_n
+        self.interval = interval
+        self.half_life = half_life
+        self.min_count = min_count
+        self.token_reserve = token_reserve
+        self.max_keys = max_keys
+        # 查询键 -> (衰减后的频率, 上次更新时间)
+        self._scores: Dict[Tuple, Tuple[float, float]] = {}
+        # 查询键 -> 最近一次点歌的原始参数 (word, quality, choose, base_url)
+        self._queries: Dict[Tuple, Tuple[str, Any, Any, Optional[str]]] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.refreshed = 0
+        self.skipped = 0
+
+    @property
+    def client(self) -> MusicApiClient:
+        return self._client or get_music_api_client()
+
+    def _decay(self, seconds: float) -> float:
+        """经过seconds秒后频率剩下的比例"""
+        if self.half_life <= 0:
+            return 1.0
+        return math.pow(0.5, seconds / self.half_life)
+
+    def _decayed(self, key: Tuple, now: float) -> float:
+        score, updated = self._scores.get(key, (0.0, now))
+        return score * self._decay(now - updated)
+
+    def threshold(self) -> float:
+        """
+        预热门槛：预热每interval秒检查一次，刚点够min_count次的歌到下一次检查时最多已衰减一个间隔，
+        门槛按同样的衰减放宽，使其在这一轮中一定入选。
+        """
+        return self.min_count * self._decay(self.interval)
+
+    def record(self, word: str, quality: Any, choose: Any, base_url: Optional[str] = None):
+        """
+        记录一次点歌，并在当前事件循环中按需启动后台预热任务。
+        :param word: 搜索词
+        :param quality: 音质等级
+        :param choose: 实际命中的搜索结果序号
+        :param base_url: 使用的API地址
+        """
+        key = make_song_key(word, quality, choose)
+        now = time.monotonic()
+        with self._lock:
+            self._scores[key] = (self._decayed(key, now) + 1, now)
+            self._queries[key] = (word, quality, choose, base_url)
+            if len(self._scores) > self.max_keys:
+                coldest = min(self._scores, key=lambda k: self._decayed(k, now))
+                self._scores.pop(coldest, None)
+                self._queries.pop(coldest, None)
+        self.ensure_started()
+
+    def hot_keys(self, n: Optional[int] = None) -> List[Tuple[Tuple, float]]:
+        """按衰减后的频率返回最热门的n个 (查询键, 频率)"""
+        now = time.monotonic()
+        with self._lock:
+            scored = [(key, self._decayed(key, now)) for key in self._scores]
+        ranked = sorted(scored, key=lambda item: -item[1])
+        threshold = self.threshold()
+        return [(key, score) for key, score in ranked[:n or self.top_n] if score >= threshold]
+
+    async def warm_once(self) -> int:
+        """
+        预热一轮：对热门歌曲中缓存将在下一轮之前过期的条目重新请求。
+        限流余量不足的条目本轮跳过、熔断器打开时本轮提前结束，把配额留给聊天请求。
+        :return: 本轮刷新的条目数
+        """
+        client = self.client
+        refreshed = 0
+        # 下一轮开始前就会过期的条目现在刷新，留出一个请求超时的余量
+        horizon = self.interval + client.timeout
+        for key, _ in self.hot_keys():
+            if client.cache.ttl_remaining(key, need_url=True) > horizon:
+                continue
+            with self._lock:
+                query = self._queries.get(key)
+            if query is None:
+                continue
+            word, quality, choose, base_url = query
+            try:
+                data = await client.refresh(word, quality, choose, base_url=base_url,
+                                            token_reserve=self.token_reserve)
+            except Exception:
+                data = None
+            if data is None:
+                self.skipped += 1
+                if client.router.is_open:
+                    break
+                continue
+            refreshed += 1
+        self.refreshed += refreshed
+        return refreshed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.warm_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+
+    def ensure_started(self):
+        """
+        启动预热任务，已在运行则不重复启动：有运行中的事件循环时在其中创建任务，
+        否则（如插件在事件循环启动前加载）在独立的后台线程中运行。
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if self._task is not None and not self._task.done():
+            task_loop = self._task.get_loop()
+            if task_loop is loop or task_loop.is_running():
+                return
+            # 原事件循环已停止（如Flask子线程的临时loop），重新启动
+        if loop is not None:
+            self._task = loop.create_task(self._run())
+            return
+        loop = asyncio.new_event_loop()
+        self._task = loop.create_task(self._run())
+        threading.Thread(target=self._run_loop, args=(loop, self._task), name="music-song-warmer", daemon=True).start()
+
+    def _run_loop(self, loop: asyncio.AbstractEventLoop, task: "asyncio.Task"):
+        """后台线程：运行预热任务直到被stop()取消，退出前关闭本线程loop上的API连接池"""
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.run_until_complete(self.client.close())
+            loop.close()
+
+    def stop(self):
+        task = self._task
+        if task is not None and not task.done() and not task.get_loop().is_closed():
+            # 任务可能运行在后台线程的事件循环中
+            task.get_loop().call_soon_threadsafe(task.cancel)
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tracked = len(self._scores)
+        return {
+            "tracked": tracked,
+            "hot": len(self.hot_keys()),
+            "refreshed": self.refreshed,
+            "skipped": self.skipped,
+            "running": self._task is not None and not self._task.done(),
+        }
+
+
+# ===== 插件级共享实例 =====
+_shared_warmer: Optional[SongWarmer] = None
+
+
+def configure_song_warmer(**kwargs) -> SongWarmer:
+    """由MusicPlugin在加载时调用，按配置创建插件共享的预热器，参数同SongWarmer"""
+    global _shared_warmer
+    if _shared_warmer is not None:
+        _shared_warmer.stop()
+    _shared_warmer = SongWarmer(**kwargs)
+    return _shared_warmer
+
+
+def get_song_warmer() -> Optional[SongWarmer]:
+    """获取插件共享的预热器，未启用时返回None"""
+    return _shared_warmer
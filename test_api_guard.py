@@ -0,0 +1,126 @@
+import asyncio
+import sys
+import threading
+import time
+
+from api_guard import CircuitBreaker, CircuitOpenError, TokenBucket
+
+# 测试熔断器的 关闭 → 打开 → 半开 → 关闭/重新打开 状态转换，以及令牌桶限流（含多线程共用）
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED, "未达到阈值时应保持关闭"
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.is_open
+    assert not breaker.allow(), "打开期间应拒绝请求"
+    try:
+        breaker.check()
+    except CircuitOpenError as e:
+        assert 0 < e.retry_after <= 60
+    else:
+        raise AssertionError("打开期间check()应抛出CircuitOpenError")
+
+
+def test_success_resets_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED, "阈值按连续失败计算，成功后应重新计数"
+
+
+def test_half_open_probe_success():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1, half_open_max_calls=1)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.15)
+    assert not breaker.is_open, "过了reset_timeout后不再视为打开"
+    assert breaker.allow(), "进入半开状态后应放行一个探测请求"
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow(), "半开状态下探测名额用完后应拒绝"
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow(), "关闭后应正常放行"
+
+
+def test_half_open_probe_failure():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.1)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.15)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN, "半开状态下探测失败应立即重新打开"
+    assert not breaker.allow()
+
+
+def test_half_open_release():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    breaker.record_failure()
+    time.sleep(0.15)
+    assert breaker.allow()
+    # 探测请求被取消、没有结论时归还名额
+    breaker.release()
+    assert breaker.allow(), "归还后应能再放行一个探测请求"
+
+
+def test_token_bucket_burst_and_reserve():
+    bucket = TokenBucket(rate=1, capacity=3)
+    assert bucket.try_acquire(reserve=2), "桶满时留下2个令牌后仍可取"
+    assert not bucket.try_acquire(reserve=2), "余量不足时低优先级请求应让路"
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire(), "突发额度用完后应拒绝"
+
+
+async def _token_bucket_wait():
+    bucket = TokenBucket(rate=20, capacity=1)
+    await bucket.acquire()
+    started = time.monotonic()
+    await bucket.acquire()
+    waited = time.monotonic() - started
+    assert 0.03 <= waited < 0.2, f"令牌不足时应等待约1/rate秒，实际 {waited:.3f}s"
+
+
+def test_token_bucket_wait():
+    asyncio.run(_token_bucket_wait())
+
+
+def test_token_bucket_threads():
+    # Flask子线程各自的事件循环共用同一个令牌桶：并发取令牌时不能超发
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(20):
+            bucket = TokenBucket(rate=0.001, capacity=100)
+            granted = []
+
+            def worker():
+                granted.append(sum(bucket.try_acquire() for _ in range(200)))
+
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert sum(granted) == 100, f"多线程并发时发放了 {sum(granted)} 个令牌，容量只有100"
+    finally:
+        sys.setswitchinterval(interval)
+
+
+if __name__ == "__main__":
+    test_breaker_opens_after_threshold()
+    test_success_resets_failures()
+    test_half_open_probe_success()
+    test_half_open_probe_failure()
+    test_half_open_release()
+    test_token_bucket_burst_and_reserve()
+    test_token_bucket_wait()
+    test_token_bucket_threads()
+    print("熔断器与限流测试通过")
@@ -0,0 +1,52 @@
+import asyncio
+import threading
+
+from music_api_client import MusicApiClient
+
+# 测试音乐API客户端的连接池按事件循环区分：插件主循环和Flask子线程的loop交替使用时不互相替换、不泄漏会话
+
+
+async def _get_session(client: MusicApiClient):
+    return await client.get_session()
+
+
+def test_session_per_loop():
+    client = MusicApiClient()
+    # 模拟插件主循环：在后台线程中一直运行
+    main_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=main_loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        main_session = asyncio.run_coroutine_threadsafe(_get_session(client), main_loop).result()
+
+        # 模拟Flask子线程：各自新建loop，用完后关闭会话和loop
+        worker_sessions = []
+        for _ in range(3):
+            loop = asyncio.new_event_loop()
+            worker_sessions.append(loop.run_until_complete(_get_session(client)))
+            loop.run_until_complete(client.close())
+            loop.close()
+        assert all(session.closed for session in worker_sessions), "子线程loop关闭前应关闭自己的会话"
+        assert len(set(map(id, worker_sessions))) == 3
+
+        again = asyncio.run_coroutine_threadsafe(_get_session(client), main_loop).result()
+        assert again is main_session, "其他loop使用后，主循环的会话不应被替换"
+        assert not main_session.closed
+
+        # 没有调用close()就关闭的loop，其会话在下次创建会话时被清理
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(_get_session(client))
+        loop.close()
+        asyncio.run_coroutine_threadsafe(client.close(), main_loop).result()
+        asyncio.run_coroutine_threadsafe(_get_session(client), main_loop).result()
+        assert len(client._sessions) == 1, f"已关闭的loop留下的会话应被清理，剩余 {len(client._sessions)} 个"
+    finally:
+        asyncio.run_coroutine_threadsafe(client.close(), main_loop).result()
+        main_loop.call_soon_threadsafe(main_loop.stop)
+        thread.join()
+        main_loop.close()
+
+
+if __name__ == "__main__":
+    test_session_per_loop()
+    print("连接池测试通过")
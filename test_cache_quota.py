@@ -0,0 +1,102 @@
+import os
+import tempfile
+import time
+
+from cache_quota import CacheQuota
+
+# 测试磁盘配额的淘汰顺序（中间产物 → 源音频 → 翻唱成品，层内按LRU）、pin保护和min_age保护
+
+KB = 1024
+
+
+def _make(path: str, size: int, age: float):
+    """创建size字节的文件，并把访问/修改时间设为age秒之前"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+
+
+def _layout(tmp: str):
+    cache_dir = os.path.join(tmp, "cache")
+    results_dir = os.path.join(tmp, "results")
+    files = {
+        # 翻唱成品最旧，但应最后才被淘汰
+        "final": os.path.join(results_dir, "1_1_changed.wav"),
+        "source_old": os.path.join(cache_dir, "audio", "1_1.flac"),
+        "source_new": os.path.join(cache_dir, "audio", "2_1.flac"),
+        "vocals_old": os.path.join(results_dir, "1_1_vocals.wav"),
+        "vocals_new": os.path.join(results_dir, "2_1_vocals.wav"),
+    }
+    ages = {"final": 5000, "source_old": 4000, "source_new": 3000, "vocals_old": 2000, "vocals_new": 1000}
+    for name, path in files.items():
+        _make(path, 100 * KB, ages[name])
+    quota = CacheQuota(0, dirs=[cache_dir, results_dir],
+                       source_dirs=[cache_dir, os.path.join(cache_dir, "audio")], min_age=60)
+    return quota, files
+
+
+def test_eviction_order():
+    with tempfile.TemporaryDirectory() as tmp:
+        quota, files = _layout(tmp)
+        # 5个文件共500KB，上限250KB时需要删除3个
+        quota.max_bytes = 250 * KB
+        removed, freed = quota.enforce()
+        assert (removed, freed) == (3, 300 * KB), (removed, freed)
+        remaining = {name for name, path in files.items() if os.path.exists(path)}
+        assert remaining == {"final", "source_new"}, f"应先删中间产物、再按LRU删源音频，剩余: {remaining}"
+        assert quota.usage() <= quota.max_bytes
+
+
+def test_touch_updates_lru():
+    with tempfile.TemporaryDirectory() as tmp:
+        quota, files = _layout(tmp)
+        # 最近访问过旧的源音频后，应改为淘汰另一个
+        quota.touch(files["source_old"])
+        quota.min_age = 0
+        quota.max_bytes = 250 * KB
+        quota.enforce()
+        assert os.path.exists(files["source_old"]), "刚访问过的文件不应先被淘汰"
+        assert not os.path.exists(files["source_new"])
+
+
+def test_pinned_files_kept():
+    with tempfile.TemporaryDirectory() as tmp:
+        quota, files = _layout(tmp)
+        quota.max_bytes = 100 * KB
+        # 固定源音频时，同名派生的人声和翻唱成品也受保护
+        with quota.pin(files["source_old"]):
+            quota.enforce()
+            for name in ("source_old", "vocals_old", "final"):
+                assert os.path.exists(files[name]), f"{name} 在pin期间不应被删除"
+            assert not os.path.exists(files["source_new"])
+            assert not os.path.exists(files["vocals_new"])
+        assert not quota.is_pinned(files["source_old"]), "离开with块后应解除保护"
+
+
+def test_min_age_kept():
+    with tempfile.TemporaryDirectory() as tmp:
+        quota, files = _layout(tmp)
+        fresh = os.path.join(tmp, "results", "3_1_vocals.wav")
+        _make(fresh, 100 * KB, 0)
+        quota.max_bytes = 100 * KB
+        quota.enforce()
+        assert os.path.exists(fresh), "min_age内访问过的文件不应被删除"
+        assert sum(os.path.exists(path) for path in files.values()) == 0, "其余文件都应被淘汰以回到上限"
+
+
+def test_unlimited():
+    with tempfile.TemporaryDirectory() as tmp:
+        quota, files = _layout(tmp)
+        assert quota.enforce() == (0, 0), "上限<=0时不淘汰"
+        assert all(os.path.exists(path) for path in files.values())
+
+
+if __name__ == "__main__":
+    test_eviction_order()
+    test_touch_updates_lru()
+    test_pinned_files_kept()
+    test_min_age_kept()
+    test_unlimited()
+    print("磁盘配额测试通过")
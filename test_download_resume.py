@@ -0,0 +1,155 @@
+import asyncio
+import os
+import re
+import tempfile
+
+from aiohttp import test_utils, web
+
+from music_api_client import get_music_api_client
+from netease_download_tool import PART_SUFFIX, stream_download
+
+# 在本地aiohttp服务器上测试单连接下载的断点续传、416响应和文件头校验
+
+# 带STREAMINFO块头的FLAC文件
+FLAC_DATA = b"fLaC\x00\x00\x00\x22" + os.urandom(300 * 1024)
+
+
+class AudioServer:
+    """提供一个音频文件的测试服务器，可设置是否支持Range，记录每个请求的Range头"""
+
+    def __init__(self, data: bytes, ranges: bool = True):
+        self.data = data
+        self.ranges = ranges
+        self.requests = []
+        app = web.Application()
+        app.router.add_get("/song.flac", self.handle)
+        self.server = test_utils.TestServer(app)
+
+    @property
+    def url(self) -> str:
+        return str(self.server.make_url("/song.flac"))
+
+    async def handle(self, request):
+        range_header = request.headers.get("Range")
+        self.requests.append(range_header)
+        size = len(self.data)
+        if not self.ranges or not range_header:
+            return web.Response(body=self.data)
+        start, end = re.match(r"bytes=(\d+)-(\d*)", range_header).groups()
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+        if start >= size:
+            return web.Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+        return web.Response(status=206, body=self.data[start:end + 1],
+                            headers={"Content-Range": f"bytes {start}-{end}/{size}"})
+
+    async def __aenter__(self):
+        await self.server.start_server()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.server.close()
+        # 每个测试用各自的事件循环，关闭共享连接池避免跨loop复用
+        await get_music_api_client().close()
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+async def _resume_from_part():
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "song.flac")
+        _write(file_path + PART_SUFFIX, FLAC_DATA[:100 * 1024])
+        async with AudioServer(FLAC_DATA) as server:
+            total = await stream_download(server.url, file_path)
+        assert server.requests == [f"bytes={100 * 1024}-"], f"应从.part末尾续传，实际请求: {server.requests}"
+        assert total == len(FLAC_DATA)
+        assert _read(file_path) == FLAC_DATA, "续传后的文件内容不一致"
+        assert not os.path.exists(file_path + PART_SUFFIX), "完成后.part应被重命名"
+
+
+async def _server_ignores_range():
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "song.flac")
+        _write(file_path + PART_SUFFIX, FLAC_DATA[:100 * 1024])
+        async with AudioServer(FLAC_DATA, ranges=False) as server:
+            await stream_download(server.url, file_path)
+        # 服务器返回200时不能把整个文件追加到.part后面
+        assert _read(file_path) == FLAC_DATA, "服务器忽略Range时应从头重新下载"
+
+
+async def _complete_part_416():
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "song.flac")
+        _write(file_path + PART_SUFFIX, FLAC_DATA)
+        async with AudioServer(FLAC_DATA) as server:
+            total = await stream_download(server.url, file_path)
+        assert server.requests == [f"bytes={len(FLAC_DATA)}-"]
+        assert total == len(FLAC_DATA)
+        assert _read(file_path) == FLAC_DATA, "416且.part已完整时应直接完成"
+        assert not os.path.exists(file_path + PART_SUFFIX)
+
+
+async def _oversized_part_416():
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "song.flac")
+        _write(file_path + PART_SUFFIX, FLAC_DATA + b"garbage")
+        async with AudioServer(FLAC_DATA) as server:
+            try:
+                await stream_download(server.url, file_path)
+            except Exception:
+                pass
+            else:
+                raise AssertionError("比实际文件还大的.part不应被当作完成")
+        assert not os.path.exists(file_path), "不应生成最终文件"
+        assert not os.path.exists(file_path + PART_SUFFIX), "无效的.part应被删除，下次从头下载"
+
+
+async def _rejects_invalid_audio():
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "song.flac")
+        async with AudioServer(b"<html>403 Forbidden</html>" * 100) as server:
+            try:
+                await stream_download(server.url, file_path)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("下载到的不是音频时应校验失败")
+        assert not os.path.exists(file_path), "校验失败时不应生成最终文件"
+        assert not os.path.exists(file_path + PART_SUFFIX), "校验失败的.part应被删除"
+
+
+def test_resume_from_part():
+    asyncio.run(_resume_from_part())
+
+
+def test_server_ignores_range():
+    asyncio.run(_server_ignores_range())
+
+
+def test_complete_part_416():
+    asyncio.run(_complete_part_416())
+
+
+def test_oversized_part_416():
+    asyncio.run(_oversized_part_416())
+
+
+def test_rejects_invalid_audio():
+    asyncio.run(_rejects_invalid_audio())
+
+
+if __name__ == "__main__":
+    test_resume_from_part()
+    test_server_ignores_range()
+    test_complete_part_416()
+    test_oversized_part_416()
+    test_rejects_invalid_audio()
+    print("下载续传测试通过")
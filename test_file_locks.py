@@ -0,0 +1,108 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+from file_locks import FileLock, LockTimeout, async_file_lock, lock_path_for
+
+# 测试跨进程文件锁：争用时互斥、等待超时、接管崩溃进程留下的过期锁
+
+
+def test_contention():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "song.flac")
+        holder = FileLock(path)
+        assert holder.try_acquire(), "空闲时应能获取锁"
+        other = FileLock(path, timeout=0.3, poll_interval=0.05)
+        assert not other.try_acquire(), "已被持有的锁不应再被获取"
+        started = time.monotonic()
+        try:
+            other.acquire()
+        except LockTimeout:
+            pass
+        else:
+            raise AssertionError("等待超时应抛出LockTimeout")
+        assert time.monotonic() - started >= 0.3
+        holder.release()
+        assert not os.path.exists(lock_path_for(path)), "释放后锁文件应被删除"
+        assert other.try_acquire(), "释放后应能获取锁"
+        other.release()
+
+
+def test_threads_exclusive():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "song.flac")
+        active = []
+        overlaps = []
+
+        def worker():
+            for _ in range(5):
+                with FileLock(path, poll_interval=0.01):
+                    active.append(1)
+                    if len(active) > 1:
+                        overlaps.append(len(active))
+                    time.sleep(0.01)
+                    active.pop()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not overlaps, f"同一时刻有多个线程持有锁: {overlaps}"
+
+
+def test_stale_takeover():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "song.flac")
+        lock_path = lock_path_for(path)
+        # 模拟崩溃进程留下的锁：锁文件很久没有刷新
+        with open(lock_path, "w") as f:
+            f.write('{"pid": 0}')
+        old = time.time() - 120
+        os.utime(lock_path, (old, old))
+        lock = FileLock(path, stale_after=60)
+        assert lock.try_acquire(), "过期的锁应被接管"
+        assert lock.held
+        assert not os.path.exists(f"{lock_path}.{os.getpid()}.{threading.get_ident()}.stale"), "接管后不应留下改名的旧锁"
+        lock.release()
+
+
+def test_fresh_lock_not_taken_over():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "song.flac")
+        holder = FileLock(path)
+        assert holder.try_acquire()
+        # 持有者仍在刷新锁文件（修改时间是新的），不能被当作崩溃进程留下的锁
+        assert not FileLock(path, stale_after=60).try_acquire(), "未过期的锁不应被接管"
+        holder.release()
+
+
+async def _async_contention():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "song.flac")
+        order = []
+
+        async def worker(name):
+            async with async_file_lock(path):
+                order.append(f"{name}进入")
+                await asyncio.sleep(0.05)
+                order.append(f"{name}离开")
+
+        await asyncio.gather(worker("A"), worker("B"))
+        assert order in (["A进入", "A离开", "B进入", "B离开"], ["B进入", "B离开", "A进入", "A离开"]), order
+        assert not os.path.exists(lock_path_for(path))
+
+
+def test_async_contention():
+    asyncio.run(_async_contention())
+
+
+if __name__ == "__main__":
+    test_contention()
+    test_threads_exclusive()
+    test_stale_takeover()
+    test_fresh_lock_not_taken_over()
+    test_async_contention()
+    print("文件锁测试通过")
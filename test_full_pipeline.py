@@ -1,22 +1,34 @@
 import asyncio
 import os
-from netease_download_tool import download_netease_flac
+from netease_download_tool import download_netease_flac, print_progress
 from msst_separate_tool import msst_separate, find_results_dir
 from gradio_vocal_process_tool import gradio_process_vocal
 from audio_merge_tool import merge_vocal_and_other
+from cache_quota import get_cache_quota
 
 def main(song_name: str, choose: str, quality: str):
     print(f"开始处理: {song_name}")
     loop = asyncio.get_event_loop()
     # 1. 下载网易云音乐FLAC
-    flac_path = loop.run_until_complete(download_netease_flac(song_name, choose, quality))
+    flac_path = loop.run_until_complete(download_netease_flac(song_name, choose, quality, progress=print_progress(song_name)))
     print(f"FLAC下载完成: {flac_path}")
+    # 处理期间保护源音频及其派生文件，不被磁盘配额淘汰
+    quota = get_cache_quota()
+    with quota.pin(flac_path):
+        final_wav = run_pipeline(flac_path, quota)
+    # 成品刚生成，访问时间最新；此时再检查配额，淘汰其他歌曲的中间产物
+    removed, freed = quota.enforce()
+    if removed:
+        print(f"磁盘配额清理: 删除 {removed} 个文件，释放 {freed / 1024 / 1024:.1f} MB")
+    return final_wav
+
+def run_pipeline(flac_path: str, quota) -> str:
     # 2. 分离得到vocals/other
     other_wav, vocals_wav = msst_separate(flac_path, results_dir=find_results_dir())
+    quota.touch(other_wav)
     print(f"分离完成:\nother: {other_wav}\nvocals: {vocals_wav}")
     # 修复vocals_wav文件名不精确问题，自动模糊查找
     import glob
-    import os
     vocals_dir = os.path.dirname(vocals_wav)
     vocals_base = os.path.splitext(os.path.basename(vocals_wav))[0]
     # 查找同目录下所有 *_vocals.wav 文件
@@ -31,13 +43,18 @@ def main(song_name: str, choose: str, quality: str):
     if best_match != vocals_wav:
         print(f"[提示] 使用模糊匹配到的 vocals wav: {best_match}")
     vocals_wav = best_match
+    quota.touch(vocals_wav)
     # 3. Sovits变声
-    changed_wav = gradio_process_vocal(vocals_wav)
-    print(f"Sovits变声完成: {changed_wav}")
-    # 4. 合成最终wav
-    base_name = os.path.splitext(os.path.basename(flac_path))[0]
-    final_wav = merge_vocal_and_other(changed_wav, other_wav, base_name)
+    with quota.pin(vocals_wav, other_wav):
+        changed_wav = gradio_process_vocal(vocals_wav)
+        print(f"Sovits变声完成: {changed_wav}")
+        # 4. 合成最终wav
+        with quota.pin(changed_wav):
+            base_name = os.path.splitext(os.path.basename(flac_path))[0]
+            final_wav = merge_vocal_and_other(changed_wav, other_wav, base_name)
+    quota.touch(final_wav)
     print(f"最终合成完成: {final_wav}")
+    return final_wav
 
 if __name__ == "__main__":
     import sys
@@ -0,0 +1,216 @@
+import asyncio
+import time
+
+import aiohttp
+
+from api_guard import CircuitBreaker, CircuitOpenError, TokenBucket
+from music_api_client import MusicApiClient
+from music_providers import MusicProvider
+
+# 测试对冲请求 fetch_first_available：按hedge_delay错峰发出候选、前一个失败时立即发出下一个、
+# 按优先级取结果并取消其余请求、调用方取消时不留下在途请求、其余候选被熔断器拒绝时按未命中处理
+
+
+class ScriptedProvider(MusicProvider):
+    """按choose预设延迟和结果的提供方，记录每个choose的发出时间和被取消的请求"""
+
+    def __init__(self, script, breaker: CircuitBreaker = None):
+        """
+        :param script: {choose: (延迟秒数, 是否成功)}，是否成功为异常实例时抛出该异常
+        """
+        super().__init__("scripted", breaker=breaker)
+        self.script = script
+        self.started = {}
+        self.cancelled = set()
+        self.t0 = time.monotonic()
+
+    async def request(self, session, word, quality, choose):
+        self.started[choose] = time.monotonic() - self.t0
+        delay, ok = self.script[choose]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.add(choose)
+            raise
+        if isinstance(ok, BaseException):
+            raise ok
+        if not ok:
+            return {"code": 404, "message": "没有找到"}
+        return {"code": 200, "data": {"id": choose, "url": f"http://example.com/{choose}.flac"}}
+
+
+def _client(provider: ScriptedProvider) -> MusicApiClient:
+    return MusicApiClient(providers=[provider], rate_limiter=TokenBucket(rate=0))
+
+
+async def _staggered_priority():
+    provider = ScriptedProvider({1: (0.35, True), 2: (0.05, True), 3: (0.05, True)})
+    client = _client(provider)
+    try:
+        success, info, choose = await client.fetch_first_available("晴天", 9, [1, 2, 3], hedge_delay=0.1)
+        assert success and choose == 1 and info["id"] == 1, "应返回优先级最高的成功结果，而不是最先返回的"
+        assert 0.08 <= provider.started[2] - provider.started[1] < 0.2, f"第二个候选应错峰约0.1秒发出: {provider.started}"
+        assert 0.08 <= provider.started[3] - provider.started[2] < 0.2, f"第三个候选应错峰约0.1秒发出: {provider.started}"
+    finally:
+        await client.close()
+
+
+async def _failure_skips_delay():
+    provider = ScriptedProvider({1: (0.01, False), 2: (0.01, False), 3: (0.01, True)})
+    client = _client(provider)
+    try:
+        started = time.monotonic()
+        success, info, choose = await client.fetch_first_available("晴天", 9, [1, 2, 3], hedge_delay=1.0)
+        assert success and choose == 3
+        assert time.monotonic() - started < 0.5, "前一个候选失败时下一个应立即发出，不等待错峰延迟"
+    finally:
+        await client.close()
+
+
+async def _losers_cancelled():
+    provider = ScriptedProvider({1: (0.02, True), 2: (5, True), 3: (5, True)})
+    client = _client(provider)
+    try:
+        success, _, choose = await client.fetch_first_available("晴天", 9, [1, 2, 3], hedge_delay=0)
+        assert success and choose == 1
+        await asyncio.sleep(0.05)
+        assert provider.cancelled == {2, 3}, f"得到结果后其余在途请求应被取消: {provider.cancelled}"
+        assert len(client.single_flight) == 0
+    finally:
+        await client.close()
+
+
+async def _caller_cancelled():
+    provider = ScriptedProvider({1: (5, True), 2: (5, True)})
+    client = _client(provider)
+    try:
+        task = asyncio.create_task(client.fetch_first_available("晴天", 9, [1, 2], hedge_delay=0))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await asyncio.sleep(0.05)
+        assert provider.cancelled == {1, 2}, f"调用方取消后所有候选请求都应被取消: {provider.cancelled}"
+        assert len(client.single_flight) == 0
+    finally:
+        await client.close()
+
+
+async def _all_missed():
+    provider = ScriptedProvider({1: (0.01, False), 2: (0.01, False)})
+    client = _client(provider)
+    try:
+        assert await client.fetch_first_available("晴天", 9, [1, 2], hedge_delay=0.05) == (False, None, 2)
+    finally:
+        await client.close()
+
+
+async def _no_candidates():
+    provider = ScriptedProvider({})
+    client = _client(provider)
+    try:
+        assert await client.fetch_first_available("晴天", 9, []) == (False, None, None)
+        assert await client.fetch_with_retry("晴天", 9, []) == (False, None, None)
+        assert not provider.started
+    finally:
+        await client.close()
+
+
+async def _half_open_probe_miss():
+    # 半开状态只放行一个探测请求，其余候选被熔断器拒绝
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    await asyncio.sleep(0.06)
+    provider = ScriptedProvider({1: (0.05, False), 2: (0.01, True), 3: (0.01, True)}, breaker=breaker)
+    client = _client(provider)
+    try:
+        result = await client.fetch_first_available("晴天", 9, [1, 2, 3], hedge_delay=0)
+        assert result == (False, None, 3), f"其余候选被熔断器拒绝时应按未命中处理，而不是中断请求: {result}"
+        assert list(provider.started) == [1]
+        assert breaker.state == CircuitBreaker.CLOSED, "探测请求有结论后熔断器应关闭"
+    finally:
+        await client.close()
+
+
+async def _first_candidate_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    provider = ScriptedProvider({1: (0.01, True), 2: (0.01, True)}, breaker=breaker)
+    client = _client(provider)
+    try:
+        await client.fetch_first_available("晴天", 9, [1, 2], hedge_delay=0.05)
+    except CircuitOpenError:
+        pass
+    else:
+        raise AssertionError("第一个候选被熔断器拒绝时应抛出CircuitOpenError")
+    finally:
+        await client.close()
+    assert not provider.started
+
+
+async def _failure_opens_breaker():
+    # 第一个候选的网络异常使熔断器打开，后续候选都被拒绝：全部是异常，仍应向上抛出
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    error = aiohttp.ClientConnectionError("连接失败")
+    provider = ScriptedProvider({1: (0.01, error), 2: (0.01, True), 3: (0.01, True)}, breaker=breaker)
+    client = _client(provider)
+    try:
+        await client.fetch_first_available("晴天", 9, [1, 2, 3], hedge_delay=0.5)
+    except (aiohttp.ClientError, CircuitOpenError):
+        pass
+    else:
+        raise AssertionError("所有候选都失败于异常时应向上抛出")
+    finally:
+        await client.close()
+    assert list(provider.started) == [1]
+
+
+def test_staggered_priority():
+    asyncio.run(_staggered_priority())
+
+
+def test_failure_skips_delay():
+    asyncio.run(_failure_skips_delay())
+
+
+def test_losers_cancelled():
+    asyncio.run(_losers_cancelled())
+
+
+def test_caller_cancelled():
+    asyncio.run(_caller_cancelled())
+
+
+def test_all_missed():
+    asyncio.run(_all_missed())
+
+
+def test_no_candidates():
+    asyncio.run(_no_candidates())
+
+
+def test_half_open_probe_miss():
+    asyncio.run(_half_open_probe_miss())
+
+
+def test_first_candidate_open():
+    asyncio.run(_first_candidate_open())
+
+
+def test_failure_opens_breaker():
+    asyncio.run(_failure_opens_breaker())
+
+
+if __name__ == "__main__":
+    test_staggered_priority()
+    test_failure_skips_delay()
+    test_losers_cancelled()
+    test_caller_cancelled()
+    test_all_missed()
+    test_no_candidates()
+    test_half_open_probe_miss()
+    test_first_candidate_open()
+    test_failure_opens_breaker()
+    print("对冲请求测试通过")
@@ -0,0 +1,140 @@
+import asyncio
+import sys
+import threading
+
+from api_guard import TokenBucket
+from music_api_client import MusicApiClient
+from music_cache import SingleFlight, TTLCache
+from music_providers import MusicProvider
+
+# 测试相同查询的并发请求合并为一次上游调用、等待者取消时在途请求的处理，以及缓存在多线程间共用
+
+
+class FakeProvider(MusicProvider):
+    """记录请求次数、固定延迟后返回结果的提供方"""
+
+    def __init__(self, delay: float = 0.05):
+        super().__init__("fake")
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = 0
+
+    async def request(self, session, word, quality, choose):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return {"code": 200, "data": {"id": 1, "song": word, "url": f"http://example.com/{choose}.flac"}}
+
+
+def _client(provider: FakeProvider) -> MusicApiClient:
+    return MusicApiClient(providers=[provider], rate_limiter=TokenBucket(rate=0))
+
+
+async def _coalesce_concurrent():
+    provider = FakeProvider()
+    client = _client(provider)
+    try:
+        # 繁简、全半角不同的写法规范化后是同一个查询
+        results = await asyncio.gather(*(client.fetch(word, 9, 1) for word in ["花譜", "花谱", "花譜", "花譜 "]))
+        assert provider.calls == 1, f"并发的相同查询应只请求一次上游，实际 {provider.calls} 次"
+        assert all(r["code"] == 200 for r in results)
+        assert client.single_flight.coalesced == 3
+        assert len(client.single_flight) == 0, "完成后不应残留在途记录"
+        # 再次请求命中缓存
+        await client.fetch("花譜", 9, 1)
+        assert provider.calls == 1
+        # 不同的choose是不同的查询
+        await client.fetch("花譜", 9, 2)
+        assert provider.calls == 2
+    finally:
+        await client.close()
+
+
+async def _one_waiter_cancelled():
+    provider = FakeProvider(delay=0.1)
+    client = _client(provider)
+    try:
+        first = asyncio.create_task(client.fetch("晴天", 9, 1))
+        second = asyncio.create_task(client.fetch("晴天", 9, 1))
+        await asyncio.sleep(0.02)
+        first.cancel()
+        result = await second
+        assert result["code"] == 200, "还有等待者时在途请求不应被取消"
+        assert provider.calls == 1 and provider.cancelled == 0
+    finally:
+        await client.close()
+
+
+async def _all_waiters_cancelled():
+    single_flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def upstream():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiters = [asyncio.create_task(single_flight.do("key", upstream)) for _ in range(3)]
+    await asyncio.sleep(0.02)
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    await asyncio.sleep(0)
+    assert len(single_flight) == 0, "所有等待者都取消后应清理在途记录"
+
+
+def test_ttl_cache_threads():
+    # Flask子线程各自的事件循环共用同一个缓存：并发读写、淘汰、删除不能出错
+    cache = TTLCache(max_entries=8, ttl=60)
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(20000):
+                key = i % 16
+                cache.set(key, i)
+                cache.get((key + offset) % 16)
+                cache.pop((key + 3) % 16)
+        except Exception as e:
+            errors.append(repr(e))
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert not errors, f"多线程并发访问缓存出错: {errors[:3]}"
+    assert len(cache) <= cache.max_entries
+    stats = cache.stats()
+    assert stats["hits"] + stats["misses"] == 8 * 20000, "命中统计不应丢失"
+
+
+def test_coalesce_concurrent():
+    asyncio.run(_coalesce_concurrent())
+
+
+def test_one_waiter_cancelled():
+    asyncio.run(_one_waiter_cancelled())
+
+
+def test_all_waiters_cancelled():
+    asyncio.run(_all_waiters_cancelled())
+
+
+if __name__ == "__main__":
+    test_coalesce_concurrent()
+    test_one_waiter_cancelled()
+    test_all_waiters_cancelled()
+    test_ttl_cache_threads()
+    print("请求合并测试通过")
@@ -0,0 +1,134 @@
+import asyncio
+
+import aiohttp
+
+from api_guard import CircuitBreaker, CircuitOpenError
+from music_providers import MusicProvider, ProviderRouter, ProviderUnavailable
+
+# 测试多提供方路由：按层级和延迟排序、失败时切换到下一个提供方、全部熔断时快速失败
+
+
+class FakeProvider(MusicProvider):
+    """按预设行为应答的提供方：返回结果、返回None或抛出异常"""
+
+    def __init__(self, name: str, result=None, error: BaseException = None, tier: int = 0,
+                 supports_url: bool = True, failure_threshold: int = 5):
+        super().__init__(name, breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=60))
+        self.result = result if result is not None else {"code": 200, "data": {"id": 1, "provider": name}}
+        self.error = error
+        self.tier = tier
+        self.supports_url = supports_url
+        self.calls = 0
+
+    async def request(self, session, word, quality, choose):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _router(*providers) -> ProviderRouter:
+    # 关闭随机探索，使排序结果确定
+    return ProviderRouter(providers, explore_ratio=0)
+
+
+def test_ranked_by_latency_and_tier():
+    slow, fast, untested = FakeProvider("slow"), FakeProvider("fast"), FakeProvider("untested")
+    local = FakeProvider("local", tier=1, supports_url=False)
+    for _ in range(10):
+        slow.stats.record(0.8, True)
+        fast.stats.record(0.1, True)
+    router = _router(local, slow, fast, untested)
+    names = [p.name for p in router.ranked(need_url=False)]
+    assert names == ["untested", "fast", "slow", "local"], f"应先试探无样本的提供方，再按延迟排序，兜底层级最后: {names}"
+    assert "local" not in [p.name for p in router.ranked(need_url=True)], "需要播放链接时不应使用本地提供方"
+
+
+def test_error_rate_penalty():
+    flaky, steady = FakeProvider("flaky"), FakeProvider("steady")
+    for i in range(10):
+        flaky.stats.record(0.1, i % 2 == 0)
+        steady.stats.record(0.3, True)
+    names = [p.name for p in _router(flaky, steady).ranked()]
+    assert names == ["steady", "flaky"], f"错误率高的提供方即使更快也应排在后面: {names}"
+
+
+def test_open_breaker_excluded():
+    broken, healthy = FakeProvider("broken", failure_threshold=1), FakeProvider("healthy")
+    broken.breaker.record_failure()
+    assert [p.name for p in _router(broken, healthy).ranked()] == ["healthy"]
+
+
+async def _failover():
+    unavailable = FakeProvider("unavailable", error=ProviderUnavailable("HTTP 503"))
+    timeout = FakeProvider("timeout", error=asyncio.TimeoutError())
+    healthy = FakeProvider("healthy")
+    router = ProviderRouter([unavailable, timeout, healthy], explore_ratio=0)
+    data = await router.request(None, "晴天", 9, 1, providers=[unavailable, timeout, healthy])
+    assert data["data"]["provider"] == "healthy", "前面的提供方失败时应切换到下一个"
+    assert unavailable.breaker.failures == 1 and timeout.breaker.failures == 1, "失败应计入各自的熔断器"
+    assert unavailable.stats.failures == 1 and healthy.stats.requests == 1
+
+
+async def _local_fallback_miss():
+    local = FakeProvider("local", tier=1, supports_url=False)
+    # 本地目录里没有这首歌
+    local.result = None
+    healthy = FakeProvider("healthy")
+    data = await _router(local, healthy).request(None, "晴天", 9, 1, need_url=False, providers=[local, healthy])
+    assert data["data"]["provider"] == "healthy", "兜底提供方没有结果时应继续尝试其他提供方"
+
+
+async def _all_network_errors():
+    first = FakeProvider("first", error=aiohttp.ClientConnectionError("连接失败"))
+    second = FakeProvider("second", error=asyncio.TimeoutError())
+    try:
+        await _router(first, second).request(None, "晴天", 9, 1)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        pass
+    else:
+        raise AssertionError("所有提供方都是网络异常时应向上抛出")
+    assert first.calls == 1 and second.calls == 1
+
+
+async def _all_open():
+    first = FakeProvider("first", failure_threshold=1)
+    second = FakeProvider("second", failure_threshold=1)
+    first.breaker.record_failure()
+    second.breaker.record_failure()
+    router = _router(first, second)
+    assert router.is_open
+    try:
+        await router.request(None, "晴天", 9, 1)
+    except CircuitOpenError as e:
+        assert e.retry_after > 0
+    else:
+        raise AssertionError("所有提供方都熔断时应抛出CircuitOpenError")
+    assert first.calls == 0 and second.calls == 0, "熔断中的提供方不应被请求"
+
+
+def test_failover():
+    asyncio.run(_failover())
+
+
+def test_local_fallback_miss():
+    asyncio.run(_local_fallback_miss())
+
+
+def test_all_network_errors():
+    asyncio.run(_all_network_errors())
+
+
+def test_all_open():
+    asyncio.run(_all_open())
+
+
+if __name__ == "__main__":
+    test_ranked_by_latency_and_tier()
+    test_error_rate_penalty()
+    test_open_breaker_excluded()
+    test_failover()
+    test_local_fallback_miss()
+    test_all_network_errors()
+    test_all_open()
+    print("提供方路由测试通过")
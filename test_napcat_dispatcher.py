@@ -0,0 +1,42 @@
+import asyncio
+
+from napcat_dispatcher import NapcatDispatcher
+
+# 调用方超时放弃后，调度器不应继续重试已在途的消息（否则卡片会在改发的直链之后迟到或重复）
+
+
+class FlakyClient:
+    """每次调用都失败（连接错误）的Napcat客户端，记录调用次数"""
+
+    def __init__(self):
+        self.attempts = 0
+
+    async def call(self, action, params):
+        self.attempts += 1
+        await asyncio.sleep(0.05)
+        raise ConnectionError("模拟Napcat连接失败")
+
+
+async def _cancel_during_retry():
+    client = FlakyClient()
+    dispatcher = NapcatDispatcher(client=client, retries=5)
+    future = dispatcher.send_music_card("group", 123456, "163", "1")
+    try:
+        await asyncio.wait_for(asyncio.shield(future), timeout=0.1)
+    except asyncio.TimeoutError:
+        future.cancel()
+    attempts = client.attempts
+    assert attempts >= 1, "超时前应至少尝试发送一次"
+    # 等待足够长的时间，覆盖剩余的全部退避重试
+    await asyncio.sleep(5)
+    assert client.attempts == attempts, f"取消后仍重试了 {client.attempts - attempts} 次"
+    assert dispatcher.stats()["abandoned"] == 1
+    print(f"取消前尝试 {attempts} 次，取消后没有再重试")
+
+
+def test_cancel_during_retry():
+    asyncio.run(_cancel_during_retry())
+
+
+if __name__ == "__main__":
+    test_cancel_during_retry()
@@ -0,0 +1,51 @@
+import asyncio
+import sys
+import time
+
+from napcat_client import AsyncNapcatClient
+from napcat_stub_server import OneBotStubServer
+
+# 在本地OneBot替身服务器上对比HTTP和WebSocket两种传输方式的单条消息延迟，并测试WebSocket断线重连
+PORT = 3901
+
+
+async def measure(client: AsyncNapcatClient, count: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(i):
+        async with semaphore:
+            success, _ = await client.send_group_text(123456, f"测试消息{i}")
+            assert success, "发送失败"
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(i) for i in range(count)))
+    return (time.perf_counter() - started) / count * 1000
+
+
+async def main(count: int, concurrency: int):
+    server = OneBotStubServer(port=PORT)
+    await server.start()
+    http_client = AsyncNapcatClient(port=PORT)
+    ws_client = AsyncNapcatClient(transport="ws", ws_url=f"ws://127.0.0.1:{PORT}/")
+    try:
+        # 预热连接
+        await http_client.send_group_text(123456, "warmup")
+        await ws_client.send_group_text(123456, "warmup")
+        print(f"HTTP: 平均每条 {await measure(http_client, count, concurrency):.2f} ms")
+        print(f"WebSocket: 平均每条 {await measure(ws_client, count, concurrency):.2f} ms")
+        # 断线后下一次请求自动重连
+        await server.drop_connections()
+        await asyncio.sleep(0.1)
+        success, resp = await ws_client.send_group_text(123456, "重连后的消息")
+        print(f"断线重连: success={success}, 重连次数={ws_client.reconnects}, 响应={resp}")
+        print(f"替身服务器共收到 {len(server.messages)} 条消息，WebSocket连接 {server.ws_connections} 次")
+    finally:
+        await http_client.close()
+        await ws_client.close()
+        await server.stop()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    asyncio.run(main(count, concurrency))
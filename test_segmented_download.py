@@ -0,0 +1,75 @@
+import asyncio
+import os
+import tempfile
+
+from netease_download_tool import PART_SUFFIX, segmented_download
+from test_download_resume import FLAC_DATA, AudioServer
+
+# 测试分段并发下载：正常分段、服务器忽略Range时退化为单连接、保留单连接下载留下的.part前缀
+
+SEGMENT_SIZE = 64 * 1024
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def _parallel_segments():
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "song.flac")
+        async with AudioServer(FLAC_DATA) as server:
+            total = await segmented_download(server.url, file_path, segments=4, min_segment_size=SEGMENT_SIZE)
+        # 第一个请求是探测，其后每段一个请求
+        assert server.requests[0] == "bytes=0-0"
+        segment_requests = server.requests[1:]
+        assert len(segment_requests) == 4, f"应分4段下载，实际请求: {server.requests}"
+        assert all(r and r.startswith("bytes=") and not r.endswith("-") for r in segment_requests)
+        assert total == len(FLAC_DATA)
+        assert _read(file_path) == FLAC_DATA, "分段拼接后的文件内容不一致"
+        assert not os.path.exists(file_path + PART_SUFFIX)
+        assert not os.path.exists(file_path + PART_SUFFIX + ".json"), "完成后断点记录应被删除"
+
+
+async def _server_ignores_range():
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "song.flac")
+        async with AudioServer(FLAC_DATA, ranges=False) as server:
+            total = await segmented_download(server.url, file_path, segments=4, min_segment_size=SEGMENT_SIZE)
+        # 探测请求收到200，不能再按分段请求，只剩一个单连接下载
+        assert len(server.requests) == 2, f"服务器忽略Range时应退化为单连接下载，实际请求: {server.requests}"
+        assert total == len(FLAC_DATA)
+        assert _read(file_path) == FLAC_DATA, "退化为单连接下载后的文件内容不一致"
+        assert not os.path.exists(file_path + PART_SUFFIX + ".json"), "不应留下分段断点记录"
+
+
+async def _keep_stream_prefix():
+    prefix = 100 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "song.flac")
+        with open(file_path + PART_SUFFIX, "wb") as f:
+            f.write(FLAC_DATA[:prefix])
+        async with AudioServer(FLAC_DATA) as server:
+            await segmented_download(server.url, file_path, segments=4, min_segment_size=SEGMENT_SIZE)
+        starts = [int(r[len("bytes="):].split("-")[0]) for r in server.requests[1:]]
+        assert starts and min(starts) == prefix, f"已下载的前缀不应重新下载，实际请求: {server.requests}"
+        assert _read(file_path) == FLAC_DATA, "保留前缀续传后的文件内容不一致"
+
+
+def test_parallel_segments():
+    asyncio.run(_parallel_segments())
+
+
+def test_server_ignores_range():
+    asyncio.run(_server_ignores_range())
+
+
+def test_keep_stream_prefix():
+    asyncio.run(_keep_stream_prefix())
+
+
+if __name__ == "__main__":
+    test_parallel_segments()
+    test_server_ignores_range()
+    test_keep_stream_prefix()
+    print("分段下载测试通过")
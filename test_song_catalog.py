@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+from song_catalog import SongCatalog
+
+# 测试本地歌曲目录的解析规则：别名、歌名完全一致、歌名前缀必须在整个目录中唯一
+
+
+def _catalog(tmp: str) -> SongCatalog:
+    return SongCatalog(os.path.join(tmp, "song_catalog.db"))
+
+
+def test_alias_and_exact():
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = _catalog(tmp)
+        catalog.ingest({"id": 1, "song": "晴天", "singer": "周杰伦"}, query="qingtian", choose=1)
+        catalog.ingest({"id": 2, "song": "晴天", "singer": "别人"})
+        assert catalog.lookup("qingtian")["id"] == 1, "接口返回过的搜索词别名应直接命中"
+        assert catalog.lookup("晴天") is None, "同名的歌不止一首时不应猜测"
+        assert catalog.lookup("qingtian", choose=2) is None
+        catalog.close()
+
+
+def test_unique_prefix():
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = _catalog(tmp)
+        catalog.ingest({"id": 1, "song": "七里香", "singer": "周杰伦"})
+        assert catalog.lookup("七里")["id"] == 1, "唯一的歌名前缀应命中"
+        assert catalog.lookup("七") is None, "单个字不按前缀匹配"
+        catalog.close()
+
+
+def test_prefix_counted_over_whole_catalog():
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = _catalog(tmp)
+        # 较早收录的同前缀歌曲，被大量更新的、只是包含搜索词的歌曲挤出模糊搜索的前几条结果
+        catalog.ingest({"id": 1, "song": "ab two", "singer": "歌手"})
+        for i in range(25):
+            catalog.ingest({"id": 100 + i, "song": f"x ab {i}", "singer": "歌手"})
+        catalog.ingest({"id": 2, "song": "ab one", "singer": "歌手"})
+        assert catalog.lookup("ab") is None, "目录中有两首歌以搜索词开头，不应当作唯一前缀"
+        catalog.close()
+
+
+if __name__ == "__main__":
+    test_alias_and_exact()
+    test_unique_prefix()
+    test_prefix_counted_over_whole_catalog()
+    print("本地歌曲目录测试通过")
@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+from api_guard import TokenBucket
+from music_api_client import MusicApiClient
+from music_cache import make_song_key
+from song_warmer import SongWarmer
+
+# 测试热门歌曲预热：入选门槛按一个预热间隔的衰减放宽、没有事件循环时在后台线程中运行、在事件循环中启动时复用该loop
+
+
+def _warmer(**kwargs) -> SongWarmer:
+    client = MusicApiClient(rate_limiter=TokenBucket(rate=0))
+    return SongWarmer(client=client, **kwargs)
+
+
+def _age(warmer: SongWarmer, key, seconds: float):
+    """把查询键的上次点歌时间往前推seconds秒"""
+    score, updated = warmer._scores[key]
+    warmer._scores[key] = (score, updated - seconds)
+
+
+def test_threshold_within_interval():
+    warmer = _warmer(interval=300, half_life=3600, min_count=2)
+    warmer.ensure_started = lambda: None
+    for _ in range(2):
+        warmer.record("晴天", 9, 1)
+    key = make_song_key("晴天", 9, 1)
+    # 刚点够min_count次的歌，到下一轮预热时（不到一个间隔后）仍应入选
+    _age(warmer, key, 290)
+    assert [k for k, _ in warmer.hot_keys()] == [key], "一个预热间隔内点够min_count次的歌应入选"
+    # 再过一个间隔没人点，就不再算热门
+    _age(warmer, key, 300)
+    assert warmer.hot_keys() == [], "衰减超过一个预热间隔后不应再入选"
+    warmer.record("七里香", 9, 1)
+    assert make_song_key("七里香", 9, 1) not in [k for k, _ in warmer.hot_keys()], "只点过一次的歌不应入选"
+
+
+def test_starts_without_loop():
+    warmer = _warmer(interval=0.05)
+    calls = []
+
+    async def warm_once():
+        calls.append(time.monotonic())
+        return 0
+
+    warmer.warm_once = warm_once
+    # 插件在事件循环启动前加载：在后台线程中运行
+    warmer.ensure_started()
+    try:
+        time.sleep(0.3)
+        assert warmer.stats()["running"], "没有运行中的事件循环时应在后台线程中运行"
+        assert len(calls) >= 2, f"后台线程应按间隔预热，实际 {len(calls)} 轮"
+        task = warmer._task
+        # 已在后台线程中运行时，在其他事件循环中点歌不应重复启动
+        asyncio.run(_record_in_loop(warmer))
+        assert warmer._task is task
+    finally:
+        warmer.stop()
+    time.sleep(0.1)
+    assert task.done(), "stop()后后台线程的预热任务应结束"
+
+
+async def _record_in_loop(warmer: SongWarmer):
+    warmer.record("晴天", 9, 1)
+
+
+async def _starts_in_running_loop():
+    warmer = _warmer(interval=60)
+    warmer.ensure_started()
+    try:
+        assert warmer._task.get_loop() is asyncio.get_running_loop(), "有运行中的事件循环时应在该loop中运行"
+    finally:
+        warmer.stop()
+
+
+def test_starts_in_running_loop():
+    asyncio.run(_starts_in_running_loop())
+
+
+if __name__ == "__main__":
+    test_threshold_within_interval()
+    test_starts_without_loop()
+    test_starts_in_running_loop()
+    print("热门歌曲预热测试通过")